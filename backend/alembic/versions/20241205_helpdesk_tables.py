@@ -124,45 +124,7 @@ def upgrade() -> None:
         sa.ForeignKeyConstraint(['category_id'], ['categories.id']),
     )
     
-    # Seed initial departments
-    op.execute("""
-        INSERT INTO departments (id, name, name_kz, description, keywords)
-        VALUES 
-        ('11111111-1111-1111-1111-111111111111', 'IT поддержка', 'IT қолдау', 'Техническая поддержка IT', '["компьютер", "пароль", "принтер", "интернет", "программа", "почта", "email", "vpn", "сеть"]'),
-        ('22222222-2222-2222-2222-222222222222', 'HR / Кадры', 'HR / Кадрлар', 'Отдел кадров', '["отпуск", "зарплата", "увольнение", "прием", "больничный", "справка", "договор"]'),
-        ('33333333-3333-3333-3333-333333333333', 'Финансы', 'Қаржы', 'Финансовый отдел', '["счет", "оплата", "возврат", "бюджет", "расход", "invoice"]'),
-        ('44444444-4444-4444-4444-444444444444', 'АХО', 'Әкімшілік-шаруашылық бөлімі', 'Административно-хозяйственный отдел', '["пропуск", "ключ", "офис", "мебель", "уборка", "канцелярия"]')
-    """)
-    
-    # Seed initial categories
-    op.execute("""
-        INSERT INTO categories (id, name, name_kz, department_id, auto_response_template)
-        VALUES 
-        ('aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa', 'Сброс пароля', 'Құпия сөзді қалпына келтіру', '11111111-1111-1111-1111-111111111111', 'Для сброса пароля перейдите по ссылке: https://portal.company.kz/reset-password'),
-        ('bbbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbb', 'Доступ к VPN', 'VPN-ге қосылу', '11111111-1111-1111-1111-111111111111', 'Инструкция по настройке VPN: https://portal.company.kz/vpn-guide'),
-        ('cccccccc-cccc-cccc-cccc-cccccccccccc', 'Проблема с принтером', 'Принтер мәселесі', '11111111-1111-1111-1111-111111111111', NULL),
-        ('dddddddd-dddd-dddd-dddd-dddddddddddd', 'Заявление на отпуск', 'Демалыс өтінімі', '22222222-2222-2222-2222-222222222222', 'Заявление на отпуск: https://hr.company.kz/vacation'),
-        ('eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee', 'Вопрос по зарплате', 'Жалақы туралы сұрақ', '22222222-2222-2222-2222-222222222222', NULL),
-        ('ffffffff-ffff-ffff-ffff-ffffffffffff', 'Оплата счета', 'Шот төлемі', '33333333-3333-3333-3333-333333333333', NULL)
-    """)
-    
-    # Seed knowledge base
-    op.execute("""
-        INSERT INTO knowledge_base (id, question, question_kz, answer, answer_kz, keywords)
-        VALUES 
-        ('11111111-aaaa-aaaa-aaaa-111111111111', 'Как сбросить пароль?', 'Құпия сөзді қалай қалпына келтіруге болады?', 
-         'Для сброса пароля:\n1. Перейдите на страницу входа\n2. Нажмите "Забыли пароль?"\n3. Введите ваш email\n4. Следуйте инструкциям в письме', 
-         'Құпия сөзді қалпына келтіру үшін:\n1. Кіру бетіне өтіңіз\n2. "Құпия сөзді ұмыттыңыз ба?" түймесін басыңыз\n3. Email-ді енгізіңіз\n4. Хаттағы нұсқауларды орындаңыз',
-         '["сброс", "пароль", "забыл", "парольді", "ұмыттым"]'),
-        ('22222222-aaaa-aaaa-aaaa-222222222222', 'Как подключиться к VPN?', 'VPN-ге қалай қосылуға болады?', 
-         'Инструкция по VPN:\n1. Скачайте клиент с https://vpn.company.kz\n2. Установите сертификат\n3. Введите корпоративные учетные данные\n4. Выберите сервер и подключитесь', 
-         'VPN нұсқаулығы:\n1. https://vpn.company.kz сайтынан клиентті жүктеп алыңыз\n2. Сертификатты орнатыңыз\n3. Корпоративтік деректерді енгізіңіз',
-         '["vpn", "подключение", "удаленный", "қашықтан"]'),
-        ('33333333-aaaa-aaaa-aaaa-333333333333', 'Как оформить отпуск?', 'Демалысты қалай рәсімдеуге болады?', 
-         'Оформление отпуска:\n1. Зайдите в HR-портал\n2. Раздел "Отпуск" -> "Новое заявление"\n3. Укажите даты и тип отпуска\n4. Приложите согласование руководителя\n\nМинимальный срок подачи: 14 дней', 
-         'Демалысты рәсімдеу:\n1. HR-порталға кіріңіз\n2. "Демалыс" -> "Жаңа өтінім" бөліміне өтіңіз\n3. Күндер мен демалыс түрін көрсетіңіз',
-         '["отпуск", "заявление", "демалыс", "өтініш"]')
-    """)
+    # Начальные данные — в отдельной ревизии 20241207_seed_helpdesk
 
 
 def downgrade() -> None:
@@ -0,0 +1,57 @@
+"""Add indexes on foreign-key columns
+
+Revision ID: 20241206_fk_indexes
+Revises: 20241205_whatsapp
+Create Date: 2025-12-06
+
+Индексы строятся CONCURRENTLY, чтобы не блокировать запись в tickets/messages
+во время деплоя. CONCURRENTLY нельзя выполнять внутри транзакции, поэтому
+каждый индекс создаётся в autocommit_block().
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20241206_fk_indexes'
+down_revision: Union[str, Sequence[str], None] = '20241205_whatsapp'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (имя индекса, таблица, колонки)
+INDEXES: list[tuple[str, str, list[str]]] = [
+    ('ix_tickets_department_id', 'tickets', ['department_id']),
+    ('ix_tickets_category_id', 'tickets', ['category_id']),
+    ('ix_tickets_assigned_to_id', 'tickets', ['assigned_to_id']),
+    ('ix_categories_department_id', 'categories', ['department_id']),
+    ('ix_categories_parent_id', 'categories', ['parent_id']),
+    ('ix_messages_sender_id', 'messages', ['sender_id']),
+    ('ix_knowledge_base_category_id', 'knowledge_base', ['category_id']),
+]
+
+
+def upgrade() -> None:
+    """Create indexes on FK columns used in joins and filters."""
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(
+                name,
+                table,
+                columns,
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Drop FK indexes."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
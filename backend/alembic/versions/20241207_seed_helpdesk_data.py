@@ -0,0 +1,163 @@
+"""Seed Help Desk reference data
+
+Revision ID: 20241207_seed_helpdesk
+Revises: 20241206_fk_indexes
+Create Date: 2025-12-07
+
+Сиды вынесены из 20241205_helpdesk, чтобы DDL и вставка данных коммитились
+в разных транзакциях (transaction_per_migration в env.py). Вставка идемпотентна
+(ON CONFLICT DO NOTHING): для баз, где сиды уже есть, ревизия ничего не меняет,
+а прерванный сидинг можно просто перезапустить.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20241207_seed_helpdesk'
+down_revision: Union[str, Sequence[str], None] = '20241206_fk_indexes'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Лёгкие описания таблиц для сидов (без зависимости от ORM-моделей)
+departments_table = sa.table(
+    'departments',
+    sa.column('id', postgresql.UUID(as_uuid=False)),
+    sa.column('name', sa.String),
+    sa.column('name_kz', sa.String),
+    sa.column('description', sa.Text),
+    sa.column('keywords', sa.Text),
+)
+
+categories_table = sa.table(
+    'categories',
+    sa.column('id', postgresql.UUID(as_uuid=False)),
+    sa.column('name', sa.String),
+    sa.column('name_kz', sa.String),
+    sa.column('department_id', postgresql.UUID(as_uuid=False)),
+    sa.column('auto_response_template', sa.Text),
+)
+
+knowledge_base_table = sa.table(
+    'knowledge_base',
+    sa.column('id', postgresql.UUID(as_uuid=False)),
+    sa.column('question', sa.Text),
+    sa.column('question_kz', sa.Text),
+    sa.column('answer', sa.Text),
+    sa.column('answer_kz', sa.Text),
+    sa.column('keywords', sa.Text),
+)
+
+SEED_DEPARTMENTS = [
+    {'id': '11111111-1111-1111-1111-111111111111', 'name': 'IT поддержка', 'name_kz': 'IT қолдау', 'description': 'Техническая поддержка IT', 'keywords': '["компьютер", "пароль", "принтер", "интернет", "программа", "почта", "email", "vpn", "сеть"]'},
+    {'id': '22222222-2222-2222-2222-222222222222', 'name': 'HR / Кадры', 'name_kz': 'HR / Кадрлар', 'description': 'Отдел кадров', 'keywords': '["отпуск", "зарплата", "увольнение", "прием", "больничный", "справка", "договор"]'},
+    {'id': '33333333-3333-3333-3333-333333333333', 'name': 'Финансы', 'name_kz': 'Қаржы', 'description': 'Финансовый отдел', 'keywords': '["счет", "оплата", "возврат", "бюджет", "расход", "invoice"]'},
+    {'id': '44444444-4444-4444-4444-444444444444', 'name': 'АХО', 'name_kz': 'Әкімшілік-шаруашылық бөлімі', 'description': 'Административно-хозяйственный отдел', 'keywords': '["пропуск", "ключ", "офис", "мебель", "уборка", "канцелярия"]'},
+]
+
+SEED_CATEGORIES = [
+    {'id': 'aaaaaaaa-aaaa-aaaa-aaaa-aaaaaaaaaaaa', 'name': 'Сброс пароля', 'name_kz': 'Құпия сөзді қалпына келтіру', 'department_id': '11111111-1111-1111-1111-111111111111', 'auto_response_template': 'Для сброса пароля перейдите по ссылке: https://portal.company.kz/reset-password'},
+    {'id': 'bbbbbbbb-bbbb-bbbb-bbbb-bbbbbbbbbbbb', 'name': 'Доступ к VPN', 'name_kz': 'VPN-ге қосылу', 'department_id': '11111111-1111-1111-1111-111111111111', 'auto_response_template': 'Инструкция по настройке VPN: https://portal.company.kz/vpn-guide'},
+    {'id': 'cccccccc-cccc-cccc-cccc-cccccccccccc', 'name': 'Проблема с принтером', 'name_kz': 'Принтер мәселесі', 'department_id': '11111111-1111-1111-1111-111111111111', 'auto_response_template': None},
+    {'id': 'dddddddd-dddd-dddd-dddd-dddddddddddd', 'name': 'Заявление на отпуск', 'name_kz': 'Демалыс өтінімі', 'department_id': '22222222-2222-2222-2222-222222222222', 'auto_response_template': 'Заявление на отпуск: https://hr.company.kz/vacation'},
+    {'id': 'eeeeeeee-eeee-eeee-eeee-eeeeeeeeeeee', 'name': 'Вопрос по зарплате', 'name_kz': 'Жалақы туралы сұрақ', 'department_id': '22222222-2222-2222-2222-222222222222', 'auto_response_template': None},
+    {'id': 'ffffffff-ffff-ffff-ffff-ffffffffffff', 'name': 'Оплата счета', 'name_kz': 'Шот төлемі', 'department_id': '33333333-3333-3333-3333-333333333333', 'auto_response_template': None},
+]
+
+SEED_KNOWLEDGE_BASE = [
+    {
+        'id': '11111111-aaaa-aaaa-aaaa-111111111111',
+        'question': 'Как сбросить пароль?',
+        'question_kz': 'Құпия сөзді қалай қалпына келтіруге болады?',
+        'answer': 'Для сброса пароля:\n1. Перейдите на страницу входа\n2. Нажмите "Забыли пароль?"\n3. Введите ваш email\n4. Следуйте инструкциям в письме',
+        'answer_kz': 'Құпия сөзді қалпына келтіру үшін:\n1. Кіру бетіне өтіңіз\n2. "Құпия сөзді ұмыттыңыз ба?" түймесін басыңыз\n3. Email-ді енгізіңіз\n4. Хаттағы нұсқауларды орындаңыз',
+        'keywords': '["сброс", "пароль", "забыл", "парольді", "ұмыттым"]',
+    },
+    {
+        'id': '22222222-aaaa-aaaa-aaaa-222222222222',
+        'question': 'Как подключиться к VPN?',
+        'question_kz': 'VPN-ге қалай қосылуға болады?',
+        'answer': 'Инструкция по VPN:\n1. Скачайте клиент с https://vpn.company.kz\n2. Установите сертификат\n3. Введите корпоративные учетные данные\n4. Выберите сервер и подключитесь',
+        'answer_kz': 'VPN нұсқаулығы:\n1. https://vpn.company.kz сайтынан клиентті жүктеп алыңыз\n2. Сертификатты орнатыңыз\n3. Корпоративтік деректерді енгізіңіз',
+        'keywords': '["vpn", "подключение", "удаленный", "қашықтан"]',
+    },
+    {
+        'id': '33333333-aaaa-aaaa-aaaa-333333333333',
+        'question': 'Как оформить отпуск?',
+        'question_kz': 'Демалысты қалай рәсімдеуге болады?',
+        'answer': 'Оформление отпуска:\n1. Зайдите в HR-портал\n2. Раздел "Отпуск" -> "Новое заявление"\n3. Укажите даты и тип отпуска\n4. Приложите согласование руководителя\n\nМинимальный срок подачи: 14 дней',
+        'answer_kz': 'Демалысты рәсімдеу:\n1. HR-порталға кіріңіз\n2. "Демалыс" -> "Жаңа өтінім" бөліміне өтіңіз\n3. Күндер мен демалыс түрін көрсетіңіз',
+        'keywords': '["отпуск", "заявление", "демалыс", "өтініш"]',
+    },
+]
+
+
+SEEDS = [
+    (departments_table, SEED_DEPARTMENTS),
+    (categories_table, SEED_CATEGORIES),
+    (knowledge_base_table, SEED_KNOWLEDGE_BASE),
+]
+
+
+def upgrade() -> None:
+    """Insert initial departments, categories and knowledge base articles."""
+    bind = op.get_bind()
+    for table, rows in SEEDS:
+        bind.execute(
+            postgresql.insert(table).on_conflict_do_nothing(index_elements=['id']),
+            rows,
+        )
+
+
+# Таблицы, ссылающиеся на департаменты и категории (для безопасного downgrade)
+tickets_refs = sa.table(
+    'tickets',
+    sa.column('department_id', postgresql.UUID(as_uuid=False)),
+    sa.column('category_id', postgresql.UUID(as_uuid=False)),
+)
+knowledge_base_refs = sa.table(
+    'knowledge_base',
+    sa.column('category_id', postgresql.UUID(as_uuid=False)),
+)
+categories_refs = sa.table(
+    'categories',
+    sa.column('parent_id', postgresql.UUID(as_uuid=False)),
+    sa.column('department_id', postgresql.UUID(as_uuid=False)),
+).alias('child_categories')
+
+
+def _seed_ids(rows: list[dict]) -> list[str]:
+    return [row['id'] for row in rows]
+
+
+def downgrade() -> None:
+    """
+    Remove seeded rows that nothing references.
+    
+    Департаменты и категории, на которые уже ссылаются тикеты, статьи базы знаний
+    или другие категории, остаются на месте: удалять их нельзя без потери данных.
+    """
+    op.execute(
+        knowledge_base_table.delete().where(
+            knowledge_base_table.c.id.in_(_seed_ids(SEED_KNOWLEDGE_BASE))
+        )
+    )
+    op.execute(
+        categories_table.delete().where(
+            categories_table.c.id.in_(_seed_ids(SEED_CATEGORIES)),
+            ~sa.exists().where(tickets_refs.c.category_id == categories_table.c.id),
+            ~sa.exists().where(knowledge_base_refs.c.category_id == categories_table.c.id),
+            ~sa.exists().where(categories_refs.c.parent_id == categories_table.c.id),
+        )
+    )
+    op.execute(
+        departments_table.delete().where(
+            departments_table.c.id.in_(_seed_ids(SEED_DEPARTMENTS)),
+            ~sa.exists().where(tickets_refs.c.department_id == departments_table.c.id),
+            ~sa.exists().where(categories_refs.c.department_id == departments_table.c.id),
+        )
+    )
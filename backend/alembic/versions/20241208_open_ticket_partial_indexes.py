@@ -0,0 +1,59 @@
+"""Add partial indexes for open ticket queues
+
+Revision ID: 20241208_open_queue
+Revises: 20241207_seed_helpdesk
+Create Date: 2025-12-08
+
+Закрытые/решённые тикеты со временем составляют большую часть таблицы,
+поэтому очередь открытых тикетов индексируется частично — индекс остаётся
+маленьким и помещается в кеш.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20241208_open_queue'
+down_revision: Union[str, Sequence[str], None] = '20241207_seed_helpdesk'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+OPEN_QUEUE_WHERE = "status IN ('new', 'processing', 'waiting_response', 'escalated')"
+NOT_CLOSED_WHERE = "status NOT IN ('resolved', 'closed')"
+
+# (имя индекса, колонки, условие)
+INDEXES: list[tuple[str, list[str], str]] = [
+    # Очередь открытых тикетов по приоритету и возрасту
+    ('ix_tickets_open_queue', ['priority', 'created_at'], OPEN_QUEUE_WHERE),
+    # "Мои открытые тикеты"
+    ('ix_tickets_assigned_open', ['assigned_to_id'], NOT_CLOSED_WHERE),
+]
+
+
+def upgrade() -> None:
+    """Create partial indexes on open tickets."""
+    with op.get_context().autocommit_block():
+        for name, columns, where in INDEXES:
+            op.create_index(
+                name,
+                'tickets',
+                columns,
+                postgresql_where=sa.text(where),
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Drop partial indexes."""
+    with op.get_context().autocommit_block():
+        for name, _, _ in reversed(INDEXES):
+            op.drop_index(
+                name,
+                table_name='tickets',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
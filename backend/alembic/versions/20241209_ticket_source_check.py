@@ -0,0 +1,63 @@
+"""Replace ticketsource enum with VARCHAR + CHECK constraint
+
+Revision ID: 20241209_source_check
+Revises: 20241208_open_queue
+Create Date: 2025-12-09
+
+Нативный PG ENUM нельзя расширить внутри транзакции и нельзя удалить из него
+значение (см. 20241205_whatsapp с пустым downgrade). CHECK-ограничение меняется
+обычным DROP/ADD CONSTRAINT в транзакции и откатывается.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20241209_source_check'
+down_revision: Union[str, Sequence[str], None] = '20241208_open_queue'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+TICKET_SOURCES = ('email', 'chat', 'portal', 'phone', 'telegram', 'whatsapp')
+
+
+def upgrade() -> None:
+    """Convert tickets.source to VARCHAR(32) with a CHECK constraint."""
+    op.alter_column('tickets', 'source', server_default=None)
+    op.alter_column(
+        'tickets',
+        'source',
+        type_=sa.String(length=32),
+        existing_type=postgresql.ENUM(*TICKET_SOURCES, name='ticketsource'),
+        existing_nullable=False,
+        postgresql_using='source::text',
+    )
+    op.alter_column('tickets', 'source', server_default='portal')
+    op.create_check_constraint(
+        'ck_tickets_source',
+        'tickets',
+        sa.column('source').in_(TICKET_SOURCES),
+    )
+    op.execute('DROP TYPE IF EXISTS ticketsource')
+
+
+def downgrade() -> None:
+    """Restore the native ticketsource enum."""
+    ticketsource = postgresql.ENUM(*TICKET_SOURCES, name='ticketsource')
+    ticketsource.create(op.get_bind(), checkfirst=True)
+    
+    op.drop_constraint('ck_tickets_source', 'tickets', type_='check')
+    op.alter_column('tickets', 'source', server_default=None)
+    op.alter_column(
+        'tickets',
+        'source',
+        type_=ticketsource,
+        existing_type=sa.String(length=32),
+        existing_nullable=False,
+        postgresql_using='source::ticketsource',
+    )
+    op.alter_column('tickets', 'source', server_default='portal')
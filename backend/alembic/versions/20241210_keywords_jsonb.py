@@ -0,0 +1,76 @@
+"""Store keywords as JSONB with GIN indexes
+
+Revision ID: 20241210_keywords_jsonb
+Revises: 20241209_source_check
+Create Date: 2025-12-10
+
+keywords хранились как TEXT с JSON-массивом внутри, поиск по ним шёл через
+LIKE '%...%' по всей таблице. JSONB + GIN (jsonb_path_ops) позволяет искать
+через keywords @> '["vpn"]'.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20241210_keywords_jsonb'
+down_revision: Union[str, Sequence[str], None] = '20241209_source_check'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (таблица, имя GIN-индекса)
+KEYWORD_COLUMNS: list[tuple[str, str]] = [
+    ('departments', 'ix_departments_keywords_gin'),
+    ('knowledge_base', 'ix_knowledge_base_keywords_gin'),
+]
+
+
+def upgrade() -> None:
+    """Convert keywords TEXT -> JSONB and add GIN indexes."""
+    for table, _ in KEYWORD_COLUMNS:
+        op.alter_column(
+            table,
+            'keywords',
+            type_=postgresql.JSONB(),
+            existing_type=sa.Text(),
+            existing_nullable=True,
+            postgresql_using='keywords::jsonb',
+        )
+    
+    with op.get_context().autocommit_block():
+        for table, index_name in KEYWORD_COLUMNS:
+            op.create_index(
+                index_name,
+                table,
+                ['keywords'],
+                postgresql_using='gin',
+                postgresql_ops={'keywords': 'jsonb_path_ops'},
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Convert keywords back to TEXT."""
+    with op.get_context().autocommit_block():
+        for table, index_name in reversed(KEYWORD_COLUMNS):
+            op.drop_index(
+                index_name,
+                table_name=table,
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+    
+    for table, _ in KEYWORD_COLUMNS:
+        op.alter_column(
+            table,
+            'keywords',
+            type_=sa.Text(),
+            existing_type=postgresql.JSONB(),
+            existing_nullable=True,
+            postgresql_using='keywords::text',
+        )
@@ -0,0 +1,71 @@
+"""Add full-text search vectors to knowledge_base
+
+Revision ID: 20241211_kb_fts
+Revises: 20241210_keywords_jsonb
+Create Date: 2025-12-11
+
+search_vector — русская морфология по question/answer плюс keywords;
+search_vector_kz — конфигурация 'simple' по казахским полям (словаря для
+казахского в PostgreSQL нет). Обе колонки GENERATED ... STORED, индексы GIN.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20241211_kb_fts'
+down_revision: Union[str, Sequence[str], None] = '20241210_keywords_jsonb'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# (колонка, выражение, имя GIN-индекса)
+SEARCH_VECTORS: list[tuple[str, str, str]] = [
+    (
+        'search_vector',
+        "to_tsvector('russian', coalesce(question, '') || ' ' || coalesce(answer, '')) || "
+        "jsonb_to_tsvector('simple', coalesce(keywords, '[]'::jsonb), '[\"string\"]')",
+        'ix_kb_search_vector',
+    ),
+    (
+        'search_vector_kz',
+        "to_tsvector('simple', coalesce(question_kz, '') || ' ' || coalesce(answer_kz, ''))",
+        'ix_kb_search_vector_kz',
+    ),
+]
+
+
+def upgrade() -> None:
+    """Add generated tsvector columns and GIN indexes."""
+    for column, expression, _ in SEARCH_VECTORS:
+        op.execute(
+            f"ALTER TABLE knowledge_base ADD COLUMN IF NOT EXISTS {column} tsvector "
+            f"GENERATED ALWAYS AS ({expression}) STORED"
+        )
+    
+    with op.get_context().autocommit_block():
+        for column, _, index_name in SEARCH_VECTORS:
+            op.create_index(
+                index_name,
+                'knowledge_base',
+                [column],
+                postgresql_using='gin',
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Drop full-text search vectors."""
+    with op.get_context().autocommit_block():
+        for _, _, index_name in reversed(SEARCH_VECTORS):
+            op.drop_index(
+                index_name,
+                table_name='knowledge_base',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
+    
+    for column, _, _ in reversed(SEARCH_VECTORS):
+        op.drop_column('knowledge_base', column)
@@ -0,0 +1,53 @@
+"""Add trigram indexes for ticket search
+
+Revision ID: 20241212_ticket_trgm
+Revises: 20241211_kb_fts
+Create Date: 2025-12-12
+
+TicketService.get_tickets ищет через ILIKE '%...%' по subject, description,
+ticket_number и client_email. Без индексов каждый поиск — seq scan по tickets;
+GIN gin_trgm_ops поддерживает ILIKE с ведущим %, условия OR объединяются
+через BitmapOr.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision: str = '20241212_ticket_trgm'
+down_revision: Union[str, Sequence[str], None] = '20241211_kb_fts'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+SEARCH_COLUMNS: list[str] = ['subject', 'description', 'ticket_number', 'client_email']
+
+
+def upgrade() -> None:
+    """Enable pg_trgm and create GIN trigram indexes on tickets."""
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    
+    with op.get_context().autocommit_block():
+        for column in SEARCH_COLUMNS:
+            op.create_index(
+                f'ix_tickets_{column}_trgm',
+                'tickets',
+                [column],
+                postgresql_using='gin',
+                postgresql_ops={column: 'gin_trgm_ops'},
+                postgresql_concurrently=True,
+                if_not_exists=True,
+            )
+
+
+def downgrade() -> None:
+    """Drop trigram indexes (extension is left installed)."""
+    with op.get_context().autocommit_block():
+        for column in reversed(SEARCH_COLUMNS):
+            op.drop_index(
+                f'ix_tickets_{column}_trgm',
+                table_name='tickets',
+                postgresql_concurrently=True,
+                if_exists=True,
+            )
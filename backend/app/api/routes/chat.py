@@ -1,36 +1,59 @@
 """API маршруты для AI чата с RAG."""
 
+import asyncio
+import json
+import logging
+import uuid
 from datetime import datetime
-from typing import Any
-from pydantic import BaseModel
-
-from fastapi import APIRouter, Depends
+from itertools import chain
+from types import MappingProxyType
+from typing import Annotated, Any, AsyncIterator
+from pydantic import BaseModel, ConfigDict, TypeAdapter
+
+from fastapi import APIRouter, Depends, Header, Query, Response
+from fastapi.responses import StreamingResponse
+
+try:
+    import orjson
+except ImportError:  # orjson не установлен — NDJSON через стандартный json
+    orjson = None
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from ...services.AI import rag_service
 from ...services.ticket_service import TicketService
 from ...schemas.ticket import TicketCreate, TicketPriority, TicketSource
 from ...db.session import get_session
+from ...models.ticket import Ticket, TicketStatus
 from ...services.integrations.twilio_whatsapp import twilio_whatsapp_service
 from ...services.escalation_store import escalation_store
+from ...services.channel_session_store import whatsapp_escalation_links
+from ...core.constants import DEPARTMENT_IDS, DEPARTMENT_NAMES
 from ...core.redis import redis_service
 
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/chat", tags=["chat"])
 
+# Приоритет из tool_call -> enum; неизвестное значение от модели не должно ронять создание тикета
+PRIORITY_BY_VALUE = MappingProxyType({priority.value: priority for priority in TicketPriority})
 
-# ============================================================================
-# Deprecated: In-memory fallback (используется escalation_store с Redis)
-# ============================================================================
-escalations_store: list[dict[str, Any]] = []  # Kept for backward compatibility
+
+class _RequestBody(BaseModel):
+    """Тело запроса: лишние поля отбрасываются, строки обрезаются, модель неизменяема."""
+    
+    model_config = ConfigDict(extra="ignore", frozen=True, str_strip_whitespace=True)
 
 
-class ChatMessage(BaseModel):
+class ChatMessage(_RequestBody):
     content: str
     is_user: bool
 
 
-class ChatRequest(BaseModel):
+# Сериализация истории целиком в pydantic-core вместо поэлементного dict-comprehension
+_history_adapter = TypeAdapter(list[ChatMessage])
+
+
+class ChatRequest(_RequestBody):
     message: str
     conversation_history: list[ChatMessage] | None = None
     language: str = "ru"
@@ -51,12 +74,12 @@ class ChatResponse(BaseModel):
     tool_call: ToolCallResult | None = None  # Информация об эскалации/тикете
 
 
-class KBSearchRequest(BaseModel):
+class KBSearchRequest(_RequestBody):
     query: str
     top_k: int = 3
 
 
-class AddArticleRequest(BaseModel):
+class AddArticleRequest(_RequestBody):
     category_key: str
     subcategory_key: str
     question: str
@@ -67,12 +90,109 @@ class AddArticleRequest(BaseModel):
     priority: str = "medium"
 
 
-class ClientMessageRequest(BaseModel):
+class KBHit(BaseModel):
+    """Результат поиска по базе знаний."""
+    category: str
+    subcategory: str
+    question: str
+    answer: str
+    can_auto_resolve: bool = False
+    priority: str = "medium"
+    score: int
+
+
+class SubcategoryNode(BaseModel):
+    key: str
+    name: str
+    article_count: int
+
+
+class CategoryNode(BaseModel):
+    """Узел дерева категорий базы знаний."""
+    key: str
+    name: str
+    name_kz: str | None = None
+    subcategories: list[SubcategoryNode]
+
+
+class AddArticleResponse(BaseModel):
+    success: bool
+    message: str
+
+
+class HealthResponse(BaseModel):
+    status: str
+    openai_enabled: bool
+    model: str
+    categories_count: int
+
+
+class Escalation(BaseModel):
+    """
+    Эскалация для оператора.
+    
+    Записи в хранилище дополняются полями каналов (phone_number, call_sid, csat_* ...),
+    поэтому лишние поля пропускаются как есть (extra="allow").
+    """
+    model_config = ConfigDict(extra="allow")
+    
+    id: str | None = None
+    escalation_id: str | None = None
+    client_message: str = ""
+    summary: str = ""
+    reason: str = ""
+    department: str | None = None
+    department_name: str | None = None
+    priority: str = "medium"
+    status: str = "pending"
+    created_at: str | None = None
+    conversation_history: list[dict[str, Any]] = []
+    client_messages: list[dict[str, Any]] = []
+    operator_messages: list[dict[str, Any]] = []
+    ticket_id: str | None = None
+
+
+class ClientMessageRequest(_RequestBody):
     """Сообщение клиента в эскалацию."""
     escalation_id: str
     message: str
 
 
+def _build_escalation(
+    request: "ChatRequest",
+    conversation_history: list[dict[str, Any]],
+    created_at: str,
+    *,
+    escalation_id: str | None,
+    summary: str,
+    reason: str,
+    department: str,
+    department_name: str,
+    priority: str,
+    ticket_id: str | None,
+    status: str = "pending",
+    **extra: Any,
+) -> dict[str, Any]:
+    """Собирает запись эскалации для оператора из результата чата."""
+    return {
+        "id": str(uuid.uuid4()),
+        "escalation_id": escalation_id,
+        "client_message": request.message,
+        "summary": summary,
+        "reason": reason,
+        "department": department,
+        "department_name": department_name,
+        "priority": priority,
+        "status": status,
+        "created_at": created_at,
+        "conversation_history": conversation_history,
+        "client_messages": [],
+        "operator_messages": [],
+        "ticket_id": ticket_id,  # Связь с БД тикетом
+        **extra,
+    }
+
+
 @router.post("/escalations/{escalation_id}/messages")
 async def add_client_message(
     escalation_id: str,
@@ -105,9 +225,8 @@ async def chat(
     5. Сохранение эскалаций для операторов
     6. Создание тикетов в базе данных
     """
-    # Check if there's an active escalation for this conversation
-    # We check by looking at conversation history for escalation IDs
-    active_escalation_id = request.active_escalation_id if hasattr(request, 'active_escalation_id') else None
+    # Если клиент уже общается с оператором — сообщение идёт в эскалацию
+    active_escalation_id = request.active_escalation_id
     
     if active_escalation_id:
         # Find the escalation and add message
@@ -122,9 +241,8 @@ async def chat(
                 tool_call=None,
             )
     
-    history = None
-    if request.conversation_history:
-        history = [{"content": m.content, "is_user": m.is_user} for m in request.conversation_history]
+    # История строится один раз: для RAG и (при tool_call) для эскалации
+    history = _history_adapter.dump_python(request.conversation_history or [])
     
     result = await rag_service.chat(
         message=request.message,
@@ -132,18 +250,15 @@ async def chat(
         language=request.language,
     )
     
+    if result.get("tool_call"):
+        # Полная переписка для оператора и время создания — общие для всех веток
+        escalation_history = history + [{"content": request.message, "is_user": True}]
+        now_iso = datetime.utcnow().isoformat() + "Z"
+    
     # Если был tool_call с эскалацией - создаём тикет в БД и сохраняем для оператора
     if result.get("tool_call") and result["tool_call"].get("name") == "escalate_to_operator":
         tool_result = result["tool_call"]["result"]
         
-        # Определяем department_id для эскалации
-        dept_mapping = {
-            "it_support": "11111111-1111-1111-1111-111111111111",
-            "hr": "22222222-2222-2222-2222-222222222222",
-            "finance": "33333333-3333-3333-3333-333333333333",
-            "facilities": "44444444-4444-4444-4444-444444444444",
-        }
-        
         dept = tool_result.get("department", "it_support")
         priority_str = tool_result.get("priority", "medium")
         
@@ -155,9 +270,9 @@ async def chat(
             ticket_data = TicketCreate(
                 subject=tool_result.get("summary", "Эскалированное обращение"),
                 description=request.message,
-                priority=TicketPriority(priority_str),
+                priority=PRIORITY_BY_VALUE.get(priority_str, TicketPriority.MEDIUM),
                 source=TicketSource.CHAT,
-                department_id=dept_mapping.get(dept),
+                department_id=DEPARTMENT_IDS.get(dept),
             )
             # create_ticket returns tuple (Ticket, AIClassificationResult)
             db_ticket, classification = await ticket_service.create_ticket(ticket_data)
@@ -168,52 +283,27 @@ async def chat(
             tool_result["escalation_id"] = ticket_number
             tool_result["ticket_id"] = ticket_id
             result["tool_call"]["result"] = tool_result
-        except Exception as e:
-            print(f"Error creating escalation ticket in DB: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error creating escalation ticket in DB")
         
-        # Генерируем уникальный ID для Redis
-        import uuid as uuid_module
-        escalation = {
-            "id": str(uuid_module.uuid4()),
-            "escalation_id": ticket_number,
-            "client_message": request.message,
-            "summary": tool_result.get("summary", ""),
-            "reason": tool_result.get("reason", ""),
-            "department": dept,
-            "department_name": tool_result.get("department_name", "IT Поддержка"),
-            "priority": priority_str,
-            "status": "pending",
-            "created_at": datetime.utcnow().isoformat() + "Z",
-            "conversation_history": [
-                {"content": m.content, "is_user": m.is_user}
-                for m in (request.conversation_history or [])
-            ] + [{"content": request.message, "is_user": True}],
-            "client_messages": [],
-            "operator_messages": [],
-            "ticket_id": ticket_id,  # Связь с БД тикетом
-        }
+        escalation = _build_escalation(
+            request,
+            escalation_history,
+            now_iso,
+            escalation_id=ticket_number,
+            summary=tool_result.get("summary", ""),
+            reason=tool_result.get("reason", ""),
+            department=dept,
+            department_name=tool_result.get("department_name", "IT Поддержка"),
+            priority=priority_str,
+            ticket_id=ticket_id,
+        )
         await escalation_store.add(escalation)
     
     # Если был tool_call с созданием тикета - сохраняем в базу данных
     if result.get("tool_call") and result["tool_call"].get("name") == "create_ticket":
         tool_result = result["tool_call"]["result"]
         
-        # Определяем department_id
-        dept_mapping = {
-            "it_support": "11111111-1111-1111-1111-111111111111",
-            "hr": "22222222-2222-2222-2222-222222222222",
-            "finance": "33333333-3333-3333-3333-333333333333",
-            "facilities": "44444444-4444-4444-4444-444444444444",
-        }
-        dept_name_mapping = {
-            "it_support": "IT Поддержка",
-            "hr": "HR / Кадры",
-            "finance": "Финансы",
-            "facilities": "АХО",
-        }
-        
         dept = tool_result.get("department", "it_support")
         priority_str = tool_result.get("priority", "medium")
         
@@ -226,9 +316,9 @@ async def chat(
                 subject=tool_result.get("subject", "Новое обращение"),
                 description=tool_result.get("description", request.message),
                 client_email=tool_result.get("client_email"),
-                priority=TicketPriority(priority_str),
+                priority=PRIORITY_BY_VALUE.get(priority_str, TicketPriority.MEDIUM),
                 source=TicketSource.CHAT,
-                department_id=dept_mapping.get(dept),
+                department_id=DEPARTMENT_IDS.get(dept),
             )
             # create_ticket returns tuple (Ticket, AIClassificationResult)
             db_ticket, classification = await ticket_service.create_ticket(ticket_data)
@@ -240,32 +330,22 @@ async def chat(
             tool_result["ticket_id"] = ticket_id
             tool_result["ai_auto_resolved"] = db_ticket.ai_auto_resolved
             result["tool_call"]["result"] = tool_result
-        except Exception as e:
-            print(f"Error creating ticket in DB: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error creating ticket in DB")
         
         # Также сохраняем для оператора (Redis/memory)
-        import uuid as uuid_module
-        escalation = {
-            "id": str(uuid_module.uuid4()),
-            "escalation_id": ticket_number or tool_result.get("ticket_number"),
-            "client_message": request.message,
-            "summary": tool_result.get("subject", ""),
-            "reason": "Клиент создал тикет",
-            "department": dept,
-            "department_name": dept_name_mapping.get(dept, "IT Поддержка"),
-            "priority": priority_str,
-            "status": "pending",
-            "created_at": datetime.utcnow().isoformat() + "Z",
-            "conversation_history": [
-                {"content": m.content, "is_user": m.is_user}
-                for m in (request.conversation_history or [])
-            ] + [{"content": request.message, "is_user": True}],
-            "client_messages": [],
-            "operator_messages": [],
-            "ticket_id": ticket_id,  # Связь с БД тикетом
-        }
+        escalation = _build_escalation(
+            request,
+            escalation_history,
+            now_iso,
+            escalation_id=ticket_number or tool_result.get("ticket_number"),
+            summary=tool_result.get("subject", ""),
+            reason="Клиент создал тикет",
+            department=dept,
+            department_name=DEPARTMENT_NAMES.get(dept, "IT Поддержка"),
+            priority=priority_str,
+            ticket_id=ticket_id,
+        )
         await escalation_store.add(escalation)
     
     # Если был tool_call с отметкой "решено AI" - создаём/обновляем тикет как авто-решённый
@@ -274,7 +354,6 @@ async def chat(
         
         try:
             ticket_service = TicketService(session)
-            from ...models.ticket import TicketStatus
             
             # Определяем тему из истории разговора
             subject = "Запрос решён AI"
@@ -290,15 +369,8 @@ async def chat(
                 source=TicketSource.CHAT,
             )
             
-            db_ticket, classification = await ticket_service.create_ticket(ticket_data)
-            
-            # Принудительно помечаем как авто-решённый AI
-            db_ticket.ai_auto_resolved = True
-            db_ticket.status = TicketStatus.RESOLVED
-            db_ticket.resolved_at = datetime.now()
-            db_ticket.first_response_at = datetime.now()
-            await session.commit()
-            await session.refresh(db_ticket)
+            # Сразу создаём как авто-решённый AI (один коммит)
+            db_ticket, classification = await ticket_service.create_ticket(ticket_data, resolved_by_ai=True)
             
             # Обновляем результат
             tool_result["ticket_number"] = db_ticket.ticket_number
@@ -306,39 +378,30 @@ async def chat(
             result["tool_call"]["result"] = tool_result
             
             # Добавляем в escalation_store для отслеживания (с поддержкой Redis)
-            import uuid as uuid_module
-            escalation = {
-                "id": str(uuid_module.uuid4()),
-                "escalation_id": db_ticket.ticket_number,
-                "client_message": request.message,
-                "summary": subject,
-                "reason": f"AI решено: {tool_result.get('resolution_summary', '')}",
-                "department": "it_support",
-                "department_name": "AI Поддержка",
-                "priority": "low",
-                "status": "resolved",  # Уже решено!
-                "created_at": datetime.utcnow().isoformat() + "Z",
-                "resolved_at": datetime.utcnow().isoformat() + "Z",
-                "conversation_history": [
-                    {"content": m.content, "is_user": m.is_user}
-                    for m in (request.conversation_history or [])
-                ] + [{"content": request.message, "is_user": True}],
-                "client_messages": [],
-                "operator_messages": [],
-                "ticket_id": str(db_ticket.id),
-                "ai_auto_resolved": True,
-            }
+            escalation = _build_escalation(
+                request,
+                escalation_history,
+                now_iso,
+                escalation_id=db_ticket.ticket_number,
+                summary=subject,
+                reason=f"AI решено: {tool_result.get('resolution_summary', '')}",
+                department="it_support",
+                department_name="AI Поддержка",
+                priority="low",
+                ticket_id=str(db_ticket.id),
+                status="resolved",  # Уже решено!
+                resolved_at=now_iso,
+                ai_auto_resolved=True,
+            )
             await escalation_store.add(escalation)
             
-        except Exception as e:
-            print(f"Error creating AI-resolved ticket in DB: {e}")
-            import traceback
-            traceback.print_exc()
+        except Exception:
+            logger.exception("Error creating AI-resolved ticket in DB")
     
     return ChatResponse(**result)
 
 
-@router.get("/search")
+@router.get("/search", response_model=list[KBHit])
 async def search_knowledge_base(query: str, top_k: int = 3) -> list[dict[str, Any]]:
     """
     Поиск по иерархической базе знаний.
@@ -349,17 +412,37 @@ async def search_knowledge_base(query: str, top_k: int = 3) -> list[dict[str, An
     return results
 
 
-@router.get("/categories")
-async def get_categories() -> list[dict[str, Any]]:
+def _etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """
+    Проверка If-None-Match (список тегов через запятую или *).
+    
+    Сравнение слабое (RFC 9110): префикс W/ отбрасывается с обеих сторон — прокси
+    с gzip превращают наш тег в W/"...", и без этого 304 никогда не возвращался бы.
+    """
+    if not if_none_match:
+        return False
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return "*" in tags or etag.removeprefix("W/") in tags
+
+
+@router.get("/categories", response_model=list[CategoryNode])
+async def get_categories(
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Response:
     """
     Возвращает структуру категорий базы знаний.
     
-    Полезно для построения навигации в UI.
+    Полезно для построения навигации в UI. Ответ кешируется клиентом
+    (ETag + Cache-Control); при совпадении If-None-Match возвращается 304.
     """
-    return rag_service.get_categories()
+    body, etag = rag_service.get_categories_payload()
+    headers = {"ETag": etag, "Cache-Control": "max-age=60"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
-@router.post("/knowledge-base/add")
+@router.post("/knowledge-base/add", response_model=AddArticleResponse)
 async def add_article(request: AddArticleRequest) -> dict[str, Any]:
     """
     Добавляет новую статью в базу знаний.
@@ -390,7 +473,7 @@ async def add_article(request: AddArticleRequest) -> dict[str, Any]:
     }
 
 
-@router.get("/health")
+@router.get("/health", response_model=HealthResponse)
 async def health_check() -> dict[str, Any]:
     """Проверка состояния RAG сервиса."""
     return {
@@ -422,11 +505,7 @@ async def get_ai_stats() -> dict[str, Any]:
         "ai_enabled": rag_service.use_openai,
         "ai_model": rag_service.model,
         "knowledge_base_categories": len(rag_service.knowledge_base),
-        "knowledge_base_articles": sum(
-            len(sub.get("articles", []))
-            for cat in rag_service.knowledge_base.values()
-            for sub in cat.get("subcategories", {}).values()
-        ),
+        "knowledge_base_articles": rag_service.article_count,
         "storage_backend": stats["storage"],
         "redis_connected": redis_service.is_connected,
     }
@@ -436,15 +515,61 @@ async def get_ai_stats() -> dict[str, Any]:
 # API для операторов - управление эскалациями
 # ============================================================================
 
-@router.get("/escalations")
-async def get_escalations(status: str | None = None) -> list[dict[str, Any]]:
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def _ndjson_lines(items: list[dict[str, Any]]):
+    """Построчная сериализация: каждая запись — отдельная JSON-строка."""
+    for item in items:
+        if orjson is not None:
+            yield orjson.dumps(item, default=str) + b"\n"
+        else:
+            yield (json.dumps(item, ensure_ascii=False, default=str) + "\n").encode()
+
+
+@router.get("/escalations", response_model=list[Escalation], response_model_exclude_unset=True)
+async def get_escalations(
+    response: Response,
+    status: str | None = None,
+    limit: Annotated[int | None, Query(ge=1, le=100)] = None,
+    offset: Annotated[int, Query(ge=0)] = 0,
+    accept: Annotated[str | None, Header()] = None,
+    if_none_match: Annotated[str | None, Header()] = None,
+) -> Any:
     """
-    Получить список эскалированных обращений.
+    Получить список эскалированных обращений (новые первые).
     
     Args:
         status: Фильтр по статусу (pending, in_progress, resolved)
+        limit: Размер страницы (без limit — весь список начиная с offset;
+            интерфейс оператора пока не постранично загружает очередь)
+        offset: Смещение
+    
+    Общее количество возвращается в заголовке X-Total-Count.
+    С заголовком Accept: application/x-ndjson ответ отдаётся потоком, по записи на строку.
+    ETag меняется при любой записи в хранилище эскалаций; при совпадении
+    If-None-Match возвращается 304 без чтения и сериализации списка.
     """
-    return await escalation_store.get_all(status)
+    as_ndjson = bool(accept and NDJSON_MEDIA_TYPE in accept)
+    # Версию читаем до данных: при гонке с записью ETag окажется старше, а не новее
+    version = await escalation_store.get_version()
+    etag = f'W/"esc-{version}{"-nd" if as_ndjson else ""}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept"}
+    if _etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+    
+    escalations, total = await escalation_store.get_page(status, limit=limit, offset=offset)
+    headers["X-Total-Count"] = str(total)
+    
+    if as_ndjson:
+        return StreamingResponse(
+            _ndjson_lines(escalations),
+            media_type=NDJSON_MEDIA_TYPE,
+            headers=headers,
+        )
+    
+    response.headers.update(headers)
+    return escalations
 
 
 @router.get("/escalations/{escalation_id}")
@@ -456,34 +581,34 @@ async def get_escalation(escalation_id: str) -> dict[str, Any]:
     return {"error": "Эскалация не найдена"}
 
 
-class UpdateEscalationRequest(BaseModel):
+class UpdateEscalationRequest(_RequestBody):
     status: str | None = None
     operator_response: str | None = None
 
 
-class CSATRatingRequest(BaseModel):
+class CSATRatingRequest(_RequestBody):
     escalation_id: str
     rating: int  # 1-5 stars
     feedback: str | None = None
 
 
-class SummarizeRequest(BaseModel):
+class SummarizeRequest(_RequestBody):
     text: str
     language: str = "ru"
 
 
-class TranslateRequest(BaseModel):
+class TranslateRequest(_RequestBody):
     text: str
     target_language: str  # "ru" or "kz"
 
 
-class GenerateSuggestionRequest(BaseModel):
+class GenerateSuggestionRequest(_RequestBody):
     client_message: str
     context: str | None = None
     language: str = "ru"
 
 
-class AnalyzeConversationRequest(BaseModel):
+class AnalyzeConversationRequest(_RequestBody):
     escalation_id: str
     language: str = "ru"
 
@@ -503,96 +628,115 @@ async def update_escalation(
     
     Также синхронизирует статус с тикетом в базе данных.
     """
-    from ...models.ticket import Ticket, TicketStatus
-    from sqlalchemy import select
-    import uuid
-    
     # Получаем эскалацию
     escalation = await escalation_store.get_by_id(escalation_id)
     if not escalation:
         return {"success": False, "error": "Эскалация не найдена"}
     
-    if request.status:
-        # Обновляем статус
-        await escalation_store.set_status(escalation_id, request.status)
-        escalation["status"] = request.status
-        
-        # Синхронизируем статус с тикетом в БД
-        ticket_id = escalation.get("ticket_id")
-        if ticket_id:
-            try:
-                result = await session.execute(
-                    select(Ticket).where(Ticket.id == uuid.UUID(ticket_id))
-                )
-                db_ticket = result.scalar_one_or_none()
-                
-                if db_ticket:
-                    if request.status == "in_progress":
-                        db_ticket.status = TicketStatus.PROCESSING
-                        db_ticket.first_response_at = db_ticket.first_response_at or datetime.now()
-                    elif request.status == "resolved":
-                        db_ticket.status = TicketStatus.RESOLVED
-                        db_ticket.resolved_at = datetime.now()
-                    elif request.status == "pending":
-                        db_ticket.status = TicketStatus.NEW
-                    
-                    await session.commit()
-            except Exception as e:
-                print(f"Error updating ticket status in DB: {e}")
-                import traceback
-                traceback.print_exc()
-        
-        # Если resolved и WhatsApp эскалация — уведомляем клиента
-        if request.status == "resolved" and escalation.get("source") == "whatsapp":
-            phone_number = escalation.get("phone_number")
-            if phone_number:
-                try:
-                    await twilio_whatsapp_service.send_message(
-                        phone_number,
-                        "✅ Ваше обращение решено. Спасибо за обращение!\n\nЕсли у вас есть новые вопросы, просто напишите нам."
-                    )
-                    from .integrations.twilio_whatsapp import phone_to_escalation
-                    if phone_number in phone_to_escalation:
-                        del phone_to_escalation[phone_number]
-                except Exception as e:
-                    print(f"Error notifying WhatsApp client about resolution: {e}")
+    # Одно время (UTC, как в TicketService) для всех полей тикета в этом запросе
+    now = datetime.utcnow()
+    
+    # Хранилище эскалаций, БД и Twilio не зависят друг от друга — выполняем
+    # параллельно. Внутри каждой задачи порядок сохраняется (одна запись
+    # эскалации, одна сессия БД, порядок сообщений клиенту).
+    operations = {
+        "escalation store": _apply_escalation_updates(escalation_id, request),
+        "ticket sync": _sync_ticket(session, escalation.get("ticket_id"), request, now),
+        "whatsapp notify": _notify_whatsapp_client(escalation, request),
+    }
+    results = await asyncio.gather(*operations.values(), return_exceptions=True)
+    
+    failed_steps = []
+    for name, result in zip(operations, results):
+        if isinstance(result, Exception):
+            logger.error("update_escalation: %s failed", name, exc_info=result)
+            failed_steps.append(name)
     
+    updated_escalation = results[0]
+    if isinstance(updated_escalation, Exception) or not updated_escalation:
+        updated_escalation = escalation
+    
+    # Запись эскалации и синхронизация тикета обязательны; уведомление в WhatsApp — нет
+    critical_failures = [name for name in failed_steps if name != "whatsapp notify"]
+    if critical_failures:
+        return {
+            "success": False,
+            "error": f"Не удалось выполнить: {', '.join(critical_failures)}",
+            "failed_steps": failed_steps,
+            "escalation": updated_escalation,
+        }
+    return {"success": True, "escalation": updated_escalation, "failed_steps": failed_steps}
+
+
+async def _apply_escalation_updates(
+    escalation_id: str,
+    request: UpdateEscalationRequest,
+) -> dict[str, Any] | None:
+    """Статус и ответ оператора — последовательно, т.к. это одна запись."""
+    updated = None
+    if request.status:
+        updated = await escalation_store.set_status(escalation_id, request.status)
     if request.operator_response:
-        # Добавляем ответ оператора
         updated = await escalation_store.add_operator_message(escalation_id, request.operator_response)
-        if updated:
-            escalation = updated
+    return updated
+
+
+async def _sync_ticket(
+    session: AsyncSession,
+    ticket_id: str | None,
+    request: UpdateEscalationRequest,
+    now: datetime,
+) -> None:
+    """Синхронизация тикета в БД: один SELECT ... FOR UPDATE и один commit."""
+    if not ticket_id or not (request.status or request.operator_response):
+        return
+    
+    try:
+        # Загрузка по первичному ключу (без компиляции select) с блокировкой строки
+        db_ticket = await session.get(Ticket, uuid.UUID(ticket_id), with_for_update=True)
         
-        # Если WhatsApp эскалация — отправляем ответ
-        if escalation.get("source") == "whatsapp":
-            phone_number = escalation.get("phone_number")
-            if phone_number:
-                try:
-                    operator_message = f"👨‍💼 Оператор:\n\n{request.operator_response}"
-                    await twilio_whatsapp_service.send_message(phone_number, operator_message)
-                    print(f"Operator response sent to WhatsApp: {phone_number}")
-                except Exception as e:
-                    print(f"Error sending operator response to WhatsApp: {e}")
+        if db_ticket:
+            if request.status == "in_progress":
+                db_ticket.status = TicketStatus.PROCESSING
+                db_ticket.first_response_at = db_ticket.first_response_at or now
+            elif request.status == "resolved":
+                db_ticket.status = TicketStatus.RESOLVED
+                db_ticket.resolved_at = now
+            elif request.status == "pending":
+                db_ticket.status = TicketStatus.NEW
+            
+            # Первый ответ оператора
+            if request.operator_response and not db_ticket.first_response_at:
+                db_ticket.first_response_at = now
+                if db_ticket.status == TicketStatus.NEW:
+                    db_ticket.status = TicketStatus.PROCESSING
         
-        # Обновляем first_response_at в БД если это первый ответ
-        ticket_id = escalation.get("ticket_id")
-        if ticket_id:
-            try:
-                result = await session.execute(
-                    select(Ticket).where(Ticket.id == uuid.UUID(ticket_id))
-                )
-                db_ticket = result.scalar_one_or_none()
-                if db_ticket and not db_ticket.first_response_at:
-                    db_ticket.first_response_at = datetime.now()
-                    if db_ticket.status == TicketStatus.NEW:
-                        db_ticket.status = TicketStatus.PROCESSING
-                    await session.commit()
-            except Exception as e:
-                print(f"Error updating ticket first_response_at: {e}")
-    
-    # Получаем обновлённую эскалацию
-    updated_escalation = await escalation_store.get_by_id(escalation_id)
-    return {"success": True, "escalation": updated_escalation or escalation}
+        await session.commit()
+    except Exception:
+        await session.rollback()
+        raise
+
+
+async def _notify_whatsapp_client(
+    escalation: dict[str, Any],
+    request: UpdateEscalationRequest,
+) -> None:
+    """Уведомления клиенту WhatsApp (решение, ответ оператора) — по порядку."""
+    phone_number = escalation.get("phone_number")
+    if escalation.get("source") != "whatsapp" or not phone_number:
+        return
+    
+    if request.status == "resolved":
+        await twilio_whatsapp_service.send_message(
+            phone_number,
+            "✅ Ваше обращение решено. Спасибо за обращение!\n\nЕсли у вас есть новые вопросы, просто напишите нам."
+        )
+        await whatsapp_escalation_links.delete(phone_number)
+    
+    if request.operator_response:
+        operator_message = f"👨‍💼 Оператор:\n\n{request.operator_response}"
+        await twilio_whatsapp_service.send_message(phone_number, operator_message)
+        logger.info("Operator response sent to WhatsApp: %s", phone_number)
 
 
 @router.delete("/escalations/{escalation_id}")
@@ -648,6 +792,63 @@ async def suggest_response(request: GenerateSuggestionRequest) -> dict[str, Any]
     return {"suggestion": suggestion}
 
 
+async def _sse_events(chunks: AsyncIterator[str]) -> AsyncIterator[str]:
+    """
+    Оборачивает фрагменты текста в события SSE: data: {"delta": ...}, в конце data: [DONE].
+    
+    Обрыв генерации после части ответа — событие event: error вместо [DONE],
+    чтобы клиент не принял обрезанный текст за полный.
+    """
+    try:
+        async for chunk in chunks:
+            yield f"data: {json.dumps({'delta': chunk}, ensure_ascii=False)}\n\n"
+    except Exception:
+        error = {"error": "Генерация прервана, ответ неполный"}
+        yield f"event: error\ndata: {json.dumps(error, ensure_ascii=False)}\n\n"
+        return
+    yield "data: [DONE]\n\n"
+
+
+def _sse_response(chunks: AsyncIterator[str]) -> StreamingResponse:
+    return StreamingResponse(
+        _sse_events(chunks),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.post("/summarize/stream")
+async def summarize_text_stream(request: SummarizeRequest) -> StreamingResponse:
+    """Потоковое резюмирование (SSE): первые слова приходят до окончания генерации."""
+    return _sse_response(rag_service.summarize_stream(request.text, request.language))
+
+
+@router.post("/translate/stream")
+async def translate_text_stream(request: TranslateRequest) -> StreamingResponse:
+    """Потоковый перевод (SSE)."""
+    return _sse_response(rag_service.translate_stream(request.text, request.target_language))
+
+
+@router.post("/suggest-response/stream")
+async def suggest_response_stream(request: GenerateSuggestionRequest) -> StreamingResponse:
+    """Потоковая подсказка ответа для оператора (SSE)."""
+    return _sse_response(
+        rag_service.generate_response_suggestion_stream(
+            request.client_message,
+            request.context,
+            request.language,
+        )
+    )
+
+
+# Роль автора сообщения по флагам: индекс = is_user | (is_operator << 1)
+CONVERSATION_ROLES = ("AI", "Клиент", "Оператор", "Клиент")
+
+
+def _conversation_role(msg: dict[str, Any]) -> str:
+    return CONVERSATION_ROLES[bool(msg.get("is_user")) | (bool(msg.get("is_operator")) << 1)]
+
+
 @router.post("/analyze-conversation")
 async def analyze_conversation(request: AnalyzeConversationRequest) -> dict[str, Any]:
     """
@@ -662,21 +863,17 @@ async def analyze_conversation(request: AnalyzeConversationRequest) -> dict[str,
     if not escalation:
         return {"success": False, "error": "Эскалация не найдена"}
     
-    # Собрать всю переписку
-    conversation_text = ""
-    
-    # Добавляем историю разговора
-    for msg in escalation.get("conversation_history", []):
-        role = "Клиент" if msg.get("is_user") else ("Оператор" if msg.get("is_operator") else "AI")
-        conversation_text += f"{role}: {msg['content']}\n\n"
-    
-    # Добавляем сообщения клиента
-    for msg in escalation.get("client_messages", []):
-        conversation_text += f"Клиент: {msg['content']}\n\n"
-    
-    # Добавляем ответы оператора
-    for msg in escalation.get("operator_messages", []):
-        conversation_text += f"Оператор: {msg['content']}\n\n"
+    # Собрать всю переписку одним проходом: история разговора,
+    # сообщения клиента, ответы оператора
+    messages = chain(
+        (
+            (_conversation_role(msg), msg["content"])
+            for msg in escalation.get("conversation_history", [])
+        ),
+        (("Клиент", msg["content"]) for msg in escalation.get("client_messages", [])),
+        (("Оператор", msg["content"]) for msg in escalation.get("operator_messages", [])),
+    )
+    conversation_text = "".join(f"{role}: {content}\n\n" for role, content in messages)
     
     if not conversation_text.strip():
         return {"success": False, "error": "Нет переписки для анализа"}
@@ -729,30 +926,28 @@ async def get_csat_stats() -> dict[str, Any]:
     
     Возвращает средний балл и распределение оценок.
     """
-    all_escalations = await escalation_store.get_all()
-    ratings = [e.get("csat_rating") for e in all_escalations if e.get("csat_rating")]
+    # Гистограмма ведётся хранилищем; здесь только O(1) арифметика по 5 корзинам
+    rating_counts = await escalation_store.get_csat_distribution()
+    distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
+    distribution.update(rating_counts)
+    total = sum(rating_counts.values())
     
-    if not ratings:
+    if not total:
         return {
             "average": 0,
             "total_responses": 0,
-            "distribution": {1: 0, 2: 0, 3: 0, 4: 0, 5: 0},
+            "distribution": distribution,
             "satisfaction_rate": 0,
         }
     
-    distribution = {1: 0, 2: 0, 3: 0, 4: 0, 5: 0}
-    for r in ratings:
-        distribution[r] = distribution.get(r, 0) + 1
-    
     # Satisfaction rate = % оценок 4-5
-    satisfied = sum(1 for r in ratings if r >= 4)
-    satisfaction_rate = satisfied / len(ratings) if ratings else 0
+    satisfied = sum(count for rating, count in rating_counts.items() if rating >= 4)
     
     return {
-        "average": sum(ratings) / len(ratings),
-        "total_responses": len(ratings),
+        "average": sum(rating * count for rating, count in rating_counts.items()) / total,
+        "total_responses": total,
         "distribution": distribution,
-        "satisfaction_rate": satisfaction_rate,
+        "satisfaction_rate": satisfied / total,
     }
 
 
@@ -763,23 +958,19 @@ async def get_csat_reviews() -> list[dict[str, Any]]:
     
     Возвращает список отзывов, отсортированных по дате.
     """
-    all_escalations = await escalation_store.get_all()
-    reviews = []
-    for e in all_escalations:
-        if e.get("csat_rating"):
-            reviews.append({
-                "escalation_id": e.get("escalation_id"),
-                "rating": e.get("csat_rating"),
-                "feedback": e.get("csat_feedback"),
-                "submitted_at": e.get("csat_submitted_at"),
-                "summary": e.get("summary"),
-                "department_name": e.get("department_name"),
-                "resolved_at": e.get("resolved_at"),
-            })
-    
-    # Sort by submission date (newest first)
-    reviews.sort(key=lambda x: x.get("submitted_at", ""), reverse=True)
-    return reviews
+    # Хранилище отдаёт только оценённые эскалации, уже отсортированные (новые первые)
+    return [
+        {
+            "escalation_id": e.get("escalation_id"),
+            "rating": e.get("csat_rating"),
+            "feedback": e.get("csat_feedback"),
+            "submitted_at": e.get("csat_submitted_at"),
+            "summary": e.get("summary"),
+            "department_name": e.get("department_name"),
+            "resolved_at": e.get("resolved_at"),
+        }
+        for e in await escalation_store.get_csat_reviewed()
+    ]
 
 
 # ============================================================================
@@ -808,6 +999,7 @@ async def invalidate_rag_cache() -> dict[str, Any]:
     Используется после добавления новых статей в базу знаний.
     """
     count = await redis_service.invalidate_rag_cache()
+    count += await redis_service.invalidate_ai_cache()
     return {
         "success": True,
         "invalidated_entries": count,
@@ -1,30 +1,41 @@
 """API роуты для Email интеграции."""
 
 import asyncio
+import logging
+from contextlib import suppress
 from datetime import datetime
 from typing import Any
 
-from fastapi import APIRouter, Depends, BackgroundTasks
+from fastapi import APIRouter, Depends, FastAPI, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from pydantic import BaseModel
+from pydantic import BaseModel, ConfigDict
 
-from ....db.session import get_session
+from ....db.session import async_session_factory, get_session
 from ....services.integrations.email_service import email_service
 from ....services.ticket_service import TicketService
 from ....services.AI import rag_service
 from ....schemas.ticket import TicketCreate, TicketSource, TicketPriority
+from ....core.language import detect_language
+from ....core.redis import redis_service
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/email", tags=["email"])
 
-# Хранилище обработанных email (чтобы не дублировать)
-processed_emails: set[str] = set()
+# Дедупликация писем — в Redis (общая для воркеров, с TTL).
+# Fallback без Redis: обработанные message_id в памяти, старые вытесняются.
+MEMORY_MAX_PROCESSED_EMAILS = 10000
+processed_emails: dict[str, None] = {}
+processed_emails_count = 0
 
-# Флаг работы поллинга
-email_polling_active = False
+# Сколько писем из IMAP обрабатывать одновременно в /fetch
+EMAIL_FETCH_CONCURRENCY = 5
 
 
 class EmailWebhookPayload(BaseModel):
     """Payload для входящего email (от внешних сервисов типа SendGrid, Mailgun)."""
+    
+    model_config = ConfigDict(extra="ignore", frozen=True, str_strip_whitespace=True)
+    
     from_email: str
     from_name: str | None = None
     subject: str
@@ -35,6 +46,9 @@ class EmailWebhookPayload(BaseModel):
 
 class ManualEmailRequest(BaseModel):
     """Ручное создание тикета из email."""
+    
+    model_config = ConfigDict(extra="ignore", frozen=True, str_strip_whitespace=True)
+    
     from_email: str
     from_name: str | None = None
     subject: str
@@ -51,17 +65,14 @@ async def receive_email_webhook(
     
     Используется с сервисами типа SendGrid Inbound Parse, Mailgun, etc.
     """
+    # Атомарно занимаем письмо — два воркера не создадут дубль тикета
+    if payload.message_id and not await _claim_email(payload.message_id):
+        return {"status": "duplicate", "message": "Email already processed"}
+    
+    ticket_created = False
     try:
-        # Проверяем, не обработано ли уже
-        if payload.message_id and payload.message_id in processed_emails:
-            return {"status": "duplicate", "message": "Email already processed"}
-        
-        # AI классификация и ответ
-        language = "ru"  # По умолчанию русский
-        
-        # Определяем язык по тексту
-        if any(c in payload.body for c in "әғқңөұүһі"):
-            language = "kz"
+        # AI классификация и ответ: определяем язык по тексту
+        language = detect_language(payload.body)
         
         # Обрабатываем через AI
         ai_result = await rag_service.chat(
@@ -89,10 +100,8 @@ async def receive_email_webhook(
         )
         
         db_ticket, classification = await ticket_service.create_ticket(ticket_data)
-        
-        # Помечаем как обработанное
-        if payload.message_id:
-            processed_emails.add(payload.message_id)
+        ticket_created = True
+        await _count_processed_email()
         
         # Отправляем подтверждение
         await email_service.send_ticket_confirmation(
@@ -118,12 +127,39 @@ async def receive_email_webhook(
         }
         
     except Exception as e:
-        print(f"Email webhook error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Email webhook error")
+        # Тикет не создан — снимаем отметку, чтобы письмо обработалось повторно.
+        # Если тикет уже есть (упала отправка подтверждения), отметка остаётся: иначе повтор создаст дубль
+        if payload.message_id and not ticket_created:
+            await _release_email(payload.message_id)
         return {"status": "error", "message": str(e)}
 
 
+async def _claim_email(message_id: str) -> bool:
+    """True, если письмо ещё не обрабатывалось (и теперь занято этим запросом)."""
+    claimed = await redis_service.claim_email(message_id)
+    if claimed is not None:
+        return claimed
+    
+    if message_id in processed_emails:
+        return False
+    processed_emails[message_id] = None
+    if len(processed_emails) > MEMORY_MAX_PROCESSED_EMAILS:
+        del processed_emails[next(iter(processed_emails))]
+    return True
+
+
+async def _release_email(message_id: str) -> None:
+    await redis_service.release_email(message_id)
+    processed_emails.pop(message_id, None)
+
+
+async def _count_processed_email() -> None:
+    global processed_emails_count
+    processed_emails_count += 1
+    await redis_service.incr_processed_emails()
+
+
 @router.post("/manual")
 async def create_ticket_from_email(
     request: ManualEmailRequest,
@@ -143,48 +179,20 @@ async def create_ticket_from_email(
 
 @router.post("/fetch")
 async def fetch_emails(
-    background_tasks: BackgroundTasks,
-    session: AsyncSession = Depends(get_session),
     limit: int = 10,
 ) -> dict[str, Any]:
     """
     Ручной запуск проверки новых email через IMAP.
+    
+    Письма обрабатываются параллельно (не более EMAIL_FETCH_CONCURRENCY
+    одновременно — лимиты OpenAI и пула БД), каждое в своей сессии БД.
     """
     if not email_service.enabled:
         return {"status": "error", "message": "Email service not configured"}
     
     # Получаем новые письма
     emails = await email_service.fetch_new_emails(limit=limit)
-    
-    created_tickets = []
-    
-    for email_data in emails:
-        # Проверяем, не обработано ли
-        if email_data["message_id"] in processed_emails:
-            continue
-        
-        try:
-            # Создаём тикет через webhook handler
-            payload = EmailWebhookPayload(
-                from_email=email_data["from_email"],
-                from_name=email_data["from_name"],
-                subject=email_data["subject"],
-                body=email_data["body"],
-                message_id=email_data["message_id"],
-                timestamp=email_data["timestamp"].isoformat(),
-            )
-            
-            result = await receive_email_webhook(payload, session)
-            
-            if result.get("ticket_number"):
-                created_tickets.append(result["ticket_number"])
-                
-                # Помечаем как прочитанное в IMAP
-                await email_service.mark_as_read(email_data["imap_id"])
-                
-        except Exception as e:
-            print(f"Error processing email: {e}")
-            continue
+    created_tickets = await _ingest_fetched_emails(emails)
     
     return {
         "status": "ok",
@@ -193,22 +201,112 @@ async def fetch_emails(
     }
 
 
+async def _ingest_fetched_emails(emails: list[dict[str, Any]]) -> list[str]:
+    """Создать тикеты из писем IMAP параллельно (не более EMAIL_FETCH_CONCURRENCY); номера созданных тикетов."""
+    semaphore = asyncio.Semaphore(EMAIL_FETCH_CONCURRENCY)
+    results = await asyncio.gather(
+        *(_ingest_fetched_email(email_data, semaphore) for email_data in emails),
+        return_exceptions=True,
+    )
+    
+    created_tickets = []
+    for result in results:
+        if isinstance(result, Exception):
+            logger.error("Error processing email", exc_info=result)
+        elif result:
+            created_tickets.append(result)
+    return created_tickets
+
+
+async def _ingest_fetched_email(email_data: dict[str, Any], semaphore: asyncio.Semaphore) -> str | None:
+    """Создать тикет из письма IMAP; возвращает номер тикета."""
+    # Создаём тикет через webhook handler (дубли он отсекает сам)
+    payload = EmailWebhookPayload(
+        from_email=email_data["from_email"],
+        from_name=email_data["from_name"],
+        subject=email_data["subject"],
+        body=email_data["body"],
+        message_id=email_data["message_id"],
+        timestamp=email_data["timestamp"].isoformat(),
+    )
+    
+    async with semaphore:
+        # AsyncSession нельзя делить между конкурентными задачами
+        async with async_session_factory() as session:
+            result = await receive_email_webhook(payload, session)
+        
+        if not result.get("ticket_number"):
+            return None
+        
+        # Помечаем как прочитанное в IMAP
+        await email_service.mark_as_read(email_data["imap_id"])
+        return result["ticket_number"]
+
+
 @router.get("/status")
-async def get_status() -> dict[str, Any]:
+async def get_status(request: Request) -> dict[str, Any]:
     """Статус Email интеграции."""
+    processed_count = await redis_service.get_processed_email_count()
+    if processed_count is None:
+        processed_count = processed_emails_count
     return {
         "enabled": email_service.enabled,
         "imap_server": email_service.imap_server,
         "smtp_server": email_service.smtp_server,
         "email_address": email_service.email_address[:5] + "***" if email_service.email_address else None,
-        "processed_count": len(processed_emails),
-        "polling_active": email_polling_active,
+        "processed_count": processed_count,
+        "polling_active": _polling_task(request) is not None,
     }
 
 
+def _polling_task(request: Request) -> asyncio.Task | None:
+    """Задача поллинга, если она сейчас работает (одна на приложение)."""
+    task = getattr(request.app.state, "email_poll_task", None)
+    if task is not None and not task.done():
+        return task
+    return None
+
+
+async def _poll_emails(interval_seconds: int) -> None:
+    """
+    Периодическая проверка почты; живёт до отмены задачи.
+    
+    fetch_new_emails помечает письма прочитанными (\\Seen), поэтому каждое
+    полученное письмо обязательно проходит через создание тикета — как в /fetch.
+    """
+    while True:
+        try:
+            logger.debug("Email polling: checking for new emails")
+            emails = await email_service.fetch_new_emails(limit=10)
+            created_tickets = await _ingest_fetched_emails(emails)
+            if emails:
+                logger.info(
+                    "Email polling: fetched %d emails, created %d tickets",
+                    len(emails),
+                    len(created_tickets),
+                )
+        except Exception:
+            logger.exception("Email polling error")
+        
+        await asyncio.sleep(interval_seconds)
+
+
+async def stop_email_polling(app: FastAPI) -> bool:
+    """Отменить задачу поллинга и дождаться её завершения. True — если она работала."""
+    task = getattr(app.state, "email_poll_task", None)
+    app.state.email_poll_task = None
+    if task is None or task.done():
+        return False
+    
+    task.cancel()
+    with suppress(asyncio.CancelledError):
+        await task
+    return True
+
+
 @router.post("/polling/start")
 async def start_polling(
-    background_tasks: BackgroundTasks,
+    request: Request,
     interval_seconds: int = 60,
 ) -> dict[str, Any]:
     """
@@ -217,40 +315,22 @@ async def start_polling(
     Args:
         interval_seconds: Интервал проверки в секундах
     """
-    global email_polling_active
-    
     if not email_service.enabled:
         return {"status": "error", "message": "Email service not configured"}
     
-    if email_polling_active:
+    if _polling_task(request):
         return {"status": "already_running"}
     
-    email_polling_active = True
-    
-    async def poll_emails():
-        global email_polling_active
-        while email_polling_active:
-            try:
-                # Здесь нужна новая сессия для каждой итерации
-                # В реальном приложении использовать proper dependency injection
-                print(f"[Email Polling] Checking for new emails...")
-                emails = await email_service.fetch_new_emails(limit=10)
-                print(f"[Email Polling] Found {len(emails)} new emails")
-            except Exception as e:
-                print(f"[Email Polling] Error: {e}")
-            
-            await asyncio.sleep(interval_seconds)
-    
-    background_tasks.add_task(poll_emails)
+    # Задача живёт столько же, сколько приложение (отменяется в lifespan)
+    request.app.state.email_poll_task = asyncio.create_task(_poll_emails(interval_seconds))
     
     return {"status": "started", "interval": interval_seconds}
 
 
 @router.post("/polling/stop")
-async def stop_polling() -> dict[str, Any]:
+async def stop_polling(request: Request) -> dict[str, Any]:
     """Остановка автоматической проверки email."""
-    global email_polling_active
-    email_polling_active = False
+    await stop_email_polling(request.app)
     return {"status": "stopped"}
 
 
@@ -1,13 +1,15 @@
 """API роуты для голосовой интеграции через Twilio Voice."""
 
 import logging
+import re
+import uuid as uuid_module
 from datetime import datetime
 from typing import Any
 
 from fastapi import APIRouter, Depends, Request, Form
 from fastapi.responses import Response
 from sqlalchemy.ext.asyncio import AsyncSession
-from twilio.twiml.voice_response import VoiceResponse, Gather, Dial, Say
+from twilio.twiml.voice_response import VoiceResponse, Gather, Dial
 
 from ....db.session import get_session
 
@@ -17,19 +19,43 @@ from ....services.ticket_service import TicketService
 from ....services.AI import rag_service
 from ....schemas.ticket import TicketCreate, TicketSource, TicketPriority
 from ....core.config import get_settings
-from ..chat import escalations_store
+from ....core.language import detect_language
+from ....services.escalation_store import escalation_store
+from ....services.channel_session_store import (
+    ESCALATION_HISTORY_LIMIT,
+    append_session_message,
+    session_timestamp,
+    voice_session_store,
+)
+
+# Сколько последних реплик звонка хранится в сессии и уходит в AI
+CALL_HISTORY_LIMIT = 20
+
+# Эмодзи не озвучиваются
+_EMOJI_RE = re.compile(
+    "["
+    "\U0001F600-\U0001F64F"  # emoticons
+    "\U0001F300-\U0001F5FF"  # symbols & pictographs
+    "\U0001F680-\U0001F6FF"  # transport & map symbols
+    "\U0001F1E0-\U0001F1FF"  # flags
+    "\U00002702-\U000027B0"
+    "\U000024C2-\U0001F251"
+    "]+",
+    flags=re.UNICODE,
+)
+# Markdown: **bold**, *italic*, `code`, [link](url) — остаётся текст; ### заголовки — удаляются
+_MARKDOWN_RE = re.compile(r"\*\*(.+?)\*\*|\*(.+?)\*|`(.+?)`|\[(.+?)\]\(.+?\)|#+\s*")
+_WHITESPACE_RE = re.compile(r"\s+")
+# Хотя бы один символ markdown или эмодзи — без них чистить нечего
+_NEEDS_CLEAN_RE = re.compile(r"[*`\[#]|" + _EMOJI_RE.pattern)
+# Граница предложения: пробел после . ! ? или … (но не после номера пункта "1.")
+_SENTENCE_BOUNDARY_RE = re.compile(r"(?<=[.!?…])(?<!\d\.)\s+")
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/twilio-voice", tags=["twilio-voice"])
 settings = get_settings()
-
-# In-memory хранилище голосовых сессий (CallSid -> данные)
-voice_sessions: dict[str, dict[str, Any]] = {}
-
-
-def get_operator_phone() -> str | None:
-    """Получить номер телефона оператора из настроек."""
-    return getattr(settings, 'OPERATOR_PHONE_NUMBER', None)
+# Номер оператора для перевода звонков (настройки не меняются без рестарта)
+OPERATOR_PHONE_NUMBER: str | None = settings.OPERATOR_PHONE_NUMBER
 
 
 @router.post("/incoming")
@@ -49,15 +75,15 @@ async def handle_incoming_call(
     logger.info(f"📞 Incoming call from {From} (CallSid: {CallSid})")
     
     # Создаём сессию для этого звонка
-    voice_sessions[CallSid] = {
+    await voice_session_store.set(CallSid, {
         "from_number": From,
         "to_number": To,
         "caller_name": CallerName or "Клиент",
-        "started_at": datetime.now().isoformat(),
+        "started_at": session_timestamp(),
         "conversation": [],
         "language": "ru",
         "escalated": False,
-    }
+    })
     
     # Создаём TwiML ответ
     response = VoiceResponse()
@@ -105,12 +131,12 @@ async def process_speech(
     logger.info(f"🎤 Speech from {From}: '{SpeechResult}' (confidence: {Confidence})")
     
     # Получаем сессию
-    call_session = voice_sessions.get(CallSid, {
+    call_session = await voice_session_store.get(CallSid) or {
         "from_number": From,
         "conversation": [],
         "language": "ru",
         "escalated": False,
-    })
+    }
     
     user_text = SpeechResult.strip()
     
@@ -128,26 +154,18 @@ async def process_speech(
         return Response(content=str(response), media_type="application/xml")
     
     # Добавляем в историю
-    call_session["conversation"].append({
-        "content": user_text,
-        "is_user": True,
-        "timestamp": datetime.now().isoformat(),
-    })
+    append_session_message(call_session["conversation"], user_text, is_user=True, limit=CALL_HISTORY_LIMIT)
     
     # Определяем язык (казахский или русский)
-    language = "kz" if any(c in user_text for c in "әғқңөұүһі") else "ru"
+    language = detect_language(user_text, fallback=call_session.get("language", "ru"))
     call_session["language"] = language
     
     # Обрабатываем через AI
     try:
-        history = [
-            {"content": msg["content"], "is_user": msg["is_user"]}
-            for msg in call_session["conversation"][:-1]
-        ]
-        
         ai_result = await rag_service.chat(
             message=user_text,
-            conversation_history=history,
+            # История уже ограничена CALL_HISTORY_LIMIT — передаём срез без текущей реплики
+            conversation_history=call_session["conversation"][:-1],
             language=language,
         )
         
@@ -162,14 +180,10 @@ async def process_speech(
         tool_call = {"name": "escalate_to_operator"}
     
     # Добавляем ответ AI в историю
-    call_session["conversation"].append({
-        "content": response_text,
-        "is_user": False,
-        "timestamp": datetime.now().isoformat(),
-    })
+    append_session_message(call_session["conversation"], response_text, is_user=False, limit=CALL_HISTORY_LIMIT)
     
     # Сохраняем сессию
-    voice_sessions[CallSid] = call_session
+    await voice_session_store.set(CallSid, call_session)
     
     # Создаём TwiML ответ
     response = VoiceResponse()
@@ -180,8 +194,10 @@ async def process_speech(
             response, CallSid, call_session, session, user_text, tool_call.get("result", {})
         )
     
-    # Озвучиваем ответ AI (ускоренный 2x)
-    _say_fast(response, response_text)
+    # Озвучиваем ответ AI (ускоренный 2x) по предложениям: воспроизведение
+    # начинается после синтеза первого предложения, а не всего ответа
+    for sentence in _split_sentences(response_text):
+        _say_fast(response, sentence)
     
     # Спрашиваем есть ли ещё вопросы
     _say_fast(response, "Могу ли я ещё чем-то помочь?")
@@ -213,7 +229,7 @@ async def _transfer_to_operator(
 ) -> Response:
     """Перевод звонка на оператора."""
     
-    operator_phone = get_operator_phone()
+    operator_phone = OPERATOR_PHONE_NUMBER
     
     if not operator_phone:
         _say_fast(
@@ -246,7 +262,7 @@ async def _transfer_to_operator(
         
         # Создаём эскалацию
         escalation = {
-            "id": str(len(escalations_store) + 1),
+            "id": str(uuid_module.uuid4()),
             "escalation_id": ticket_number,
             "client_message": user_text,
             "summary": subject,
@@ -255,8 +271,8 @@ async def _transfer_to_operator(
             "department_name": "IT Поддержка",
             "priority": priority_str,
             "status": "pending",
-            "created_at": datetime.now().isoformat(),
-            "conversation_history": call_session.get("conversation", []),
+            "created_at": datetime.utcnow().isoformat() + "Z",
+            "conversation_history": call_session.get("conversation", [])[-ESCALATION_HISTORY_LIMIT:],
             "client_messages": [],
             "operator_messages": [],
             "ticket_id": str(db_ticket.id),
@@ -264,14 +280,14 @@ async def _transfer_to_operator(
             "phone_number": call_session.get("from_number", ""),
             "call_sid": call_sid,
         }
-        escalations_store.append(escalation)
+        await escalation_store.add(escalation)
         
     except Exception as e:
         logger.error(f"Error creating voice ticket: {e}")
     
     # Отмечаем что звонок эскалирован
     call_session["escalated"] = True
-    voice_sessions[call_sid] = call_session
+    await voice_session_store.set(call_sid, call_session)
     
     # Говорим клиенту что переводим
     _say_fast(response, "Сейчас переведу вас на оператора. Пожалуйста, оставайтесь на линии.")
@@ -317,12 +333,13 @@ async def dial_status(
 @router.get("/status")
 async def get_voice_status() -> dict[str, Any]:
     """Статус голосовой интеграции."""
-    operator_phone = get_operator_phone()
+    operator_phone = OPERATOR_PHONE_NUMBER
+    voice_sessions = await voice_session_store.get_all()
     
     return {
         "enabled": bool(operator_phone),
         "operator_phone": operator_phone[:4] + "****" + operator_phone[-2:] if operator_phone else None,
-        "active_calls": len([s for s in voice_sessions.values() if not s.get("escalated")]),
+        "active_calls": sum(1 for s in voice_sessions.values() if not s.get("escalated")),
         "total_calls_today": len(voice_sessions),
     }
 
@@ -330,6 +347,7 @@ async def get_voice_status() -> dict[str, Any]:
 @router.get("/calls")
 async def list_calls() -> dict[str, Any]:
     """Список звонков."""
+    voice_sessions = await voice_session_store.get_all()
     return {
         "count": len(voice_sessions),
         "calls": [
@@ -345,35 +363,31 @@ async def list_calls() -> dict[str, Any]:
     }
 
 
+def _unwrap_markdown(match: re.Match) -> str:
+    """Оставить текст из-под разметки (вложенная разметка снимается рекурсивно)."""
+    inner = next((group for group in match.groups() if group is not None), "")
+    return _MARKDOWN_RE.sub(_unwrap_markdown, inner) if inner else ""
+
+
 def _clean_for_speech(text: str) -> str:
     """Очистка текста для синтеза речи."""
-    import re
+    # Обычный текст (большинство ответов) — только нормализация пробелов
+    if _NEEDS_CLEAN_RE.search(text) is None:
+        return _WHITESPACE_RE.sub(" ", text).strip()
     
     # Убираем эмодзи
-    emoji_pattern = re.compile(
-        "["
-        "\U0001F600-\U0001F64F"  # emoticons
-        "\U0001F300-\U0001F5FF"  # symbols & pictographs
-        "\U0001F680-\U0001F6FF"  # transport & map symbols
-        "\U0001F1E0-\U0001F1FF"  # flags
-        "\U00002702-\U000027B0"
-        "\U000024C2-\U0001F251"
-        "]+",
-        flags=re.UNICODE,
-    )
-    text = emoji_pattern.sub("", text)
+    text = _EMOJI_RE.sub("", text)
     
-    # Убираем markdown
-    text = re.sub(r'\*\*(.+?)\*\*', r'\1', text)  # **bold**
-    text = re.sub(r'\*(.+?)\*', r'\1', text)       # *italic*
-    text = re.sub(r'`(.+?)`', r'\1', text)         # `code`
-    text = re.sub(r'#+\s*', '', text)               # ### headers
-    text = re.sub(r'\[(.+?)\]\(.+?\)', r'\1', text) # [link](url)
+    # Убираем markdown одним проходом
+    text = _MARKDOWN_RE.sub(_unwrap_markdown, text)
     
     # Убираем лишние пробелы
-    text = re.sub(r'\s+', ' ', text).strip()
-    
-    return text
+    return _WHITESPACE_RE.sub(" ", text).strip()
+
+
+def _split_sentences(text: str) -> list[str]:
+    """Разбить текст на предложения (пустые части отбрасываются)."""
+    return [sentence for sentence in _SENTENCE_BOUNDARY_RE.split(text) if sentence.strip()]
 
 
 def _say_fast(response: VoiceResponse, text: str, language: str = "ru-RU") -> None:
@@ -1,5 +1,6 @@
 """API роуты для WhatsApp интеграции через Twilio."""
 
+import asyncio
 import logging
 import uuid as uuid_module
 from datetime import datetime
@@ -9,6 +10,9 @@ from fastapi import APIRouter, Depends, Request, Form, Header
 from fastapi.responses import Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from ....core.config import get_settings
+from ....core.constants import DEPARTMENT_IDS, DEPARTMENT_NAMES
+from ....core.language import detect_language
 from ....db.session import get_session
 from ....services.integrations.twilio_whatsapp import twilio_whatsapp_service
 from ....services.ticket_service import TicketService
@@ -16,14 +20,37 @@ from ....services.AI import rag_service
 from ....schemas.ticket import TicketCreate, TicketSource, TicketPriority
 # Используем новое хранилище эскалаций с поддержкой Redis
 from ....services.escalation_store import escalation_store
+# Сессии (номер телефона -> история) и связь номер -> эскалация; Redis с TTL или in-memory
+from ....services.channel_session_store import (
+    ESCALATION_HISTORY_LIMIT,
+    append_session_message,
+    whatsapp_escalation_links,
+    whatsapp_session_store,
+)
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/twilio-whatsapp", tags=["twilio-whatsapp"])
+settings = get_settings()
 
-# In-memory хранилище сессий (номер телефона -> история и связь с эскалацией)
-twilio_sessions: dict[str, dict[str, Any]] = {}
-# Маппинг номер телефона -> ID эскалации (для связи с оператором)
-phone_to_escalation: dict[str, str] = {}
+
+def _public_url(request: Request) -> str:
+    """
+    Публичный URL запроса, который подписывал Twilio.
+    
+    За прокси request.url — внутренний http-адрес, и подпись с ним не сходится.
+    Берётся TWILIO_WEBHOOK_BASE_URL, иначе схема и хост из X-Forwarded-* / Host.
+    """
+    path_qs = request.url.path
+    if request.url.query:
+        path_qs += f"?{request.url.query}"
+    
+    if settings.TWILIO_WEBHOOK_BASE_URL:
+        return settings.TWILIO_WEBHOOK_BASE_URL.rstrip("/") + path_qs
+    
+    headers = request.headers
+    proto = headers.get("x-forwarded-proto", request.url.scheme).split(",")[0].strip()
+    host = headers.get("x-forwarded-host") or headers.get("host") or request.url.netloc
+    return f"{proto}://{host.split(',')[0].strip()}{path_qs}"
 
 
 @router.post("/webhook")
@@ -46,6 +73,17 @@ async def twilio_webhook(
     Twilio отправляет POST с form-urlencoded данными.
     Ответ должен быть TwiML (XML) или пустой.
     """
+    # Подпись проверяется до любой работы с сессией, БД и AI
+    if twilio_whatsapp_service.validator is not None:
+        if not x_twilio_signature:
+            logger.warning("Twilio WhatsApp webhook: missing X-Twilio-Signature, request rejected")
+            return Response(content="", media_type="text/xml", status_code=403)
+        
+        form = await request.form()
+        if not twilio_whatsapp_service.validate_request(_public_url(request), dict(form), x_twilio_signature):
+            logger.warning("Twilio WhatsApp webhook: invalid signature, request rejected")
+            return Response(content="", media_type="text/xml", status_code=403)
+    
     try:
         # Парсим данные
         phone_number = From.replace("whatsapp:", "")
@@ -58,33 +96,33 @@ async def twilio_webhook(
             return Response(content="", media_type="text/xml")
         
         # Получаем или создаём сессию
-        if phone_number not in twilio_sessions:
-            twilio_sessions[phone_number] = {
+        chat_session = await whatsapp_session_store.get(phone_number)
+        if chat_session is None:
+            chat_session = {
                 "history": [],
                 "client_name": ProfileName,
                 "escalation_id": None,
             }
             logger.info(f"New session created for {phone_number}")
         
-        # Добавляем сообщение в историю
-        twilio_sessions[phone_number]["history"].append({
-            "content": text,
-            "is_user": True,
-            "timestamp": datetime.now().isoformat(),
-        })
+        # Добавляем сообщение в историю (сессия сохраняется один раз за ход — ниже)
+        append_session_message(chat_session["history"], text, is_user=True)
         
         # ============================================================
         # Проверяем есть ли активная эскалация для этого номера
         # ============================================================
-        active_escalation_id = phone_to_escalation.get(phone_number)
+        active_escalation_id = await whatsapp_escalation_links.get(phone_number)
         
         if active_escalation_id:
             # Ищем эскалацию и добавляем сообщение клиента
             escalation = await escalation_store.get_by_id(active_escalation_id)
             if escalation:
                 if escalation.get("status") not in ["resolved", "closed"]:
-                    # Добавляем сообщение клиента в эскалацию
-                    await escalation_store.add_client_message(active_escalation_id, text)
+                    # Добавляем сообщение клиента в эскалацию и сохраняем сессию
+                    await asyncio.gather(
+                        escalation_store.add_client_message(active_escalation_id, text),
+                        whatsapp_session_store.set(phone_number, chat_session),
+                    )
                     
                     logger.info(f"Message added to escalation {active_escalation_id}")
                     
@@ -96,24 +134,23 @@ async def twilio_webhook(
                     return Response(content="", media_type="text/xml")
                 else:
                     # Эскалация закрыта — убираем маппинг
-                    del phone_to_escalation[phone_number]
+                    await whatsapp_escalation_links.delete(phone_number)
         
         # ============================================================
         # Нет активной эскалации — обрабатываем через AI
         # ============================================================
         
-        # Определяем язык
-        language = "kz" if any(c in text for c in "әғқңөұүһі") else "ru"
+        # Определяем язык (короткие ответы без букв — язык прошлой реплики)
+        language = detect_language(text, fallback=chat_session.get("language", "ru"))
+        chat_session["language"] = language
         logger.info(f"Detected language: {language}")
         
-        # Получаем историю для AI
-        history = twilio_sessions[phone_number]["history"][-10:]
-        
         # Обрабатываем через AI RAG
         logger.info("Calling AI RAG service...")
         ai_result = await rag_service.chat(
             message=text,
-            conversation_history=[{"content": h["content"], "is_user": h["is_user"]} for h in history[:-1]],
+            # Последние 10 сообщений без текущего — одним срезом, без пересборки словарей
+            conversation_history=chat_session["history"][-10:-1],
             language=language,
         )
         
@@ -124,6 +161,9 @@ async def twilio_webhook(
         if tool_call:
             logger.info(f"AI tool call: {tool_call.get('name')}")
         
+        # Записи, не влияющие на текст ответа, выполняются параллельно с отправкой в Twilio
+        side_effects: dict[str, Any] = {}
+        
         # ============================================================
         # Если AI эскалировал — создаём тикет и эскалацию для оператора
         # ============================================================
@@ -138,20 +178,6 @@ async def twilio_webhook(
                 priority_str = tool_result.get("priority", "medium")
                 dept = tool_result.get("department", "it_support")
                 
-                # Маппинг департаментов
-                dept_mapping = {
-                    "it_support": "11111111-1111-1111-1111-111111111111",
-                    "hr": "22222222-2222-2222-2222-222222222222",
-                    "finance": "33333333-3333-3333-3333-333333333333",
-                    "facilities": "44444444-4444-4444-4444-444444444444",
-                }
-                dept_name_mapping = {
-                    "it_support": "IT Поддержка",
-                    "hr": "HR / Кадры",
-                    "finance": "Финансы",
-                    "facilities": "АХО",
-                }
-                
                 ticket_data = TicketCreate(
                     subject=subject,
                     description=f"Обращение из WhatsApp:\n\n{text}",
@@ -159,7 +185,7 @@ async def twilio_webhook(
                     client_phone=phone_number,
                     source=TicketSource.WHATSAPP,
                     priority=TicketPriority(priority_str),
-                    department_id=dept_mapping.get(dept),
+                    department_id=DEPARTMENT_IDS.get(dept),
                 )
                 
                 db_ticket, classification = await ticket_service.create_ticket(ticket_data)
@@ -179,14 +205,12 @@ async def twilio_webhook(
                     "summary": subject,
                     "reason": tool_result.get("reason", "Запрос из WhatsApp"),
                     "department": dept,
-                    "department_name": dept_name_mapping.get(dept, "IT Поддержка"),
+                    "department_name": DEPARTMENT_NAMES.get(dept, "IT Поддержка"),
                     "priority": priority_str,
                     "status": "pending",
                     "created_at": datetime.utcnow().isoformat() + "Z",
-                    "conversation_history": [
-                        {"content": h["content"], "is_user": h["is_user"]}
-                        for h in twilio_sessions[phone_number]["history"]
-                    ],
+                    # Сообщения истории не меняются после добавления — копируем только срез
+                    "conversation_history": chat_session["history"][-ESCALATION_HISTORY_LIMIT:],
                     "client_messages": [],
                     "operator_messages": [],
                     "ticket_id": ticket_id,
@@ -195,11 +219,11 @@ async def twilio_webhook(
                     "phone_number": phone_number,
                     "client_name": ProfileName,
                 }
-                await escalation_store.add(escalation)
+                side_effects["escalation store"] = escalation_store.add(escalation)
                 
                 # Связываем номер телефона с эскалацией
-                phone_to_escalation[phone_number] = ticket_number
-                twilio_sessions[phone_number]["escalation_id"] = ticket_number
+                side_effects["escalation link"] = whatsapp_escalation_links.set(phone_number, ticket_number)
+                chat_session["escalation_id"] = ticket_number
                 
                 logger.info(f"Escalation created for WhatsApp: {ticket_number}")
         
@@ -209,9 +233,6 @@ async def twilio_webhook(
         if tool_call and tool_call.get("name") == "mark_resolved_by_ai":
             tool_result = tool_call.get("result", {})
             
-            ticket_service = TicketService(session)
-            from ....models.ticket import TicketStatus
-            
             ticket_data = TicketCreate(
                 subject=text[:100],
                 description=f"AI решено: {tool_result.get('resolution_summary', '')}\n\nИсходный запрос: {text}",
@@ -221,43 +242,45 @@ async def twilio_webhook(
                 priority=TicketPriority.LOW,
             )
             
-            db_ticket, classification = await ticket_service.create_ticket(ticket_data)
-            db_ticket.ai_auto_resolved = True
-            db_ticket.status = TicketStatus.RESOLVED
-            db_ticket.resolved_at = datetime.now()
-            db_ticket.first_response_at = datetime.now()
-            await session.commit()
-            
-            logger.info(f"AI-resolved WhatsApp ticket: {db_ticket.ticket_number}")
+            # Номер тикета в ответ не попадает — создаём его параллельно с отправкой
+            side_effects["ai-resolved ticket"] = _create_ai_resolved_ticket(session, ticket_data)
         
         # Сохраняем ответ AI в историю
-        twilio_sessions[phone_number]["history"].append({
-            "content": response_text,
-            "is_user": False,
-            "timestamp": datetime.now().isoformat(),
-        })
+        append_session_message(chat_session["history"], response_text, is_user=False)
+        side_effects["session"] = whatsapp_session_store.set(phone_number, chat_session)
         
-        # Отправляем ответ через Twilio
+        # Отправляем ответ через Twilio, одновременно сохраняя состояние
         logger.info(f"Sending response to {phone_number}...")
-        send_result = await twilio_whatsapp_service.send_message(phone_number, response_text)
+        send_result, *side_results = await asyncio.gather(
+            twilio_whatsapp_service.send_message(phone_number, response_text),
+            *side_effects.values(),
+            return_exceptions=True,
+        )
         logger.info(f"Send result: {send_result}")
+        for name, result in zip(side_effects, side_results):
+            if isinstance(result, Exception):
+                logger.error("WhatsApp webhook: %s failed", name, exc_info=result)
         
         # Возвращаем пустой TwiML (ответ уже отправлен через API)
         return Response(content="", media_type="text/xml")
         
-    except Exception as e:
-        logger.error(f"Twilio WhatsApp webhook error: {e}")
-        import traceback
-        traceback.print_exc()
+    except Exception:
+        logger.exception("Twilio WhatsApp webhook error")
         return Response(content="", media_type="text/xml")
 
 
+async def _create_ai_resolved_ticket(session: AsyncSession, ticket_data: TicketCreate) -> None:
+    """Создать тикет, решённый AI (для статистики)."""
+    db_ticket, _ = await TicketService(session).create_ticket(ticket_data, resolved_by_ai=True)
+    logger.info(f"AI-resolved WhatsApp ticket: {db_ticket.ticket_number}")
+
+
 @router.get("/status")
 async def get_status() -> dict[str, Any]:
     """Статус интеграции Twilio WhatsApp."""
     return {
         "enabled": twilio_whatsapp_service.enabled,
-        "active_sessions": len(twilio_sessions),
+        "active_sessions": await whatsapp_session_store.count(),
         "whatsapp_number": twilio_whatsapp_service.whatsapp_number,
     }
 
@@ -278,11 +301,9 @@ async def clear_session(phone_number: str) -> dict[str, Any]:
     # Убираем whatsapp: префикс если есть
     phone_number = phone_number.replace("whatsapp:", "")
     
-    if phone_number in twilio_sessions:
-        del twilio_sessions[phone_number]
+    if await whatsapp_session_store.delete(phone_number):
         # Также убираем связь с эскалацией
-        if phone_number in phone_to_escalation:
-            del phone_to_escalation[phone_number]
+        await whatsapp_escalation_links.delete(phone_number)
         return {"success": True, "message": "Session cleared"}
     return {"success": False, "message": "Session not found"}
 
@@ -290,6 +311,8 @@ async def clear_session(phone_number: str) -> dict[str, Any]:
 @router.get("/sessions")
 async def list_sessions() -> dict[str, Any]:
     """Список активных сессий."""
+    twilio_sessions = await whatsapp_session_store.get_all()
+    escalation_links = await whatsapp_escalation_links.get_all()
     return {
         "count": len(twilio_sessions),
         "sessions": [
@@ -299,7 +322,7 @@ async def list_sessions() -> dict[str, Any]:
                 "messages_count": len(session_data.get("history", [])),
                 "last_message": session_data["history"][-1]["timestamp"] if session_data.get("history") else None,
                 "escalation_id": session_data.get("escalation_id"),
-                "has_active_escalation": phone in phone_to_escalation,
+                "has_active_escalation": phone in escalation_links,
             }
             for phone, session_data in twilio_sessions.items()
         ]
@@ -1,21 +1,109 @@
 """API роуты для WhatsApp интеграции."""
 
-from datetime import datetime
+import asyncio
+import json
+import logging
 from typing import Any
 
 from fastapi import APIRouter, Depends, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 
+try:
+    import orjson
+except ImportError:  # orjson не установлен — стандартный json
+    orjson = None
+
+from ....core.language import detect_language
 from ....db.session import get_session
 from ....services.integrations.whatsapp import whatsapp_service
 from ....services.ticket_service import TicketService
-from ....services.AI import rag_service
+from ....services.AI import ai_service, rag_service
+from ....services.AI.ai_service import SUMMARY_UNAVAILABLE
 from ....schemas.ticket import TicketCreate, TicketSource, TicketPriority
+# Сессии (номер телефона -> история сообщений); Redis с TTL или in-memory с лимитом
+from ....services.channel_session_store import (
+    append_session_message,
+    meta_whatsapp_session_store,
+    session_timestamp,
+)
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/whatsapp", tags=["whatsapp"])
 
-# In-memory хранилище сессий WhatsApp (номер телефона -> история сообщений)
-whatsapp_sessions: dict[str, list[dict[str, Any]]] = {}
+# Сколько последних сообщений хранится в сессии
+SESSION_HISTORY_LIMIT = 20
+# Сколько последних сообщений уходит в AI
+AI_HISTORY_MESSAGES = 10
+# Длинная история сжимается: старые сообщения заменяются одним резюме, последние остаются как есть
+CONDENSE_AFTER_MESSAGES = 15
+SUMMARY_PREFIX = "[Краткое содержание предыдущего диалога]: "
+
+
+def _ai_history(session_history: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Последние сообщения без текущего; резюме начала диалога (если есть) всегда идёт первым."""
+    recent = session_history[-AI_HISTORY_MESSAGES:-1]
+    if len(session_history) > AI_HISTORY_MESSAGES and session_history[0].get("is_summary"):
+        return [session_history[0], *recent]
+    return recent
+
+
+async def _condense_history(session_history: list[dict[str, Any]], language: str) -> list[dict[str, Any]]:
+    """
+    Сжать историю: всё, кроме последних AI_HISTORY_MESSAGES сообщений, заменяется одним резюме.
+    Имя клиента и исходная проблема не теряются при обрезке окна.
+    """
+    if len(session_history) <= CONDENSE_AFTER_MESSAGES or not ai_service.use_openai:
+        return session_history
+    
+    older = session_history[:-AI_HISTORY_MESSAGES]
+    summary = await ai_service.summarize_conversation(
+        [{"content": msg["content"], "is_from_client": msg.get("is_user")} for msg in older],
+        language,
+    )
+    if summary == SUMMARY_UNAVAILABLE:
+        return session_history
+    
+    anchor = {
+        "content": f"{SUMMARY_PREFIX}{summary}",
+        "is_user": False,
+        "is_summary": True,
+        "timestamp": session_timestamp(),
+    }
+    return [anchor, *session_history[-AI_HISTORY_MESSAGES:]]
+
+
+# Фоновые задачи сжатия: ссылки держатся до завершения, иначе задачу может собрать GC
+_background_tasks: set[asyncio.Task] = set()
+
+
+async def _condense_in_background(phone_number: str, snapshot: list[dict[str, Any]], language: str) -> None:
+    """
+    Сжать сохранённую историю после ответа клиенту.
+    
+    Пока идёт запрос к LLM, могли прийти новые сообщения: они дописываются после резюме.
+    Если сессия за это время сброшена или обрезана, сжатие пропускается до следующего раза.
+    """
+    try:
+        condensed = await _condense_history(snapshot, language)
+        if condensed is snapshot:
+            return
+        
+        current = await meta_whatsapp_session_store.get(phone_number) or []
+        if current[:len(snapshot)] != snapshot:
+            return
+        await meta_whatsapp_session_store.set(phone_number, [*condensed, *current[len(snapshot):]])
+    except Exception:
+        logger.exception("WhatsApp history condensation failed")
+
+
+def _schedule_condensation(phone_number: str, session_history: list[dict[str, Any]], language: str) -> None:
+    """Запустить сжатие в фоне, только если история превысила порог."""
+    if len(session_history) <= CONDENSE_AFTER_MESSAGES or not ai_service.use_openai:
+        return
+    
+    task = asyncio.create_task(_condense_in_background(phone_number, list(session_history), language))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
 
 
 @router.get("/webhook")
@@ -47,8 +135,15 @@ async def receive_webhook(
     
     Обрабатывает сообщения и создаёт тикеты / отвечает через AI.
     """
+    mark_read_task: asyncio.Task | None = None
     try:
-        payload = await request.json()
+        raw = await request.body()
+        
+        # Уведомления о статусах доставки не содержат сообщений — не разбираем их JSON вовсе
+        if b'"messages"' not in raw:
+            return {"status": "no_message"}
+        
+        payload = orjson.loads(raw) if orjson is not None else json.loads(raw)
         
         # Парсим сообщение
         message_data = whatsapp_service.parse_incoming_message(payload)
@@ -61,30 +156,22 @@ async def receive_webhook(
         text = message_data["text"]
         message_id = message_data["message_id"]
         
-        # Помечаем как прочитанное
-        await whatsapp_service.mark_as_read(message_id)
+        # Помечаем как прочитанное в фоне — ответ от этого не зависит (ошибки mark_as_read не пробрасывает)
+        mark_read_task = asyncio.create_task(whatsapp_service.mark_as_read(message_id))
         
         # Получаем или создаём сессию
-        if phone_number not in whatsapp_sessions:
-            whatsapp_sessions[phone_number] = []
+        session_history = await meta_whatsapp_session_store.get(phone_number) or []
         
         # Добавляем сообщение в историю
-        whatsapp_sessions[phone_number].append({
-            "content": text,
-            "is_user": True,
-            "timestamp": datetime.now().isoformat(),
-        })
+        append_session_message(session_history, text, is_user=True, limit=SESSION_HISTORY_LIMIT)
         
-        # Определяем язык (простая проверка на казахский)
-        language = "kz" if any(c in text for c in "әғқңөұүһі") else "ru"
-        
-        # Получаем историю для AI
-        history = whatsapp_sessions[phone_number][-10:]  # Последние 10 сообщений
+        # Определяем язык (казахский или русский)
+        language = detect_language(text)
         
         # Обрабатываем через AI RAG
         ai_result = await rag_service.chat(
             message=text,
-            conversation_history=history[:-1],  # Без текущего сообщения
+            conversation_history=_ai_history(session_history),
             language=language,
         )
         
@@ -117,22 +204,26 @@ async def receive_webhook(
                 response_text += f"\n\n📋 Номер обращения: {db_ticket.ticket_number}"
         
         # Сохраняем ответ AI в историю
-        whatsapp_sessions[phone_number].append({
-            "content": response_text,
-            "is_user": False,
-            "timestamp": datetime.now().isoformat(),
-        })
+        append_session_message(session_history, response_text, is_user=False, limit=SESSION_HISTORY_LIMIT)
+        
+        # Отправляем ответ в WhatsApp и сохраняем сессию параллельно
+        await asyncio.gather(
+            whatsapp_service.send_message(phone_number, response_text),
+            meta_whatsapp_session_store.set(phone_number, session_history),
+        )
         
-        # Отправляем ответ в WhatsApp
-        await whatsapp_service.send_message(phone_number, response_text)
+        # Сжатие истории (запрос к LLM) — вне пути ответа, чтобы Meta не повторяла webhook
+        _schedule_condensation(phone_number, session_history, language)
         
         return {"status": "ok"}
         
     except Exception as e:
-        print(f"WhatsApp webhook error: {e}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("WhatsApp webhook error")
         return {"status": "error", "message": str(e)}
+    finally:
+        # Задача дожидается на любом пути, в том числе после ошибки AI или создания тикета
+        if mark_read_task is not None:
+            await mark_read_task
 
 
 @router.get("/status")
@@ -140,7 +231,7 @@ async def get_status() -> dict[str, Any]:
     """Статус интеграции WhatsApp."""
     return {
         "enabled": whatsapp_service.enabled,
-        "active_sessions": len(whatsapp_sessions),
+        "active_sessions": await meta_whatsapp_session_store.count(),
         "phone_number_id": whatsapp_service.phone_number_id[:10] + "..." if whatsapp_service.phone_number_id else None,
     }
 
@@ -160,8 +251,7 @@ async def send_message(
 @router.delete("/sessions/{phone_number}")
 async def clear_session(phone_number: str) -> dict[str, Any]:
     """Очистка сессии пользователя."""
-    if phone_number in whatsapp_sessions:
-        del whatsapp_sessions[phone_number]
+    if await meta_whatsapp_session_store.delete(phone_number):
         return {"success": True, "message": "Session cleared"}
     return {"success": False, "message": "Session not found"}
 
@@ -1,7 +1,9 @@
 """API маршруты для тикетов Help Desk."""
 
+import logging
+import time
 import uuid
-from typing import Annotated
+from typing import Annotated, Any
 
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -34,14 +36,53 @@ from ...services.ticket_service import (
 )
 from ...services.AI import ai_service
 
+logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/tickets", tags=["tickets"])
 
 
+# Сервисы как зависимости: один экземпляр на запрос поверх сессии из get_session
+def get_ticket_service(session: AsyncSession = Depends(get_session)) -> TicketService:
+    return TicketService(session)
+
+
+def get_department_service(session: AsyncSession = Depends(get_session)) -> DepartmentService:
+    return DepartmentService(session)
+
+
+def get_category_service(session: AsyncSession = Depends(get_session)) -> CategoryService:
+    return CategoryService(session)
+
+
+def get_kb_service(session: AsyncSession = Depends(get_session)) -> KnowledgeBaseService:
+    return KnowledgeBaseService(session)
+
+
+# Справочники (департаменты, категории) меняются редко — кешируем списки в памяти воркера
+REFERENCE_CACHE_TTL = 60
+# department_id приходит из запроса — число ключей ограничено
+REFERENCE_CACHE_MAX_KEYS = 32
+# ключ -> (момент истечения, список)
+_reference_cache: dict[Any, tuple[float, list[Any]]] = {}
+
+
+def _get_cached_reference(key: Any) -> list[Any] | None:
+    entry = _reference_cache.get(key)
+    if entry is None or entry[0] <= time.monotonic():
+        return None
+    return entry[1]
+
+
+def _set_cached_reference(key: Any, items: list[Any]) -> None:
+    if len(_reference_cache) >= REFERENCE_CACHE_MAX_KEYS:
+        _reference_cache.clear()
+    _reference_cache[key] = (time.monotonic() + REFERENCE_CACHE_TTL, items)
+
+
 # Ticket endpoints
 @router.post("", response_model=TicketRead, status_code=201)
 async def create_ticket(
     payload: TicketCreate,
-    session: AsyncSession = Depends(get_session),
+    service: TicketService = Depends(get_ticket_service),
 ) -> TicketRead:
     """
     Создает новый тикет.
@@ -52,7 +93,6 @@ async def create_ticket(
     - Назначает департамент
     - Генерирует автоответ для типовых вопросов
     """
-    service = TicketService(session)
     ticket, classification = await service.create_ticket(payload)
     return TicketRead.model_validate(ticket)
 
@@ -65,10 +105,9 @@ async def list_tickets(
     search: Annotated[str | None, Query(max_length=100)] = None,
     limit: Annotated[int, Query(ge=1, le=100)] = 50,
     offset: Annotated[int, Query(ge=0)] = 0,
-    session: AsyncSession = Depends(get_session),
-) -> list[TicketListRead]:
+    service: TicketService = Depends(get_ticket_service),
+) -> Any:
     """Возвращает список тикетов с фильтрацией."""
-    service = TicketService(session)
     tickets, total = await service.list_tickets(
         status=status,
         priority=priority,
@@ -77,16 +116,17 @@ async def list_tickets(
         limit=limit,
         offset=offset,
     )
-    return [TicketListRead.model_validate(t) for t in tickets]
+    # Строки ORM отдаются как есть: response_model проверяет их один раз (from_attributes),
+    # без промежуточных model_validate + model_dump на каждую строку
+    return tickets
 
 
 @router.get("/{ticket_id}", response_model=TicketWithMessages)
 async def get_ticket(
     ticket_id: uuid.UUID,
-    session: AsyncSession = Depends(get_session),
+    service: TicketService = Depends(get_ticket_service),
 ) -> TicketWithMessages:
     """Возвращает тикет со всеми сообщениями."""
-    service = TicketService(session)
     ticket = await service.get_ticket(ticket_id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Тикет не найден")
@@ -96,10 +136,9 @@ async def get_ticket(
 @router.get("/by-number/{ticket_number}", response_model=TicketWithMessages)
 async def get_ticket_by_number(
     ticket_number: str,
-    session: AsyncSession = Depends(get_session),
+    service: TicketService = Depends(get_ticket_service),
 ) -> TicketWithMessages:
     """Возвращает тикет по номеру."""
-    service = TicketService(session)
     ticket = await service.get_ticket_by_number(ticket_number)
     if not ticket:
         raise HTTPException(status_code=404, detail="Тикет не найден")
@@ -110,14 +149,13 @@ async def get_ticket_by_number(
 async def update_ticket(
     ticket_id: uuid.UUID,
     payload: TicketUpdate,
-    session: AsyncSession = Depends(get_session),
+    service: TicketService = Depends(get_ticket_service),
 ) -> TicketRead:
     """
     Обновляет тикет.
     
     Также синхронизирует статус с эскалацией и уведомляет WhatsApp если resolved.
     """
-    service = TicketService(session)
     ticket = await service.update_ticket(ticket_id, payload)
     if not ticket:
         raise HTTPException(status_code=404, detail="Тикет не найден")
@@ -125,41 +163,39 @@ async def update_ticket(
     # Синхронизируем статус с эскалацией и WhatsApp
     if payload.status:
         from ...services.escalation_store import escalation_store
+        from ...services.channel_session_store import whatsapp_escalation_links
         from ...services.integrations.twilio_whatsapp import twilio_whatsapp_service
         
         try:
-            all_escalations = await escalation_store.get_all()
-            for escalation in all_escalations:
-                if escalation.get("ticket_id") == str(ticket_id):
-                    # Обновляем статус эскалации
-                    status_map = {
-                        "resolved": "resolved",
-                        "closed": "resolved",
-                        "processing": "in_progress",
-                        "new": "pending",
-                    }
-                    new_status = status_map.get(payload.status, escalation.get("status"))
-                    await escalation_store.set_status(
-                        escalation.get("escalation_id") or escalation.get("id"),
-                        new_status
-                    )
-                    
-                    # Если resolved и WhatsApp - уведомляем
-                    if payload.status in ("resolved", "closed") and escalation.get("source") == "whatsapp":
-                        phone_number = escalation.get("phone_number")
-                        if phone_number:
-                            await twilio_whatsapp_service.send_message(
-                                phone_number,
-                                "✅ Ваше обращение решено. Спасибо за обращение!\n\nЕсли у вас есть новые вопросы, просто напишите нам."
-                            )
-                            # Очищаем маппинг
-                            from .integrations.twilio_whatsapp import phone_to_escalation
-                            if phone_number in phone_to_escalation:
-                                del phone_to_escalation[phone_number]
-                            print(f"📱 Resolution notification sent to WhatsApp: {phone_number}")
-                    break
-        except Exception as e:
-            print(f"Error syncing status to escalation/WhatsApp: {e}")
+            # Эскалация, связанная с этим тикетом (O(1) по индексу ticket_id)
+            escalation = await escalation_store.get_by_ticket_id(str(ticket_id))
+            if escalation:
+                # Обновляем статус эскалации
+                status_map = {
+                    "resolved": "resolved",
+                    "closed": "resolved",
+                    "processing": "in_progress",
+                    "new": "pending",
+                }
+                new_status = status_map.get(payload.status, escalation.get("status"))
+                await escalation_store.set_status(
+                    escalation.get("escalation_id") or escalation.get("id"),
+                    new_status
+                )
+                
+                # Если resolved и WhatsApp - уведомляем
+                if payload.status in ("resolved", "closed") and escalation.get("source") == "whatsapp":
+                    phone_number = escalation.get("phone_number")
+                    if phone_number:
+                        await twilio_whatsapp_service.send_message(
+                            phone_number,
+                            "✅ Ваше обращение решено. Спасибо за обращение!\n\nЕсли у вас есть новые вопросы, просто напишите нам."
+                        )
+                        # Очищаем маппинг
+                        await whatsapp_escalation_links.delete(phone_number)
+                        logger.info("📱 Resolution notification sent to WhatsApp: %s", phone_number)
+        except Exception:
+            logger.exception("Error syncing status to escalation/WhatsApp")
     
     return TicketRead.model_validate(ticket)
 
@@ -170,7 +206,7 @@ async def add_message(
     payload: MessageCreate,
     is_from_client: bool = False,
     use_ai: bool = False,
-    session: AsyncSession = Depends(get_session),
+    service: TicketService = Depends(get_ticket_service),
 ) -> MessageRead:
     """
     Добавляет сообщение в тикет.
@@ -180,7 +216,6 @@ async def add_message(
     
     Также отправляет сообщение в WhatsApp если тикет связан с эскалацией из WhatsApp.
     """
-    service = TicketService(session)
     message = await service.add_message(
         ticket_id=ticket_id,
         data=payload,
@@ -196,26 +231,24 @@ async def add_message(
         from ...services.integrations.twilio_whatsapp import twilio_whatsapp_service
         
         try:
-            # Ищем эскалацию связанную с этим тикетом
-            all_escalations = await escalation_store.get_all()
-            for escalation in all_escalations:
-                if escalation.get("ticket_id") == str(ticket_id):
-                    # Добавляем сообщение в эскалацию
-                    await escalation_store.add_operator_message(
-                        escalation.get("escalation_id") or escalation.get("id"),
-                        payload.content
-                    )
-                    
-                    # Если эскалация из WhatsApp - отправляем в WhatsApp
-                    if escalation.get("source") == "whatsapp":
-                        phone_number = escalation.get("phone_number")
-                        if phone_number:
-                            operator_message = f"👨‍💼 Оператор:\n\n{payload.content}"
-                            await twilio_whatsapp_service.send_message(phone_number, operator_message)
-                            print(f"📱 Message sent to WhatsApp: {phone_number}")
-                    break
-        except Exception as e:
-            print(f"Error syncing message to escalation/WhatsApp: {e}")
+            # Эскалация, связанная с этим тикетом (O(1) по индексу ticket_id)
+            escalation = await escalation_store.get_by_ticket_id(str(ticket_id))
+            if escalation:
+                # Добавляем сообщение в эскалацию
+                await escalation_store.add_operator_message(
+                    escalation.get("escalation_id") or escalation.get("id"),
+                    payload.content
+                )
+                
+                # Если эскалация из WhatsApp - отправляем в WhatsApp
+                if escalation.get("source") == "whatsapp":
+                    phone_number = escalation.get("phone_number")
+                    if phone_number:
+                        operator_message = f"👨‍💼 Оператор:\n\n{payload.content}"
+                        await twilio_whatsapp_service.send_message(phone_number, operator_message)
+                        logger.info("📱 Message sent to WhatsApp: %s", phone_number)
+        except Exception:
+            logger.exception("Error syncing message to escalation/WhatsApp")
     
     return MessageRead.model_validate(message)
 
@@ -224,10 +257,9 @@ async def add_message(
 async def escalate_ticket(
     ticket_id: uuid.UUID,
     department_id: uuid.UUID,
-    session: AsyncSession = Depends(get_session),
+    service: TicketService = Depends(get_ticket_service),
 ) -> TicketRead:
     """Эскалирует тикет в другой департамент."""
-    service = TicketService(session)
     ticket = await service.escalate_ticket(ticket_id, department_id)
     if not ticket:
         raise HTTPException(status_code=404, detail="Тикет не найден")
@@ -237,10 +269,9 @@ async def escalate_ticket(
 @router.post("/{ticket_id}/summarize")
 async def summarize_ticket(
     ticket_id: uuid.UUID,
-    session: AsyncSession = Depends(get_session),
+    service: TicketService = Depends(get_ticket_service),
 ) -> dict[str, str]:
     """Создает AI-резюме переписки по тикету."""
-    service = TicketService(session)
     summary = await service.summarize_ticket(ticket_id)
     return {"summary": summary}
 
@@ -285,10 +316,9 @@ async def translate_text(
 # Dashboard / Analytics
 @router.get("/analytics/dashboard", response_model=DashboardStats)
 async def get_dashboard_stats(
-    session: AsyncSession = Depends(get_session),
+    service: TicketService = Depends(get_ticket_service),
 ) -> DashboardStats:
     """Возвращает статистику для дашборда."""
-    service = TicketService(session)
     return await service.get_dashboard_stats()
 
 
@@ -299,22 +329,26 @@ departments_router = APIRouter(prefix="/departments", tags=["departments"])
 @departments_router.post("", response_model=DepartmentRead, status_code=201)
 async def create_department(
     payload: DepartmentCreate,
-    session: AsyncSession = Depends(get_session),
+    service: DepartmentService = Depends(get_department_service),
 ) -> DepartmentRead:
     """Создает новый департамент."""
-    service = DepartmentService(session)
     department = await service.create_department(payload)
+    _reference_cache.clear()
     return DepartmentRead.model_validate(department)
 
 
 @departments_router.get("", response_model=list[DepartmentRead])
 async def list_departments(
-    session: AsyncSession = Depends(get_session),
+    service: DepartmentService = Depends(get_department_service),
 ) -> list[DepartmentRead]:
     """Возвращает список департаментов."""
-    service = DepartmentService(session)
-    departments = await service.list_departments()
-    return [DepartmentRead.model_validate(d) for d in departments]
+    cached = _get_cached_reference("departments")
+    if cached is not None:
+        return cached
+    
+    departments = [DepartmentRead.model_validate(d) for d in await service.list_departments()]
+    _set_cached_reference("departments", departments)
+    return departments
 
 
 # Category endpoints
@@ -324,23 +358,28 @@ categories_router = APIRouter(prefix="/categories", tags=["categories"])
 @categories_router.post("", response_model=CategoryRead, status_code=201)
 async def create_category(
     payload: CategoryCreate,
-    session: AsyncSession = Depends(get_session),
+    service: CategoryService = Depends(get_category_service),
 ) -> CategoryRead:
     """Создает новую категорию."""
-    service = CategoryService(session)
     category = await service.create_category(payload)
+    _reference_cache.clear()
     return CategoryRead.model_validate(category)
 
 
 @categories_router.get("", response_model=list[CategoryRead])
 async def list_categories(
     department_id: uuid.UUID | None = None,
-    session: AsyncSession = Depends(get_session),
+    service: CategoryService = Depends(get_category_service),
 ) -> list[CategoryRead]:
     """Возвращает список категорий."""
-    service = CategoryService(session)
-    categories = await service.list_categories(department_id)
-    return [CategoryRead.model_validate(c) for c in categories]
+    cache_key = ("categories", department_id)
+    cached = _get_cached_reference(cache_key)
+    if cached is not None:
+        return cached
+    
+    categories = [CategoryRead.model_validate(c) for c in await service.list_categories(department_id)]
+    _set_cached_reference(cache_key, categories)
+    return categories
 
 
 # Knowledge Base endpoints  
@@ -350,10 +389,9 @@ kb_router = APIRouter(prefix="/knowledge-base", tags=["knowledge-base"])
 @kb_router.post("", response_model=KnowledgeBaseRead, status_code=201)
 async def create_kb_entry(
     payload: KnowledgeBaseCreate,
-    session: AsyncSession = Depends(get_session),
+    service: KnowledgeBaseService = Depends(get_kb_service),
 ) -> KnowledgeBaseRead:
     """Создает новую запись в базе знаний."""
-    service = KnowledgeBaseService(session)
     entry = await service.create_entry(payload)
     return KnowledgeBaseRead.model_validate(entry)
 
@@ -362,10 +400,9 @@ async def create_kb_entry(
 async def search_knowledge_base(
     query: str,
     limit: int = 5,
-    session: AsyncSession = Depends(get_session),
+    service: KnowledgeBaseService = Depends(get_kb_service),
 ) -> list[KnowledgeBaseRead]:
     """Ищет в базе знаний."""
-    service = KnowledgeBaseService(session)
     entries = await service.search(query, limit)
     return [KnowledgeBaseRead.model_validate(e) for e in entries]
 
@@ -26,6 +26,11 @@ class Settings(BaseSettings):
     postgres_host: str = Field(default="localhost", alias="POSTGRES_HOST")
     postgres_port: int = Field(default=5432, alias="POSTGRES_PORT")
     postgres_db: str = Field(default="template", alias="POSTGRES_DB")
+    # На один воркер: при N воркерах к PostgreSQL открывается до N * (size + overflow) соединений
+    db_pool_size: int = Field(default=5, alias="DB_POOL_SIZE")
+    db_max_overflow: int = Field(default=5, alias="DB_MAX_OVERFLOW")
+    db_pool_warmup: int = Field(default=2, alias="DB_POOL_WARMUP")  # сколько соединений открыть при старте
+    db_pool_recycle: int = Field(default=1800, alias="DB_POOL_RECYCLE")  # секунды
 
     # Redis
     redis_url: str = Field(default="redis://localhost:6379/0", alias="REDIS_URL")
@@ -55,6 +60,8 @@ class Settings(BaseSettings):
     TWILIO_ACCOUNT_SID: str | None = Field(default=None)
     TWILIO_AUTH_TOKEN: str | None = Field(default=None)
     TWILIO_WHATSAPP_NUMBER: str | None = Field(default=None)  # например: +14155238886
+    # Публичный адрес бэкенда (например: https://helpdesk.example.com) — для проверки подписи Twilio за прокси
+    TWILIO_WEBHOOK_BASE_URL: str | None = Field(default=None)
     
     # Twilio Voice (голосовой бот)
     TWILIO_VOICE_NUMBER: str | None = Field(default=None)  # Номер для приёма звонков
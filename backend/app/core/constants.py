@@ -0,0 +1,17 @@
+"""Общие справочные константы, которые используют несколько каналов (чат, WhatsApp)."""
+
+from types import MappingProxyType
+
+# Ключ департамента из tool_call -> id в БД (сиды ревизии 20241207_seed_helpdesk) и отображаемое имя
+DEPARTMENT_IDS = MappingProxyType({
+    "it_support": "11111111-1111-1111-1111-111111111111",
+    "hr": "22222222-2222-2222-2222-222222222222",
+    "finance": "33333333-3333-3333-3333-333333333333",
+    "facilities": "44444444-4444-4444-4444-444444444444",
+})
+DEPARTMENT_NAMES = MappingProxyType({
+    "it_support": "IT Поддержка",
+    "hr": "HR / Кадры",
+    "finance": "Финансы",
+    "facilities": "АХО",
+})
@@ -0,0 +1,23 @@
+"""Определение языка обращения (казахский / русский)."""
+
+# Буквы, которые есть в казахском и нет в русском
+KZ_CHARS = frozenset("әғқңөұүһі")
+# Язык не меняется посреди фразы — достаточно начала текста
+LANGUAGE_SAMPLE_CHARS = 64
+
+
+def detect_language(text: str, fallback: str = "ru") -> str:
+    """
+    "kz", если в начале текста есть казахские буквы, иначе "ru".
+
+    Проверяются первые LANGUAGE_SAMPLE_CHARS символов: ASCII-фрагмент отсекается
+    без сканирования, иначе один проход в C (frozenset.isdisjoint).
+    Если в начале нет ни одной буквы (номер телефона, "123", "+"), возвращается
+    fallback — например, язык предыдущей реплики.
+    """
+    sample = text[:LANGUAGE_SAMPLE_CHARS]
+    if not sample.isascii() and not KZ_CHARS.isdisjoint(sample):
+        return "kz"
+    if not any(char.isalpha() for char in sample):
+        return fallback
+    return "ru"
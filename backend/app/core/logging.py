@@ -0,0 +1,59 @@
+"""Настройка логирования: запись в stdout выполняется в фоновом потоке."""
+
+import logging
+import logging.handlers
+import queue
+import sys
+
+_listener: logging.handlers.QueueListener | None = None
+_queue_handler: logging.handlers.QueueHandler | None = None
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler без форматирования в вызывающем потоке.
+    
+    Стандартный prepare() форматирует сообщение и traceback прямо в обработчике
+    запроса; здесь запись уходит в очередь как есть, а форматирует её
+    StreamHandler в потоке QueueListener.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def setup_logging(debug: bool = False) -> None:
+    """Подключить корневой логгер к очереди и запустить фоновый обработчик."""
+    global _listener, _queue_handler
+    if _listener is not None:
+        return
+    
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(
+        logging.Formatter("%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    )
+    
+    _queue_handler = _DeferredQueueHandler(log_queue)
+    root = logging.getLogger()
+    root.addHandler(_queue_handler)
+    root.setLevel(logging.DEBUG if debug else logging.INFO)
+    
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+
+
+def shutdown_logging() -> None:
+    """
+    Отключить корневой логгер от очереди, дописать оставшиеся записи и остановить обработчик.
+    
+    Без снятия обработчика записи после остановки копились бы в очереди, а повторный
+    setup_logging (второй lifespan в том же процессе) дублировал бы каждую строку.
+    """
+    global _listener, _queue_handler
+    if _queue_handler is not None:
+        logging.getLogger().removeHandler(_queue_handler)
+        _queue_handler = None
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
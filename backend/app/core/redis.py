@@ -2,16 +2,41 @@
 
 import json
 import hashlib
+import re
+import time
 from datetime import datetime
 from typing import Any
 
 import redis.asyncio as redis
 from redis.asyncio import Redis
 
+try:
+    import orjson
+except ImportError:  # orjson не установлен — стандартный json
+    orjson = None
+
 from .config import get_settings
 
 settings = get_settings()
 
+# Всё, кроме букв/цифр/пробелов — пунктуация и эмодзи не влияют на ключ кеша
+_NON_WORD_RE = re.compile(r"[^\w\s]+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+def _dumps(data: Any) -> bytes | str:
+    """Сериализация значений для Redis (orjson, если установлен; неизвестные типы — через str)."""
+    if orjson is not None:
+        return orjson.dumps(data, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, default=str)
+
+
+def _loads(data: str | bytes) -> Any:
+    """Десериализация значений из Redis."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
 
 class RedisService:
     """Сервис для работы с Redis."""
@@ -33,6 +58,10 @@ class RedisService:
                 await self._client.ping()
                 self._connected = True
                 print(f"✅ Redis connected: {settings.redis_url}")
+                await self._backfill_escalation_order()
+                await self._backfill_csat()
+                await self._backfill_escalation_tickets()
+                await self._backfill_escalation_stats()
             except Exception as e:
                 print(f"⚠️ Redis connection failed: {e}")
                 print("   Falling back to in-memory storage")
@@ -59,6 +88,119 @@ class RedisService:
     
     ESCALATION_PREFIX = "escalation:"
     ESCALATION_LIST_KEY = "escalations:list"
+    # Внутренний UUID эскалации -> escalation_id (номер тикета)
+    ESCALATION_ALIAS_PREFIX = "escalation:alias:"
+    # UUID тикета в БД (поле ticket_id) -> escalation_id
+    ESCALATION_TICKET_PREFIX = "escalation:ticket:"
+    ESCALATION_TICKET_BACKFILL_MARKER = "escalations:ticket_index:backfilled"
+    # Sorted set escalation_id -> created_at (для пагинации без загрузки всех эскалаций)
+    ESCALATION_ORDER_KEY = "escalations:by_created"
+    # Sorted set на каждый статус (escalations:status:<status>) — фильтр без перебора всех эскалаций
+    ESCALATION_STATUS_PREFIX = "escalations:status:"
+    ESCALATION_STATUSES = ("pending", "in_progress", "resolved", "closed")
+    # Счётчик изменений эскалаций (INCR на каждую запись) — основа ETag списка
+    ESCALATION_VERSION_KEY = "escalations:version"
+    # Сколько ключей запрашивать одним MGET
+    ESCALATION_MGET_CHUNK = 500
+    # Hash на каждое поле (escalations:stats:<поле>): значение -> количество эскалаций
+    ESCALATION_STATS_PREFIX = "escalations:stats:"
+    # Поле -> значение по умолчанию (как в in-memory счётчиках EscalationStore)
+    ESCALATION_STATS_FIELDS = {"status": None, "department": "unknown", "priority": "medium"}
+    ESCALATION_STATS_BACKFILL_MARKER = "escalations:stats:backfilled"
+    
+    @staticmethod
+    def _created_score(escalation: dict[str, Any]) -> float:
+        """Score для сортировки эскалаций по дате создания."""
+        try:
+            return datetime.fromisoformat(escalation["created_at"]).timestamp()
+        except (KeyError, TypeError, ValueError):
+            return time.time()
+    
+    def _status_key(self, status: str | None) -> str:
+        return f"{self.ESCALATION_STATUS_PREFIX}{status}"
+    
+    def _count_escalation(self, pipe, escalation: dict[str, Any], delta: int) -> None:
+        """Добавить в pipeline HINCRBY счётчиков статистики: учесть (1) или вычесть (-1) эскалацию."""
+        for field, default in self.ESCALATION_STATS_FIELDS.items():
+            pipe.hincrby(f"{self.ESCALATION_STATS_PREFIX}{field}", str(escalation.get(field, default)), delta)
+    
+    def _index_escalation(self, pipe, escalation_id: str, escalation: dict[str, Any]) -> None:
+        """Добавить в pipeline обновление индексов: порядок создания и бакет статуса."""
+        score = self._created_score(escalation)
+        status = escalation.get("status")
+        pipe.zadd(self.ESCALATION_ORDER_KEY, {escalation_id: score}, nx=True)
+        # Статус мог смениться — убираем из остальных бакетов
+        for other in self.ESCALATION_STATUSES:
+            if other != status:
+                pipe.zrem(self._status_key(other), escalation_id)
+        pipe.zadd(self._status_key(status), {escalation_id: score})
+    
+    async def _backfill_escalation_order(self) -> None:
+        """Заполнить индексы (порядок, статусы) для эскалаций, сохранённых до их появления."""
+        try:
+            total = await self._client.scard(self.ESCALATION_LIST_KEY)
+            # Все бакеты, включая нестандартные статусы и status=None (escalations:status:None)
+            indexed_by_status = 0
+            async for key in self._client.scan_iter(f"{self.ESCALATION_STATUS_PREFIX}*"):
+                indexed_by_status += await self._client.zcard(key)
+            if await self._client.zcard(self.ESCALATION_ORDER_KEY) >= total and indexed_by_status >= total:
+                return
+            pipe = self._client.pipeline(transaction=False)
+            for escalation in await self.get_all_escalations():
+                escalation_id = escalation.get("escalation_id") or escalation.get("id")
+                self._index_escalation(pipe, escalation_id, escalation)
+            await pipe.execute()
+        except Exception as e:
+            print(f"Redis escalation order backfill error: {e}")
+    
+    async def _backfill_escalation_tickets(self) -> None:
+        """
+        Построить индекс ticket_id -> escalation_id для эскалаций, сохранённых до его появления (один раз).
+        
+        SET NX идемпотентен, поэтому повторный запуск безопасен; маркер ставится
+        последней командой pipeline, и упавший backfill повторится при следующем подключении.
+        """
+        try:
+            if await self._client.exists(self.ESCALATION_TICKET_BACKFILL_MARKER):
+                return
+            pipe = self._client.pipeline(transaction=False)
+            for escalation in await self.get_all_escalations():
+                ticket_id = escalation.get("ticket_id")
+                if ticket_id:
+                    escalation_id = escalation.get("escalation_id") or escalation.get("id")
+                    pipe.set(f"{self.ESCALATION_TICKET_PREFIX}{ticket_id}", escalation_id, nx=True)
+            pipe.set(self.ESCALATION_TICKET_BACKFILL_MARKER, "1")
+            await pipe.execute()
+        except Exception as e:
+            print(f"Redis escalation ticket index backfill error: {e}")
+    
+    async def _backfill_escalation_stats(self) -> None:
+        """
+        Построить счётчики статистики по эскалациям, сохранённым до их появления (один раз).
+        
+        Как и для CSAT: пересборка в MULTI/EXEC, маркер — последней командой транзакции.
+        """
+        try:
+            if await self._client.exists(self.ESCALATION_STATS_BACKFILL_MARKER):
+                return
+            pipe = self._client.pipeline(transaction=True)
+            pipe.delete(*(f"{self.ESCALATION_STATS_PREFIX}{field}" for field in self.ESCALATION_STATS_FIELDS))
+            for escalation in await self.get_all_escalations():
+                self._count_escalation(pipe, escalation, 1)
+            pipe.set(self.ESCALATION_STATS_BACKFILL_MARKER, "1")
+            await pipe.execute()
+        except Exception as e:
+            print(f"Redis escalation stats backfill error: {e}")
+    
+    async def _load_escalations(self, escalation_ids) -> list[dict[str, Any]]:
+        """Загрузить эскалации по ID через MGET (пачками), сохраняя порядок; пропавшие пропускаются."""
+        escalation_ids = list(escalation_ids)
+        escalations = []
+        for start in range(0, len(escalation_ids), self.ESCALATION_MGET_CHUNK):
+            chunk = escalation_ids[start:start + self.ESCALATION_MGET_CHUNK]
+            values = await self._client.mget([f"{self.ESCALATION_PREFIX}{esc_id}" for esc_id in chunk])
+            escalations.extend(_loads(value) for value in values if value)
+        return escalations
     
     async def save_escalation(self, escalation: dict[str, Any]) -> bool:
         """Сохранить эскалацию в Redis."""
@@ -69,49 +211,92 @@ class RedisService:
             escalation_id = escalation.get("escalation_id") or escalation.get("id")
             key = f"{self.ESCALATION_PREFIX}{escalation_id}"
             
-            # Сохраняем эскалацию как JSON
-            await self._client.set(key, json.dumps(escalation, ensure_ascii=False, default=str))
-            
-            # Добавляем ID в список (для быстрого получения всех)
-            await self._client.sadd(self.ESCALATION_LIST_KEY, escalation_id)
+            async def write(pipe) -> None:
+                # Прежняя версия нужна, чтобы перенести её из счётчиков статистики в новые значения;
+                # WATCH на ключе повторяет транзакцию при параллельной записи той же эскалации
+                previous = await pipe.get(key)
+                pipe.multi()
+                if previous:
+                    self._count_escalation(pipe, _loads(previous), -1)
+                self._count_escalation(pipe, escalation, 1)
+                
+                # Сохраняем эскалацию как JSON
+                pipe.set(key, _dumps(escalation))
+                
+                # Добавляем ID в список (для быстрого получения всех)
+                pipe.sadd(self.ESCALATION_LIST_KEY, escalation_id)
+                self._index_escalation(pipe, escalation_id, escalation)
+                
+                # Алиас для поиска по внутреннему id без перебора всех эскалаций
+                internal_id = escalation.get("id")
+                if internal_id and internal_id != escalation_id:
+                    pipe.set(f"{self.ESCALATION_ALIAS_PREFIX}{internal_id}", escalation_id)
+                
+                # Индекс для поиска эскалации по тикету
+                ticket_id = escalation.get("ticket_id")
+                if ticket_id:
+                    pipe.set(f"{self.ESCALATION_TICKET_PREFIX}{ticket_id}", escalation_id)
+                
+                pipe.incr(self.ESCALATION_VERSION_KEY)
             
+            # Все записи одной транзакцией (MULTI/EXEC)
+            await self._client.transaction(write, key)
             return True
         except Exception as e:
             print(f"Redis save_escalation error: {e}")
             return False
     
     async def get_escalation(self, escalation_id: str) -> dict[str, Any] | None:
-        """Получить эскалацию по ID."""
+        """Получить эскалацию по escalation_id или внутреннему id."""
         if not self.is_connected:
             return None
         
         try:
             key = f"{self.ESCALATION_PREFIX}{escalation_id}"
             data = await self._client.get(key)
+            if not data:
+                real_id = await self._client.get(f"{self.ESCALATION_ALIAS_PREFIX}{escalation_id}")
+                if real_id:
+                    data = await self._client.get(f"{self.ESCALATION_PREFIX}{real_id}")
             if data:
-                return json.loads(data)
+                return _loads(data)
             return None
         except Exception as e:
             print(f"Redis get_escalation error: {e}")
             return None
     
+    async def get_escalation_by_ticket(self, ticket_id: str) -> dict[str, Any] | None:
+        """Получить эскалацию, связанную с тикетом (по ticket_id)."""
+        if not self.is_connected:
+            return None
+        
+        try:
+            escalation_id = await self._client.get(f"{self.ESCALATION_TICKET_PREFIX}{ticket_id}")
+            if not escalation_id:
+                return None
+            data = await self._client.get(f"{self.ESCALATION_PREFIX}{escalation_id}")
+            return _loads(data) if data else None
+        except Exception as e:
+            print(f"Redis get_escalation_by_ticket error: {e}")
+            return None
+    
     async def get_all_escalations(self, status: str | None = None) -> list[dict[str, Any]]:
         """Получить все эскалации."""
         if not self.is_connected:
             return []
         
         try:
-            # Получаем все ID эскалаций
-            escalation_ids = await self._client.smembers(self.ESCALATION_LIST_KEY)
+            # Все ID эскалаций или только бакет нужного статуса
+            if status is None:
+                escalation_ids = await self._client.smembers(self.ESCALATION_LIST_KEY)
+            else:
+                escalation_ids = await self._client.zrange(self._status_key(status), 0, -1)
             
-            escalations = []
-            for esc_id in escalation_ids:
-                key = f"{self.ESCALATION_PREFIX}{esc_id}"
-                data = await self._client.get(key)
-                if data:
-                    escalation = json.loads(data)
-                    if status is None or escalation.get("status") == status:
-                        escalations.append(escalation)
+            escalations = [
+                escalation
+                for escalation in await self._load_escalations(escalation_ids)
+                if status is None or escalation.get("status") == status
+            ]
             
             # Сортируем по дате создания (новые первые)
             escalations.sort(
@@ -124,6 +309,61 @@ class RedisService:
             print(f"Redis get_all_escalations error: {e}")
             return []
     
+    async def get_escalations_page(
+        self,
+        status: str | None = None,
+        limit: int | None = 50,
+        offset: int = 0,
+    ) -> tuple[list[dict[str, Any]], int]:
+        """Получить страницу эскалаций (новые первые) и общее количество; limit=None — до конца списка."""
+        if not self.is_connected:
+            return [], 0
+        
+        index_key = self.ESCALATION_ORDER_KEY if status is None else self._status_key(status)
+        
+        try:
+            # Количество и ID страницы — один round-trip, записи — ещё один (MGET)
+            pipe = self._client.pipeline(transaction=False)
+            pipe.zcard(index_key)
+            pipe.zrevrange(index_key, offset, -1 if limit is None else offset + limit - 1)
+            total, escalation_ids = await pipe.execute()
+            
+            return await self._load_escalations(escalation_ids), total
+        except Exception as e:
+            print(f"Redis get_escalations_page error: {e}")
+            return [], 0
+    
+    async def get_escalation_stats(self) -> dict[str, Any]:
+        """Общее количество и счётчики по полям (status/department/priority) — без загрузки эскалаций."""
+        if not self.is_connected:
+            return {}
+        
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            pipe.scard(self.ESCALATION_LIST_KEY)
+            for field in self.ESCALATION_STATS_FIELDS:
+                pipe.hgetall(f"{self.ESCALATION_STATS_PREFIX}{field}")
+            total, *counts = await pipe.execute()
+            
+            stats: dict[str, Any] = {"total": total}
+            for field, values in zip(self.ESCALATION_STATS_FIELDS, counts):
+                stats[field] = {value: int(count) for value, count in values.items()}
+            return stats
+        except Exception as e:
+            print(f"Redis get_escalation_stats error: {e}")
+            return {}
+    
+    async def get_escalations_version(self) -> int | None:
+        """Текущая версия набора эскалаций (None — Redis недоступен)."""
+        if not self.is_connected:
+            return None
+        
+        try:
+            return int(await self._client.get(self.ESCALATION_VERSION_KEY) or 0)
+        except Exception as e:
+            print(f"Redis get_escalations_version error: {e}")
+            return None
+    
     async def update_escalation(self, escalation_id: str, updates: dict[str, Any]) -> dict[str, Any] | None:
         """Обновить эскалацию."""
         if not self.is_connected:
@@ -131,15 +371,6 @@ class RedisService:
         
         try:
             escalation = await self.get_escalation(escalation_id)
-            if not escalation:
-                # Попробуем найти по id
-                all_esc = await self.get_all_escalations()
-                for e in all_esc:
-                    if e.get("id") == escalation_id:
-                        escalation = e
-                        escalation_id = e.get("escalation_id", escalation_id)
-                        break
-            
             if not escalation:
                 return None
             
@@ -160,14 +391,125 @@ class RedisService:
             return False
         
         try:
+            escalation = await self.get_escalation(escalation_id)
+            if escalation:
+                internal_id = escalation.get("id")
+                escalation_id = escalation.get("escalation_id") or internal_id
+                if internal_id:
+                    await self._client.delete(f"{self.ESCALATION_ALIAS_PREFIX}{internal_id}")
+            
             key = f"{self.ESCALATION_PREFIX}{escalation_id}"
-            await self._client.delete(key)
-            await self._client.srem(self.ESCALATION_LIST_KEY, escalation_id)
+            
+            async def remove(pipe) -> None:
+                # Агрегаты уменьшаются только если запись ещё есть: повторное удаление их не трогает
+                stored = await pipe.get(key)
+                stored = _loads(stored) if stored else None
+                pipe.multi()
+                pipe.delete(key)
+                pipe.srem(self.ESCALATION_LIST_KEY, escalation_id)
+                pipe.zrem(self.ESCALATION_ORDER_KEY, escalation_id)
+                for status in self.ESCALATION_STATUSES:
+                    pipe.zrem(self._status_key(status), escalation_id)
+                if stored:
+                    if stored.get("status") not in self.ESCALATION_STATUSES:
+                        pipe.zrem(self._status_key(stored.get("status")), escalation_id)
+                    if stored.get("ticket_id"):
+                        pipe.delete(f"{self.ESCALATION_TICKET_PREFIX}{stored['ticket_id']}")
+                    if stored.get("csat_rating"):
+                        pipe.hincrby(self.CSAT_DIST_KEY, stored["csat_rating"], -1)
+                        pipe.zrem(self.CSAT_REVIEWS_KEY, escalation_id)
+                    self._count_escalation(pipe, stored, -1)
+                pipe.incr(self.ESCALATION_VERSION_KEY)
+            
+            # Удаление и пересчёт агрегатов одной транзакцией (WATCH на ключе эскалации)
+            await self._client.transaction(remove, key)
             return True
         except Exception as e:
             print(f"Redis delete_escalation error: {e}")
             return False
     
+    # =========================================================================
+    # CSAT
+    # =========================================================================
+    
+    # Hash оценка -> количество (агрегаты без перебора эскалаций)
+    CSAT_DIST_KEY = "csat:dist"
+    # Sorted set escalation_id -> время отправки оценки (лента отзывов)
+    CSAT_REVIEWS_KEY = "csat:reviews"
+    CSAT_BACKFILL_MARKER = "csat:backfilled"
+    
+    async def record_csat(
+        self,
+        escalation_id: str,
+        rating: int,
+        previous_rating: int | None = None,
+    ) -> bool:
+        """Учесть оценку (или её замену) в агрегатах CSAT."""
+        if not self.is_connected:
+            return False
+        
+        try:
+            pipe = self._client.pipeline(transaction=False)
+            if previous_rating:
+                pipe.hincrby(self.CSAT_DIST_KEY, previous_rating, -1)
+            pipe.hincrby(self.CSAT_DIST_KEY, rating, 1)
+            pipe.zadd(self.CSAT_REVIEWS_KEY, {escalation_id: time.time()})
+            await pipe.execute()
+            return True
+        except Exception as e:
+            print(f"Redis record_csat error: {e}")
+            return False
+    
+    async def get_csat_distribution(self) -> dict[int, int]:
+        """Распределение оценок: одна операция HGETALL."""
+        if not self.is_connected:
+            return {}
+        
+        try:
+            raw = await self._client.hgetall(self.CSAT_DIST_KEY)
+            return {int(rating): int(count) for rating, count in raw.items() if int(count) > 0}
+        except Exception as e:
+            print(f"Redis get_csat_distribution error: {e}")
+            return {}
+    
+    async def get_csat_reviewed_escalations(self) -> list[dict[str, Any]]:
+        """Эскалации с оценкой, новые отзывы первыми."""
+        if not self.is_connected:
+            return []
+        
+        try:
+            escalation_ids = await self._client.zrevrange(self.CSAT_REVIEWS_KEY, 0, -1)
+            return await self._load_escalations(escalation_ids)
+        except Exception as e:
+            print(f"Redis get_csat_reviewed_escalations error: {e}")
+            return []
+    
+    async def _backfill_csat(self) -> None:
+        """
+        Построить агрегаты CSAT по оценкам, сохранённым до их появления (один раз).
+        
+        Пересборка идёт в MULTI/EXEC, поэтому параллельный запуск из нескольких воркеров
+        не задваивает счётчики. Маркер ставится последней командой транзакции:
+        если пересборка упала, при следующем подключении она повторится.
+        """
+        try:
+            if await self._client.exists(self.CSAT_BACKFILL_MARKER):
+                return
+            pipe = self._client.pipeline(transaction=True)
+            pipe.delete(self.CSAT_DIST_KEY, self.CSAT_REVIEWS_KEY)
+            for escalation in await self.get_all_escalations():
+                rating = escalation.get("csat_rating")
+                if not rating:
+                    continue
+                escalation_id = escalation.get("escalation_id") or escalation.get("id")
+                pipe.hincrby(self.CSAT_DIST_KEY, rating, 1)
+                submitted_score = self._created_score({"created_at": escalation.get("csat_submitted_at")})
+                pipe.zadd(self.CSAT_REVIEWS_KEY, {escalation_id: submitted_score})
+            pipe.set(self.CSAT_BACKFILL_MARKER, "1")
+            await pipe.execute()
+        except Exception as e:
+            print(f"Redis CSAT backfill error: {e}")
+    
     # =========================================================================
     # RAG Cache
     # =========================================================================
@@ -175,9 +517,21 @@ class RedisService:
     RAG_CACHE_PREFIX = "rag:cache:"
     RAG_CACHE_TTL = 3600  # 1 час
     
+    @staticmethod
+    def _normalize_query(query: str) -> str:
+        """
+        Нормализовать запрос для ключа кеша.
+        
+        "Как сбросить пароль?", "как  сбросить пароль" и "Как сбросить пароль!!"
+        дают один ключ: регистр, ё/е, пунктуация и лишние пробелы отбрасываются.
+        """
+        query = query.casefold().replace("ё", "е")
+        query = _NON_WORD_RE.sub(" ", query)
+        return _WHITESPACE_RE.sub(" ", query).strip()
+    
     def _hash_query(self, query: str, language: str = "ru") -> str:
         """Создать хеш для кеширования."""
-        key = f"{query.lower().strip()}:{language}"
+        key = f"{self._normalize_query(query)}:{language}"
         return hashlib.md5(key.encode()).hexdigest()
     
     async def get_cached_rag_response(self, query: str, language: str = "ru") -> dict[str, Any] | None:
@@ -191,7 +545,7 @@ class RedisService:
             data = await self._client.get(key)
             if data:
                 print(f"🚀 RAG cache hit for query: {query[:50]}...")
-                return json.loads(data)
+                return _loads(data)
             return None
         except Exception as e:
             print(f"Redis get_cached_rag_response error: {e}")
@@ -222,7 +576,7 @@ class RedisService:
             await self._client.setex(
                 key,
                 ttl or self.RAG_CACHE_TTL,
-                json.dumps(cached_data, ensure_ascii=False, default=str),
+                _dumps(cached_data),
             )
             return True
         except Exception as e:
@@ -248,6 +602,119 @@ class RedisService:
             print(f"Redis invalidate_rag_cache error: {e}")
             return 0
     
+    # =========================================================================
+    # AI Response Cache (summarize / translate / suggest-response)
+    # =========================================================================
+    
+    AI_CACHE_PREFIX = "ai:cache:"
+    AI_CACHE_TTL = 3600  # 1 час
+    
+    def _ai_cache_key(self, endpoint: str, prompt: str) -> str:
+        """Ключ точного совпадения: в Redis попадает только SHA-256 промпта."""
+        digest = hashlib.sha256(prompt.encode()).hexdigest()
+        return f"{self.AI_CACHE_PREFIX}{endpoint}:{digest}"
+    
+    async def get_cached_ai_response(self, endpoint: str, prompt: str) -> str | None:
+        """Получить кешированный ответ AI для точно такого же промпта."""
+        if not self.is_connected:
+            return None
+        
+        try:
+            return await self._client.get(self._ai_cache_key(endpoint, prompt))
+        except Exception as e:
+            print(f"Redis get_cached_ai_response error: {e}")
+            return None
+    
+    async def cache_ai_response(
+        self,
+        endpoint: str,
+        prompt: str,
+        response: str,
+        ttl: int | None = None,
+    ) -> bool:
+        """Кешировать ответ AI."""
+        if not self.is_connected:
+            return False
+        
+        try:
+            await self._client.setex(self._ai_cache_key(endpoint, prompt), ttl or self.AI_CACHE_TTL, response)
+            return True
+        except Exception as e:
+            print(f"Redis cache_ai_response error: {e}")
+            return False
+    
+    async def invalidate_ai_cache(self) -> int:
+        """Инвалидировать кеш ответов AI."""
+        if not self.is_connected:
+            return 0
+        
+        try:
+            keys = [key async for key in self._client.scan_iter(f"{self.AI_CACHE_PREFIX}*")]
+            if keys:
+                await self._client.delete(*keys)
+            return len(keys)
+        except Exception as e:
+            print(f"Redis invalidate_ai_cache error: {e}")
+            return 0
+    
+    # =========================================================================
+    # Email Deduplication
+    # =========================================================================
+    
+    EMAIL_SEEN_PREFIX = "email:seen:"
+    EMAIL_SEEN_TTL = 86400 * 7  # 7 дней — повторы писем приходят в пределах дней
+    EMAIL_PROCESSED_COUNT_KEY = "email:processed_count"
+    
+    async def claim_email(self, message_id: str) -> bool | None:
+        """
+        Атомарно занять письмо для обработки (SET NX EX, общий для всех воркеров).
+    
+        True — письмо новое, False — уже обработано/обрабатывается,
+        None — Redis недоступен.
+        """
+        if not self.is_connected:
+            return None
+    
+        try:
+            claimed = await self._client.set(
+                f"{self.EMAIL_SEEN_PREFIX}{message_id}", "1", nx=True, ex=self.EMAIL_SEEN_TTL,
+            )
+            return bool(claimed)
+        except Exception as e:
+            print(f"Redis claim_email error: {e}")
+            return None
+    
+    async def release_email(self, message_id: str) -> None:
+        """Снять отметку, если обработка письма не удалась (чтобы повторить позже)."""
+        if not self.is_connected:
+            return
+    
+        try:
+            await self._client.delete(f"{self.EMAIL_SEEN_PREFIX}{message_id}")
+        except Exception as e:
+            print(f"Redis release_email error: {e}")
+    
+    async def incr_processed_emails(self) -> None:
+        """Увеличить счётчик обработанных писем."""
+        if not self.is_connected:
+            return
+    
+        try:
+            await self._client.incr(self.EMAIL_PROCESSED_COUNT_KEY)
+        except Exception as e:
+            print(f"Redis incr_processed_emails error: {e}")
+    
+    async def get_processed_email_count(self) -> int | None:
+        """Количество обработанных писем (None — Redis недоступен)."""
+        if not self.is_connected:
+            return None
+    
+        try:
+            return int(await self._client.get(self.EMAIL_PROCESSED_COUNT_KEY) or 0)
+        except Exception as e:
+            print(f"Redis get_processed_email_count error: {e}")
+            return None
+    
     # =========================================================================
     # Session Storage
     # =========================================================================
@@ -265,7 +732,7 @@ class RedisService:
             await self._client.setex(
                 key,
                 self.SESSION_TTL,
-                json.dumps(data, ensure_ascii=False, default=str),
+                _dumps(data),
             )
             return True
         except Exception as e:
@@ -281,12 +748,90 @@ class RedisService:
             key = f"{self.SESSION_PREFIX}{session_id}"
             data = await self._client.get(key)
             if data:
-                return json.loads(data)
+                return _loads(data)
             return None
         except Exception as e:
             print(f"Redis get_session error: {e}")
             return None
     
+    # =========================================================================
+    # Channel Sessions (голосовые звонки, WhatsApp)
+    # =========================================================================
+    
+    CHANNEL_SESSION_SCAN_COUNT = 500
+    
+    async def save_channel_session(self, prefix: str, key: str, data: Any, ttl: int) -> bool:
+        """Сохранить состояние сессии канала с TTL (общее для всех воркеров)."""
+        if not self.is_connected:
+            return False
+    
+        try:
+            await self._client.setex(f"{prefix}{key}", ttl, _dumps(data))
+            return True
+        except Exception as e:
+            print(f"Redis save_channel_session error: {e}")
+            return False
+    
+    async def get_channel_session(self, prefix: str, key: str) -> Any | None:
+        """Получить состояние сессии канала."""
+        if not self.is_connected:
+            return None
+    
+        try:
+            data = await self._client.get(f"{prefix}{key}")
+            return _loads(data) if data else None
+        except Exception as e:
+            print(f"Redis get_channel_session error: {e}")
+            return None
+    
+    async def delete_channel_session(self, prefix: str, key: str) -> bool:
+        """Удалить сессию канала. True — если она существовала."""
+        if not self.is_connected:
+            return False
+    
+        try:
+            return bool(await self._client.delete(f"{prefix}{key}"))
+        except Exception as e:
+            print(f"Redis delete_channel_session error: {e}")
+            return False
+    
+    async def get_channel_sessions(self, prefix: str) -> dict[str, Any]:
+        """Все живые сессии канала: SCAN по префиксу + MGET пачками."""
+        if not self.is_connected:
+            return {}
+    
+        try:
+            sessions: dict[str, Any] = {}
+            keys = [
+                key async for key in self._client.scan_iter(
+                    match=f"{prefix}*", count=self.CHANNEL_SESSION_SCAN_COUNT,
+                )
+            ]
+            for start in range(0, len(keys), self.CHANNEL_SESSION_SCAN_COUNT):
+                chunk = keys[start:start + self.CHANNEL_SESSION_SCAN_COUNT]
+                for key, value in zip(chunk, await self._client.mget(chunk)):
+                    # Ключ мог истечь между SCAN и MGET
+                    if value:
+                        sessions[key[len(prefix):]] = _loads(value)
+            return sessions
+        except Exception as e:
+            print(f"Redis get_channel_sessions error: {e}")
+            return {}
+    
+    async def count_channel_sessions(self, prefix: str) -> int:
+        """Количество живых сессий канала (SCAN без загрузки значений)."""
+        if not self.is_connected:
+            return 0
+    
+        try:
+            count = 0
+            async for _ in self._client.scan_iter(match=f"{prefix}*", count=self.CHANNEL_SESSION_SCAN_COUNT):
+                count += 1
+            return count
+        except Exception as e:
+            print(f"Redis count_channel_sessions error: {e}")
+            return 0
+    
     # =========================================================================
     # Stats
     # =========================================================================
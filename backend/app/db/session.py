@@ -1,20 +1,23 @@
 """Инициализация асинхронного движка SQLAlchemy и фабрики сессий."""
 
+import asyncio
+import logging
 from collections.abc import AsyncIterator
 
 from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 
 from ..core.config import get_settings
 
+logger = logging.getLogger(__name__)
 settings = get_settings()
 
 engine: AsyncEngine = create_async_engine(
     settings.sqlalchemy_database_uri,
     echo=settings.debug,
     pool_pre_ping=True,  # Проверять соединение перед использованием
-    pool_size=5,  # Минимум соединений в пуле
-    max_overflow=10,  # Дополнительные соединения при нагрузке
-    pool_recycle=300,  # Переподключаться каждые 5 минут
+    pool_size=settings.db_pool_size,  # Постоянные соединения в пуле (AsyncAdaptedQueuePool)
+    max_overflow=settings.db_max_overflow,  # Дополнительные соединения при нагрузке
+    pool_recycle=settings.db_pool_recycle,  # Переподключаться раз в 30 минут
     pool_timeout=30,  # Таймаут ожидания соединения
     future=True,
 )
@@ -31,3 +34,18 @@ async def get_session() -> AsyncIterator[AsyncSession]:
     async with async_session_factory() as session:
         yield session
 
+
+async def warmup_pool() -> None:
+    """Открыть несколько соединений при старте, чтобы первые запросы не ждали подключения."""
+    count = min(settings.db_pool_warmup, settings.db_pool_size)
+    connections = await asyncio.gather(
+        *(engine.connect() for _ in range(count)),
+        return_exceptions=True,
+    )
+    opened = [conn for conn in connections if not isinstance(conn, BaseException)]
+    # Закрытие возвращает соединения в пул, а не разрывает их
+    await asyncio.gather(*(conn.close() for conn in opened))
+    
+    if len(opened) < len(connections):
+        errors = [conn for conn in connections if isinstance(conn, BaseException)]
+        logger.warning("DB pool warmup: %d/%d connections opened (%s)", len(opened), len(connections), errors[0])
@@ -3,31 +3,51 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
+try:
+    import orjson  # noqa: F401
+
+    from fastapi.responses import ORJSONResponse as DefaultResponse
+except ImportError:  # orjson не установлен — стандартный json
+    from fastapi.responses import JSONResponse as DefaultResponse
+
 from .api.router import api_router
+from .api.routes.integrations.email import stop_email_polling
 from .core.config import get_settings
+from .core.logging import setup_logging, shutdown_logging
 from .core.redis import redis_service
+from .db.session import engine, warmup_pool
+from .services.integrations.twilio_whatsapp import twilio_whatsapp_service
 from .services.redis import redis_client
 
 settings = get_settings()
 
 
 @asynccontextmanager
-async def lifespan(_: FastAPI):
+async def lifespan(app: FastAPI):
     # Startup
+    setup_logging(settings.debug)
     await redis_service.connect()
+    await warmup_pool()
+    # Фоновый поллинг почты (запускается через /email/polling/start)
+    app.state.email_poll_task = None
     
     try:
         yield
     finally:
         # Shutdown
+        await stop_email_polling(app)
+        await twilio_whatsapp_service.close()
+        await engine.dispose()
         await redis_service.disconnect()
         await redis_client.close()
+        shutdown_logging()
 
 
 app = FastAPI(
     title=settings.app_name,
     debug=settings.debug,
     lifespan=lifespan,
+    default_response_class=DefaultResponse,
 )
 
 app.add_middleware(
@@ -36,6 +56,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Total-Count"],
 )
 
 app.include_router(api_router)
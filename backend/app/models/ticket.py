@@ -4,8 +4,8 @@ import uuid
 import enum
 from datetime import datetime
 
-from sqlalchemy import Boolean, DateTime, Enum, ForeignKey, Integer, String, Text, func, Float
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy import Boolean, CheckConstraint, Computed, DateTime, Enum, ForeignKey, Index, Integer, String, Text, func, Float, text
+from sqlalchemy.dialects.postgresql import JSONB, TSVECTOR, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from ..db.base import Base
@@ -43,6 +43,14 @@ class Department(Base):
     """Отдел/департамент для маршрутизации."""
 
     __tablename__ = "departments"
+    __table_args__ = (
+        Index(
+            "ix_departments_keywords_gin",
+            "keywords",
+            postgresql_using="gin",
+            postgresql_ops={"keywords": "jsonb_path_ops"},
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
@@ -52,7 +60,7 @@ class Department(Base):
     name: Mapped[str] = mapped_column(String(100), nullable=False)
     name_kz: Mapped[str] = mapped_column(String(100), nullable=True)
     description: Mapped[str] = mapped_column(Text, nullable=True)
-    keywords: Mapped[str] = mapped_column(Text, nullable=True)  # JSON список ключевых слов для маршрутизации
+    keywords: Mapped[list[str] | None] = mapped_column(JSONB, nullable=True)  # Ключевые слова для маршрутизации
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now(), nullable=False)
 
@@ -79,11 +87,13 @@ class Category(Base):
         UUID(as_uuid=True),
         ForeignKey("departments.id"),
         nullable=True,
+        index=True,
     )
     parent_id: Mapped[uuid.UUID | None] = mapped_column(
         UUID(as_uuid=True),
         ForeignKey("categories.id"),
         nullable=True,
+        index=True,
     )
     auto_response_template: Mapped[str] = mapped_column(Text, nullable=True)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
@@ -99,6 +109,34 @@ class Ticket(Base):
     """Тикет/обращение в службу поддержки."""
 
     __tablename__ = "tickets"
+    __table_args__ = (
+        CheckConstraint(
+            "source IN ('email', 'chat', 'portal', 'phone', 'telegram', 'whatsapp')",
+            name="ck_tickets_source",
+        ),
+        # Частичные индексы по открытым тикетам (см. миграцию 20241208_open_queue)
+        Index(
+            "ix_tickets_open_queue",
+            "priority",
+            "created_at",
+            postgresql_where=text("status IN ('new', 'processing', 'waiting_response', 'escalated')"),
+        ),
+        Index(
+            "ix_tickets_assigned_open",
+            "assigned_to_id",
+            postgresql_where=text("status NOT IN ('resolved', 'closed')"),
+        ),
+        # Триграммные индексы под поиск ILIKE '%...%' (см. миграцию 20241212_ticket_trgm)
+        *(
+            Index(
+                f"ix_tickets_{column}_trgm",
+                column,
+                postgresql_using="gin",
+                postgresql_ops={column: "gin_trgm_ops"},
+            )
+            for column in ("subject", "description", "ticket_number", "client_email")
+        ),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
@@ -128,8 +166,15 @@ class Ticket(Base):
         default=TicketPriority.MEDIUM,
         nullable=False,
     )
+    # VARCHAR + CHECK вместо нативного PG ENUM (см. миграцию 20241209_source_check)
     source: Mapped[TicketSource] = mapped_column(
-        Enum(TicketSource, values_callable=lambda x: [e.value for e in x], name='ticketsource'),
+        Enum(
+            TicketSource,
+            values_callable=lambda x: [e.value for e in x],
+            name='ticketsource',
+            native_enum=False,
+            length=32,
+        ),
         default=TicketSource.PORTAL,
         nullable=False,
     )
@@ -139,16 +184,19 @@ class Ticket(Base):
         UUID(as_uuid=True),
         ForeignKey("departments.id"),
         nullable=True,
+        index=True,
     )
     category_id: Mapped[uuid.UUID | None] = mapped_column(
         UUID(as_uuid=True),
         ForeignKey("categories.id"),
         nullable=True,
+        index=True,
     )
     assigned_to_id: Mapped[uuid.UUID | None] = mapped_column(
         UUID(as_uuid=True),
         ForeignKey("users.id"),
         nullable=True,
+        index=True,
     )
     
     # AI-метаданные
@@ -199,6 +247,7 @@ class Message(Base):
         UUID(as_uuid=True),
         ForeignKey("users.id"),
         nullable=True,
+        index=True,
     )
     
     content: Mapped[str] = mapped_column(Text, nullable=False)
@@ -219,6 +268,16 @@ class KnowledgeBase(Base):
     """База знаний для автоответов."""
 
     __tablename__ = "knowledge_base"
+    __table_args__ = (
+        Index(
+            "ix_knowledge_base_keywords_gin",
+            "keywords",
+            postgresql_using="gin",
+            postgresql_ops={"keywords": "jsonb_path_ops"},
+        ),
+        Index("ix_kb_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_kb_search_vector_kz", "search_vector_kz", postgresql_using="gin"),
+    )
 
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
@@ -229,13 +288,30 @@ class KnowledgeBase(Base):
         UUID(as_uuid=True),
         ForeignKey("categories.id"),
         nullable=True,
+        index=True,
     )
     
     question: Mapped[str] = mapped_column(Text, nullable=False)
     question_kz: Mapped[str] = mapped_column(Text, nullable=True)
     answer: Mapped[str] = mapped_column(Text, nullable=False)
     answer_kz: Mapped[str] = mapped_column(Text, nullable=True)
-    keywords: Mapped[str] = mapped_column(Text, nullable=True)  # JSON список ключевых слов
+    keywords: Mapped[list[str] | None] = mapped_column(JSONB, nullable=True)  # Ключевые слова
+    # Полнотекстовый поиск (генерируемые колонки, см. миграцию 20241211_kb_fts)
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('russian', coalesce(question, '') || ' ' || coalesce(answer, '')) || "
+            "jsonb_to_tsvector('simple', coalesce(keywords, '[]'::jsonb), '[\"string\"]')",
+            persisted=True,
+        ),
+    )
+    search_vector_kz: Mapped[str] = mapped_column(
+        TSVECTOR,
+        Computed(
+            "to_tsvector('simple', coalesce(question_kz, '') || ' ' || coalesce(answer_kz, ''))",
+            persisted=True,
+        ),
+    )
     
     usage_count: Mapped[int] = mapped_column(Integer, default=0, nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean, default=True, nullable=False)
@@ -12,6 +12,7 @@ from ...schemas.ticket import (
     AIClassificationResult,
     TicketPriority,
 )
+from .completion import OPENAI_COMPLETIONS_URL, cached_completion
 
 settings = get_settings()
 
@@ -112,6 +113,9 @@ FAQ_BASE = [
     },
 ]
 
+# Ответ summarize_conversation, когда резюме получить не удалось
+SUMMARY_UNAVAILABLE = "Резюме недоступно"
+
 
 class AIService:
     """Сервис для AI-классификации и автоответов."""
@@ -178,57 +182,46 @@ class AIService:
         user_message = f"Тема: {subject}\n\nОписание: {description}"
 
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": user_message},
-                        ],
-                        "temperature": 0.3,
-                        "max_tokens": 1000,
-                    },
-                    timeout=30.0,
-                )
-                response.raise_for_status()
-                data = response.json()
-                
-                content = data["choices"][0]["message"]["content"]
-                # Очистим от возможных markdown-блоков
-                content = content.strip()
-                if content.startswith("```"):
-                    content = re.sub(r"```json?\n?", "", content)
-                    content = content.rstrip("`").strip()
-                
-                result = json.loads(content)
-                
-                # Получаем ID департамента и категории
-                dept_key = result.get("department_key", "it_support")
-                dept_data = DEMO_DEPARTMENTS.get(dept_key, DEMO_DEPARTMENTS["it_support"])
-                department_id = uuid.UUID(dept_data["id"])
-                
-                cat_key = result.get("category_key")
-                category_id = None
-                if cat_key and cat_key in DEMO_CATEGORIES:
-                    category_id = uuid.UUID(DEMO_CATEGORIES[cat_key]["id"])
-                
-                return AIClassificationResult(
-                    category_id=category_id,
-                    department_id=department_id,
-                    priority=TicketPriority(result.get("priority", "medium")),
-                    confidence=float(result.get("confidence", 0.8)),
-                    detected_language=result.get("detected_language", language),
-                    summary=result.get("summary", subject),
-                    suggested_response=result.get("suggested_response"),
-                    can_auto_resolve=result.get("can_auto_resolve", False),
-                )
-                
+            content = await cached_completion(
+                self.api_key,
+                self.model,
+                "classify",
+                [
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_message},
+                ],
+                temperature=0.3,
+                max_tokens=1000,
+            )
+            # Очистим от возможных markdown-блоков
+            content = content.strip()
+            if content.startswith("```"):
+                content = re.sub(r"```json?\n?", "", content)
+                content = content.rstrip("`").strip()
+            
+            result = json.loads(content)
+            
+            # Получаем ID департамента и категории
+            dept_key = result.get("department_key", "it_support")
+            dept_data = DEMO_DEPARTMENTS.get(dept_key, DEMO_DEPARTMENTS["it_support"])
+            department_id = uuid.UUID(dept_data["id"])
+            
+            cat_key = result.get("category_key")
+            category_id = None
+            if cat_key and cat_key in DEMO_CATEGORIES:
+                category_id = uuid.UUID(DEMO_CATEGORIES[cat_key]["id"])
+            
+            return AIClassificationResult(
+                category_id=category_id,
+                department_id=department_id,
+                priority=TicketPriority(result.get("priority", "medium")),
+                confidence=float(result.get("confidence", 0.8)),
+                detected_language=result.get("detected_language", language),
+                summary=result.get("summary", subject),
+                suggested_response=result.get("suggested_response"),
+                can_auto_resolve=result.get("can_auto_resolve", False),
+            )
+            
         except Exception as e:
             print(f"OpenAI classification error: {e}")
             # Fallback на rule-based
@@ -357,10 +350,12 @@ class AIService:
             role = "user" if msg.get("is_from_client") else "assistant"
             messages.append({"role": role, "content": msg["content"]})
         
+        # Автоответ сэмплируется (temperature=0.7) — не кешируется, иначе одинаковые
+        # обращения час получали бы один и тот же ответ
         try:
             async with httpx.AsyncClient() as client:
                 response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
+                    OPENAI_COMPLETIONS_URL,
                     headers={
                         "Authorization": f"Bearer {self.api_key}",
                         "Content-Type": "application/json",
@@ -450,7 +445,7 @@ class AIService:
                 
         except Exception as e:
             print(f"OpenAI summarization error: {e}")
-            return "Резюме недоступно"
+            return SUMMARY_UNAVAILABLE
 
     async def translate_text(
         self,
@@ -465,31 +460,20 @@ class AIService:
         lang_name = "казахский" if target_language == "kz" else "русский"
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [
-                            {
-                                "role": "system",
-                                "content": f"Переведи текст на {lang_name} язык. Отвечай только переводом, без пояснений.",
-                            },
-                            {"role": "user", "content": text},
-                        ],
-                        "temperature": 0.3,
-                        "max_tokens": 1000,
+            return await cached_completion(
+                self.api_key,
+                self.model,
+                "translate",
+                [
+                    {
+                        "role": "system",
+                        "content": f"Переведи текст на {lang_name} язык. Отвечай только переводом, без пояснений.",
                     },
-                    timeout=30.0,
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data["choices"][0]["message"]["content"]
-                
+                    {"role": "user", "content": text},
+                ],
+                temperature=0.3,
+                max_tokens=1000,
+            )
         except Exception as e:
             print(f"OpenAI translation error: {e}")
             return text
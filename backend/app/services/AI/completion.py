@@ -0,0 +1,52 @@
+"""Запросы к OpenAI Chat Completions с кешем точного совпадения в Redis."""
+
+import json
+
+import httpx
+
+from ...core.redis import redis_service
+
+OPENAI_COMPLETIONS_URL = "https://api.openai.com/v1/chat/completions"
+
+
+async def cached_completion(
+    api_key: str,
+    model: str,
+    endpoint: str,
+    messages: list[dict[str, str]],
+    temperature: float,
+    max_tokens: int,
+) -> str:
+    """
+    Запрос к OpenAI с кешем точного совпадения в Redis.
+    
+    Ключ — SHA-256 от модели и полного промпта (язык и контекст уже в нём).
+    Ошибки OpenAI пробрасываются, чтобы fallback-ответы не попадали в кеш.
+    Не использовать для сэмплированных ответов, которые уходят клиенту напрямую
+    (автоответы): иначе все на час получат один и тот же «случайный» ответ.
+    """
+    prompt = json.dumps([model, messages], ensure_ascii=False)
+    cached = await redis_service.get_cached_ai_response(endpoint, prompt)
+    if cached is not None:
+        return cached
+    
+    async with httpx.AsyncClient() as client:
+        response = await client.post(
+            OPENAI_COMPLETIONS_URL,
+            headers={
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json",
+            },
+            json={
+                "model": model,
+                "messages": messages,
+                "temperature": temperature,
+                "max_tokens": max_tokens,
+            },
+            timeout=30.0,
+        )
+        response.raise_for_status()
+        content = response.json()["choices"][0]["message"]["content"]
+    
+    await redis_service.cache_ai_response(endpoint, prompt, content)
+    return content
@@ -1,13 +1,16 @@
 """RAG (Retrieval-Augmented Generation) сервис с иерархической структурой."""
 
+import hashlib
 import json
 import uuid
 from datetime import datetime
-from typing import Any
+from typing import Any, AsyncIterator
 import httpx
 
 from ...core.config import get_settings
+from ...core.redis import redis_service
 from ...schemas.ticket import TicketPriority
+from .completion import cached_completion
 
 settings = get_settings()
 
@@ -431,6 +434,14 @@ class RAGService:
         self.model = getattr(settings, 'openai_model', 'gpt-4o-mini')
         self.use_openai = bool(self.api_key and self.api_key != "your-openai-api-key-here")
         self.knowledge_base = HIERARCHICAL_KNOWLEDGE_BASE
+        # Количество статей считается один раз и поддерживается в add_to_knowledge_base
+        self.article_count = sum(
+            len(sub.get("articles", []))
+            for cat in self.knowledge_base.values()
+            for sub in cat.get("subcategories", {}).values()
+        )
+        # Сериализованное дерево категорий и его ETag; сбрасывается в add_to_knowledge_base
+        self._categories_payload: tuple[bytes, str] | None = None
 
     def search_knowledge_base(
         self,
@@ -528,8 +539,6 @@ class RAGService:
             }
         """
         # Проверяем кеш Redis (только для простых запросов без истории)
-        from ...core.redis import redis_service
-        
         use_cache = conversation_history is None or len(conversation_history) == 0
         
         if use_cache:
@@ -973,6 +982,8 @@ class RAGService:
                 return False
             
             category["subcategories"][subcategory_key]["articles"].append(article)
+            self.article_count += 1
+            self._categories_payload = None
             return True
         except Exception:
             return False
@@ -996,6 +1007,58 @@ class RAGService:
             })
         return result
 
+    @staticmethod
+    def _summarize_messages(text: str, language: str) -> list[dict[str, str]]:
+        prompt = "Резюмируй следующий текст кратко и по существу:" if language == "ru" else "Мәтінді қысқаша түйіндеңіз:"
+        return [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": text},
+        ]
+
+    @staticmethod
+    def _translate_messages(text: str, target_language: str) -> list[dict[str, str]]:
+        if target_language == "kz":
+            prompt = "Переведи следующий текст на казахский язык. Отвечай только переводом:"
+        else:
+            prompt = "Келесі мәтінді орыс тіліне аударыңыз. Тек аударманы жазыңыз:"
+        return [
+            {"role": "system", "content": prompt},
+            {"role": "user", "content": text},
+        ]
+
+    @staticmethod
+    def _suggestion_messages(
+        client_message: str,
+        kb_context: str,
+        context: str | None,
+        language: str,
+    ) -> list[dict[str, str]]:
+        system_prompt = f"""Ты - помощник оператора службы поддержки. 
+Сгенерируй профессиональный и вежливый ответ на сообщение клиента.
+
+Контекст из базы знаний:
+{kb_context}
+
+{f"Дополнительный контекст: {context}" if context else ""}
+
+Требования:
+- Ответ должен быть на {'русском' if language == 'ru' else 'казахском'} языке
+- Вежливый и профессиональный тон
+- Конкретные шаги решения если возможно
+- Предложение помощи в конце"""
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": f"Сообщение клиента: {client_message}"},
+        ]
+
+    def get_categories_payload(self) -> tuple[bytes, str]:
+        """Дерево категорий в виде готового JSON и слабый ETag для него (кешируется)."""
+        if self._categories_payload is None:
+            body = json.dumps(self.get_categories(), ensure_ascii=False).encode()
+            etag = f'W/"{hashlib.sha1(body).hexdigest()[:16]}"'
+            self._categories_payload = (body, etag)
+        return self._categories_payload
+
     async def summarize(self, text: str, language: str = "ru") -> str:
         """
         Резюмирование текста с помощью AI.
@@ -1004,30 +1067,15 @@ class RAGService:
             # Fallback: первые 200 символов
             return text[:200] + "..." if len(text) > 200 else text
         
-        prompt = "Резюмируй следующий текст кратко и по существу:" if language == "ru" else "Мәтінді қысқаша түйіндеңіз:"
-        
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [
-                            {"role": "system", "content": prompt},
-                            {"role": "user", "content": text},
-                        ],
-                        "temperature": 0.3,
-                        "max_tokens": 300,
-                    },
-                    timeout=30.0,
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data["choices"][0]["message"]["content"]
+            return await cached_completion(
+                self.api_key,
+                self.model,
+                "summarize",
+                self._summarize_messages(text, language),
+                temperature=0.3,
+                max_tokens=300,
+            )
         except Exception as e:
             print(f"Summarize error: {e}")
             return text[:200] + "..." if len(text) > 200 else text
@@ -1039,33 +1087,15 @@ class RAGService:
         if not self.use_openai:
             return f"[Перевод недоступен] {text}"
         
-        if target_language == "kz":
-            prompt = "Переведи следующий текст на казахский язык. Отвечай только переводом:"
-        else:
-            prompt = "Келесі мәтінді орыс тіліне аударыңыз. Тек аударманы жазыңыз:"
-        
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [
-                            {"role": "system", "content": prompt},
-                            {"role": "user", "content": text},
-                        ],
-                        "temperature": 0.3,
-                        "max_tokens": 1000,
-                    },
-                    timeout=30.0,
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data["choices"][0]["message"]["content"]
+            return await cached_completion(
+                self.api_key,
+                self.model,
+                "translate",
+                self._translate_messages(text, target_language),
+                temperature=0.3,
+                max_tokens=1000,
+            )
         except Exception as e:
             print(f"Translate error: {e}")
             return f"[Ошибка перевода] {text}"
@@ -1089,48 +1119,131 @@ class RAGService:
                 return search_results[0]["answer"]
             return "Рекомендую уточнить детали проблемы у клиента."
         
-        system_prompt = f"""Ты - помощник оператора службы поддержки. 
-Сгенерируй профессиональный и вежливый ответ на сообщение клиента.
-
-Контекст из базы знаний:
-{kb_context}
-
-{f"Дополнительный контекст: {context}" if context else ""}
-
-Требования:
-- Ответ должен быть на {'русском' if language == 'ru' else 'казахском'} языке
-- Вежливый и профессиональный тон
-- Конкретные шаги решения если возможно
-- Предложение помощи в конце"""
-        
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers={
-                        "Authorization": f"Bearer {self.api_key}",
-                        "Content-Type": "application/json",
-                    },
-                    json={
-                        "model": self.model,
-                        "messages": [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": f"Сообщение клиента: {client_message}"},
-                        ],
-                        "temperature": 0.7,
-                        "max_tokens": 500,
-                    },
-                    timeout=30.0,
-                )
-                response.raise_for_status()
-                data = response.json()
-                return data["choices"][0]["message"]["content"]
+            return await cached_completion(
+                self.api_key,
+                self.model,
+                "suggest",
+                self._suggestion_messages(client_message, kb_context, context, language),
+                temperature=0.7,
+                max_tokens=500,
+            )
         except Exception as e:
             print(f"Suggestion error: {e}")
             if search_results:
                 return search_results[0]["answer"]
             return "Рекомендую уточнить детали проблемы у клиента."
 
+    # ------------------------------------------------------------------
+    # Потоковые варианты (SSE): клиент получает текст по мере генерации
+    # ------------------------------------------------------------------
+
+    async def _stream_completion(
+        self,
+        messages: list[dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+    ) -> AsyncIterator[str]:
+        """Потоковый запрос к OpenAI (stream=True), отдаёт фрагменты текста."""
+        async with httpx.AsyncClient() as client:
+            async with client.stream(
+                "POST",
+                "https://api.openai.com/v1/chat/completions",
+                headers={
+                    "Authorization": f"Bearer {self.api_key}",
+                    "Content-Type": "application/json",
+                },
+                json={
+                    "model": self.model,
+                    "messages": messages,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "stream": True,
+                },
+                timeout=30.0,
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: "):
+                        continue
+                    payload = line[len("data: "):]
+                    if payload == "[DONE]":
+                        break
+                    delta = json.loads(payload)["choices"][0]["delta"].get("content")
+                    if delta:
+                        yield delta
+
+    async def _stream_or_fallback(
+        self,
+        messages: list[dict[str, str]],
+        temperature: float,
+        max_tokens: int,
+        fallback: str,
+        error_label: str,
+    ) -> AsyncIterator[str]:
+        """
+        Стрим ответа; при ошибке до первого фрагмента — отдаёт fallback.
+        
+        Если часть ответа уже ушла клиенту, ошибка пробрасывается: иначе обрезанный
+        текст выглядел бы как полный ответ.
+        """
+        if not self.use_openai:
+            yield fallback
+            return
+        
+        streamed = False
+        try:
+            async for chunk in self._stream_completion(messages, temperature, max_tokens):
+                streamed = True
+                yield chunk
+        except Exception as e:
+            print(f"{error_label} error: {e}")
+            if streamed:
+                raise
+            yield fallback
+
+    def summarize_stream(self, text: str, language: str = "ru") -> AsyncIterator[str]:
+        """Потоковое резюмирование (см. summarize)."""
+        return self._stream_or_fallback(
+            self._summarize_messages(text, language),
+            temperature=0.3,
+            max_tokens=300,
+            fallback=text[:200] + "..." if len(text) > 200 else text,
+            error_label="Summarize stream",
+        )
+
+    def translate_stream(self, text: str, target_language: str) -> AsyncIterator[str]:
+        """Потоковый перевод (см. translate)."""
+        fallback = f"[Перевод недоступен] {text}" if not self.use_openai else f"[Ошибка перевода] {text}"
+        return self._stream_or_fallback(
+            self._translate_messages(text, target_language),
+            temperature=0.3,
+            max_tokens=1000,
+            fallback=fallback,
+            error_label="Translate stream",
+        )
+
+    def generate_response_suggestion_stream(
+        self,
+        client_message: str,
+        context: str | None = None,
+        language: str = "ru",
+    ) -> AsyncIterator[str]:
+        """Потоковая подсказка ответа оператору (см. generate_response_suggestion)."""
+        search_results = self.search_knowledge_base(client_message)
+        fallback = (
+            search_results[0]["answer"]
+            if search_results
+            else "Рекомендую уточнить детали проблемы у клиента."
+        )
+        return self._stream_or_fallback(
+            self._suggestion_messages(client_message, self.build_context(search_results), context, language),
+            temperature=0.7,
+            max_tokens=500,
+            fallback=fallback,
+            error_label="Suggestion stream",
+        )
+
     async def analyze_conversation_for_kb(
         self,
         conversation: str,
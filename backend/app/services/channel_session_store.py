@@ -0,0 +1,125 @@
+"""Хранилище сессий каналов (звонки, WhatsApp) с поддержкой Redis и fallback на in-memory."""
+
+import time
+from datetime import datetime
+from functools import lru_cache
+from typing import Any
+
+from ..core.redis import redis_service
+
+# Сколько последних сообщений хранится в сессии (JSON в Redis не должен расти бесконечно)
+SESSION_HISTORY_LIMIT = 64
+# Сколько последних сообщений сессии переносится в эскалацию для оператора
+ESCALATION_HISTORY_LIMIT = 20
+
+
+@lru_cache(maxsize=1)
+def _format_second(second: int) -> str:
+    return datetime.fromtimestamp(second).isoformat()
+
+
+def session_timestamp() -> str:
+    """
+    Локальное время в ISO-формате с точностью до секунды для сообщений сессии.
+    Строка форматируется один раз в секунду, а не на каждое сообщение.
+    """
+    return _format_second(int(time.time()))
+
+
+def append_session_message(
+    history: list[dict[str, Any]],
+    content: str,
+    is_user: bool,
+    limit: int = SESSION_HISTORY_LIMIT,
+) -> None:
+    """Добавить сообщение в историю сессии, оставив не больше limit последних."""
+    history.append({
+        "content": content,
+        "is_user": is_user,
+        "timestamp": session_timestamp(),
+    })
+    del history[:-limit]
+
+
+class ChannelSessionStore:
+    """
+    Состояние диалога по ключу (CallSid, номер телефона) с TTL.
+    В Redis сессия видна всем воркерам; без Redis — in-memory с тем же TTL.
+    """
+    
+    # Лимит in-memory fallback: при переполнении вытесняются самые старые сессии
+    MEMORY_MAX_SESSIONS = 10000
+    
+    def __init__(self, prefix: str, ttl: int):
+        self.prefix = prefix
+        self.ttl = ttl
+        # ключ -> (момент истечения, данные); порядок вставки = порядок последней записи
+        self._memory_store: dict[str, tuple[float, Any]] = {}
+    
+    @property
+    def _use_redis(self) -> bool:
+        return redis_service.is_connected
+    
+    def _memory_alive(self) -> dict[str, Any]:
+        """Живые сессии в памяти (истёкшие удаляются)."""
+        now = time.monotonic()
+        expired = [key for key, (expires_at, _) in self._memory_store.items() if expires_at <= now]
+        for key in expired:
+            del self._memory_store[key]
+        return {key: data for key, (_, data) in self._memory_store.items()}
+    
+    async def get(self, key: str) -> Any | None:
+        """Получить сессию."""
+        if self._use_redis:
+            return await redis_service.get_channel_session(self.prefix, key)
+        
+        entry = self._memory_store.get(key)
+        if entry is None:
+            return None
+        expires_at, data = entry
+        if expires_at <= time.monotonic():
+            del self._memory_store[key]
+            return None
+        return data
+    
+    async def set(self, key: str, data: Any) -> None:
+        """Сохранить сессию (TTL отсчитывается заново)."""
+        if self._use_redis:
+            await redis_service.save_channel_session(self.prefix, key, data, self.ttl)
+            return
+        
+        self._memory_store.pop(key, None)
+        self._memory_store[key] = (time.monotonic() + self.ttl, data)
+        while len(self._memory_store) > self.MEMORY_MAX_SESSIONS:
+            del self._memory_store[next(iter(self._memory_store))]
+    
+    async def delete(self, key: str) -> bool:
+        """Удалить сессию. True — если она была."""
+        if self._use_redis:
+            return await redis_service.delete_channel_session(self.prefix, key)
+        
+        return self._memory_store.pop(key, None) is not None
+    
+    async def get_all(self) -> dict[str, Any]:
+        """Все живые сессии (ключ -> данные)."""
+        if self._use_redis:
+            return await redis_service.get_channel_sessions(self.prefix)
+        
+        return self._memory_alive()
+    
+    async def count(self) -> int:
+        """Количество живых сессий."""
+        if self._use_redis:
+            return await redis_service.count_channel_sessions(self.prefix)
+        
+        return len(self._memory_alive())
+
+
+# Голосовые звонки: CallSid -> сессия (звонок не длится дольше часа)
+voice_session_store = ChannelSessionStore("voice:session:", ttl=3600)
+# WhatsApp (Meta Business API): номер телефона -> история диалога
+meta_whatsapp_session_store = ChannelSessionStore("whatsapp:meta:session:", ttl=86400)
+# WhatsApp (Twilio): номер телефона -> история диалога
+whatsapp_session_store = ChannelSessionStore("whatsapp:session:", ttl=86400)
+# WhatsApp (Twilio): номер телефона -> номер активной эскалации (связь с оператором)
+whatsapp_escalation_links = ChannelSessionStore("whatsapp:escalation:", ttl=86400)
@@ -1,5 +1,6 @@
 """Хранилище эскалаций с поддержкой Redis и fallback на in-memory."""
 
+from collections import Counter
 from datetime import datetime
 from typing import Any
 
@@ -12,19 +13,89 @@ class EscalationStore:
     Использует Redis если доступен, иначе in-memory.
     """
     
+    # Лимит in-memory fallback: при переполнении вытесняются самые старые эскалации
+    MEMORY_MAX_ESCALATIONS = 1000
+    
     def __init__(self):
-        self._memory_store: list[dict[str, Any]] = []
+        # escalation_id (или id, если номера нет) -> эскалация; порядок вставки сохраняется
+        self._memory_store: dict[str, dict[str, Any]] = {}
+        # Внутренний id -> ключ в _memory_store
+        self._memory_aliases: dict[str, str] = {}
+        # ticket_id (UUID тикета в БД) -> ключ в _memory_store
+        self._memory_by_ticket: dict[str, str] = {}
+        # status -> {ключ -> эскалация}: фильтр по статусу без перебора всего хранилища
+        self._memory_by_status: dict[str, dict[str, dict[str, Any]]] = {}
+        # Счётчики для статистики (in-memory режим), обновляются при каждой записи
+        self._memory_counts: dict[str, Counter] = {
+            field: Counter() for field in ("status", "department", "priority", "csat_rating")
+        }
+        # Увеличивается при каждой записи (in-memory режим) — для ETag списка эскалаций
+        self._memory_version = 0
     
     @property
     def _use_redis(self) -> bool:
         return redis_service.is_connected
     
+    @staticmethod
+    def _key(escalation: dict[str, Any]) -> str:
+        return escalation.get("escalation_id") or escalation.get("id")
+    
+    def _memory_get(self, escalation_id: str) -> dict[str, Any] | None:
+        """O(1) поиск в памяти по escalation_id или внутреннему id."""
+        escalation = self._memory_store.get(escalation_id)
+        if escalation is None:
+            key = self._memory_aliases.get(escalation_id)
+            if key is not None:
+                escalation = self._memory_store.get(key)
+        return escalation
+    
+    def _memory_account(self, escalation: dict[str, Any], delta: int) -> None:
+        """Учесть (delta=1) или вычесть (delta=-1) эскалацию из бакетов статусов, индекса тикетов и счётчиков."""
+        key = self._key(escalation)
+        bucket = self._memory_by_status.setdefault(escalation.get("status"), {})
+        ticket_id = escalation.get("ticket_id")
+        if delta > 0:
+            bucket[key] = escalation
+            if ticket_id:
+                self._memory_by_ticket[ticket_id] = key
+        else:
+            bucket.pop(key, None)
+            if ticket_id and self._memory_by_ticket.get(ticket_id) == key:
+                del self._memory_by_ticket[ticket_id]
+        
+        counts = self._memory_counts
+        counts["status"][escalation.get("status")] += delta
+        counts["department"][escalation.get("department", "unknown")] += delta
+        counts["priority"][escalation.get("priority", "medium")] += delta
+        if escalation.get("csat_rating"):
+            counts["csat_rating"][escalation["csat_rating"]] += delta
+    
+    def _memory_remove(self, escalation: dict[str, Any]) -> None:
+        """Убрать эскалацию из памяти вместе с алиасом, бакетом статуса и счётчиками."""
+        self._memory_store.pop(self._key(escalation), None)
+        self._memory_account(escalation, -1)
+        internal_id = escalation.get("id")
+        if internal_id:
+            self._memory_aliases.pop(internal_id, None)
+    
     async def add(self, escalation: dict[str, Any]) -> dict[str, Any]:
         """Добавить новую эскалацию."""
         if self._use_redis:
             await redis_service.save_escalation(escalation)
         else:
-            self._memory_store.append(escalation)
+            key = self._key(escalation)
+            previous = self._memory_store.get(key)
+            if previous is not None:
+                self._memory_account(previous, -1)
+            self._memory_store[key] = escalation
+            self._memory_account(escalation, 1)
+            internal_id = escalation.get("id")
+            if internal_id and internal_id != key:
+                self._memory_aliases[internal_id] = key
+            
+            while len(self._memory_store) > self.MEMORY_MAX_ESCALATIONS:
+                self._memory_remove(next(iter(self._memory_store.values())))
+            self._memory_version += 1
         return escalation
     
     async def get_all(self, status: str | None = None) -> list[dict[str, Any]]:
@@ -33,28 +104,46 @@ class EscalationStore:
             return await redis_service.get_all_escalations(status)
         
         if status:
-            return [e for e in self._memory_store if e.get("status") == status]
-        return self._memory_store.copy()
+            return list(self._memory_by_status.get(status, {}).values())
+        return list(self._memory_store.values())
+    
+    async def get_page(
+        self,
+        status: str | None = None,
+        limit: int | None = 50,
+        offset: int = 0,
+    ) -> tuple[list[dict[str, Any]], int]:
+        """Получить страницу эскалаций (новые первые) и общее количество; limit=None — до конца списка."""
+        if self._use_redis:
+            return await redis_service.get_escalations_page(status, limit, offset)
+        
+        if status is None:
+            escalations = list(reversed(self._memory_store.values()))
+        else:
+            # В бакет эскалация попадает при смене статуса, поэтому порядок восстанавливаем по дате
+            escalations = sorted(
+                self._memory_by_status.get(status, {}).values(),
+                key=lambda e: e.get("created_at") or "",
+                reverse=True,
+            )
+        end = None if limit is None else offset + limit
+        return escalations[offset:end], len(escalations)
     
     async def get_by_id(self, escalation_id: str) -> dict[str, Any] | None:
         """Получить эскалацию по ID."""
         if self._use_redis:
-            # Сначала пробуем по escalation_id
-            result = await redis_service.get_escalation(escalation_id)
-            if result:
-                return result
-            
-            # Если не нашли, ищем по id
-            all_esc = await redis_service.get_all_escalations()
-            for e in all_esc:
-                if e.get("id") == escalation_id:
-                    return e
-            return None
+            # Redis ищет и по escalation_id, и по внутреннему id (через алиас)
+            return await redis_service.get_escalation(escalation_id)
         
-        for e in self._memory_store:
-            if e.get("escalation_id") == escalation_id or e.get("id") == escalation_id:
-                return e
-        return None
+        return self._memory_get(escalation_id)
+    
+    async def get_by_ticket_id(self, ticket_id: str) -> dict[str, Any] | None:
+        """Получить эскалацию, связанную с тикетом (O(1) по индексу ticket_id)."""
+        if self._use_redis:
+            return await redis_service.get_escalation_by_ticket(ticket_id)
+        
+        key = self._memory_by_ticket.get(ticket_id)
+        return self._memory_store.get(key) if key is not None else None
     
     async def update(self, escalation_id: str, updates: dict[str, Any]) -> dict[str, Any] | None:
         """Обновить эскалацию."""
@@ -64,20 +153,29 @@ class EscalationStore:
             if not escalation:
                 return None
             
+            previous_rating = escalation.get("csat_rating")
+            
             # Обновляем
             escalation.update(updates)
             
             # Сохраняем
-            real_id = escalation.get("escalation_id") or escalation.get("id")
             await redis_service.save_escalation(escalation)
             
+            # Агрегаты CSAT в Redis ведутся инкрементально (с учётом повторной оценки)
+            rating = escalation.get("csat_rating")
+            if rating and rating != previous_rating:
+                await redis_service.record_csat(self._key(escalation), rating, previous_rating)
+            
             return escalation
         
-        for i, e in enumerate(self._memory_store):
-            if e.get("escalation_id") == escalation_id or e.get("id") == escalation_id:
-                self._memory_store[i].update(updates)
-                return self._memory_store[i]
-        return None
+        escalation = self._memory_get(escalation_id)
+        if escalation is None:
+            return None
+        self._memory_account(escalation, -1)
+        escalation.update(updates)
+        self._memory_account(escalation, 1)
+        self._memory_version += 1
+        return escalation
     
     async def delete(self, escalation_id: str) -> bool:
         """Удалить эскалацию."""
@@ -89,12 +187,12 @@ class EscalationStore:
                 return await redis_service.delete_escalation(real_id)
             return False
         
-        initial_len = len(self._memory_store)
-        self._memory_store = [
-            e for e in self._memory_store
-            if e.get("escalation_id") != escalation_id and e.get("id") != escalation_id
-        ]
-        return len(self._memory_store) < initial_len
+        escalation = self._memory_get(escalation_id)
+        if escalation is None:
+            return False
+        self._memory_remove(escalation)
+        self._memory_version += 1
+        return True
     
     async def add_client_message(self, escalation_id: str, message: str) -> dict[str, Any] | None:
         """Добавить сообщение клиента в эскалацию."""
@@ -121,6 +219,8 @@ class EscalationStore:
         # Сохраняем
         if self._use_redis:
             await redis_service.save_escalation(escalation)
+        else:
+            self._memory_version += 1
         
         return escalation
     
@@ -158,6 +258,8 @@ class EscalationStore:
         # Сохраняем
         if self._use_redis:
             await redis_service.save_escalation(escalation)
+        else:
+            self._memory_version += 1
         
         return escalation
     
@@ -170,38 +272,64 @@ class EscalationStore:
         
         return await self.update(escalation_id, updates)
     
+    async def get_version(self) -> int:
+        """Номер версии: меняется при любой записи в хранилище."""
+        if self._use_redis:
+            version = await redis_service.get_escalations_version()
+            if version is not None:
+                return version
+        return self._memory_version
+    
     async def count(self, status: str | None = None) -> int:
         """Подсчитать количество эскалаций."""
         escalations = await self.get_all(status)
         return len(escalations)
     
+    @staticmethod
+    def _positive(counter: Counter) -> dict[Any, int]:
+        return {key: value for key, value in counter.items() if value > 0}
+    
     async def get_stats(self) -> dict[str, Any]:
         """Получить статистику по эскалациям."""
-        all_esc = await self.get_all()
-        
-        pending = sum(1 for e in all_esc if e.get("status") == "pending")
-        in_progress = sum(1 for e in all_esc if e.get("status") == "in_progress")
-        resolved = sum(1 for e in all_esc if e.get("status") == "resolved")
-        
-        by_department = {}
-        by_priority = {}
-        
-        for e in all_esc:
-            dept = e.get("department", "unknown")
-            by_department[dept] = by_department.get(dept, 0) + 1
-            
-            priority = e.get("priority", "medium")
-            by_priority[priority] = by_priority.get(priority, 0) + 1
+        if self._use_redis:
+            # Счётчики ведутся HINCRBY в транзакциях save/delete — без загрузки всех эскалаций
+            stats = await redis_service.get_escalation_stats()
+            by_status = Counter(stats.get("status", {}))
+            by_department = Counter(stats.get("department", {}))
+            by_priority = Counter(stats.get("priority", {}))
+            total = stats.get("total", 0)
+        else:
+            # O(1): счётчики ведутся при add/update/delete
+            by_status = self._memory_counts["status"]
+            by_department = self._memory_counts["department"]
+            by_priority = self._memory_counts["priority"]
+            total = len(self._memory_store)
         
         return {
-            "total": len(all_esc),
-            "pending": pending,
-            "in_progress": in_progress,
-            "resolved": resolved,
-            "by_department": by_department,
-            "by_priority": by_priority,
+            "total": total,
+            "pending": by_status["pending"],
+            "in_progress": by_status["in_progress"],
+            "resolved": by_status["resolved"],
+            "by_department": self._positive(by_department),
+            "by_priority": self._positive(by_priority),
             "storage": "redis" if self._use_redis else "memory",
         }
+    
+    async def get_csat_distribution(self) -> dict[int, int]:
+        """Распределение CSAT-оценок: оценка -> количество."""
+        if self._use_redis:
+            return await redis_service.get_csat_distribution()
+        
+        return self._positive(self._memory_counts["csat_rating"])
+    
+    async def get_csat_reviewed(self) -> list[dict[str, Any]]:
+        """Эскалации с CSAT-оценкой, новые отзывы первыми."""
+        if self._use_redis:
+            return await redis_service.get_csat_reviewed_escalations()
+        
+        reviewed = [e for e in self._memory_store.values() if e.get("csat_rating")]
+        reviewed.sort(key=lambda e: e.get("csat_submitted_at") or "", reverse=True)
+        return reviewed
 
 
 # Singleton instance
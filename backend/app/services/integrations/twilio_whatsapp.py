@@ -3,6 +3,7 @@
 from datetime import datetime
 from typing import Any
 
+from twilio.http.async_http_client import AsyncTwilioHttpClient
 from twilio.rest import Client
 from twilio.request_validator import RequestValidator
 
@@ -36,12 +37,26 @@ class TwilioWhatsAppService:
             self.whatsapp_number
         )
         
-        if self.enabled:
-            self.client = Client(self.account_sid, self.auth_token)
-            self.validator = RequestValidator(self.auth_token)
-        else:
+        # REST-клиент создаётся при первой отправке (aiohttp-сессии нужен
+        # работающий event loop) и переиспользует keep-alive соединения
+        self.client: Client | None = None
+        self.validator = RequestValidator(self.auth_token) if self.enabled else None
+    
+    def _get_client(self) -> Client:
+        """Twilio-клиент с асинхронным HTTP-клиентом и общим пулом соединений."""
+        if self.client is None:
+            self.client = Client(
+                self.account_sid,
+                self.auth_token,
+                http_client=AsyncTwilioHttpClient(pool_connections=True),
+            )
+        return self.client
+    
+    async def close(self) -> None:
+        """Закрыть HTTP-сессию Twilio (при остановке приложения)."""
+        if self.client is not None:
+            await self.client.http_client.close()
             self.client = None
-            self.validator = None
     
     def validate_request(self, url: str, params: dict, signature: str) -> bool:
         """Проверка подлинности webhook от Twilio."""
@@ -112,7 +127,7 @@ class TwilioWhatsAppService:
             if not from_number.startswith("whatsapp:"):
                 from_number = f"whatsapp:{from_number}"
             
-            message = self.client.messages.create(
+            message = await self._get_client().messages.create_async(
                 body=text,
                 from_=from_number,
                 to=to_number,
@@ -151,7 +166,7 @@ class TwilioWhatsAppService:
             if not from_number.startswith("whatsapp:"):
                 from_number = f"whatsapp:{from_number}"
             
-            message = self.client.messages.create(
+            message = await self._get_client().messages.create_async(
                 content_sid=template_sid,
                 content_variables=variables or {},
                 from_=from_number,
@@ -52,10 +52,21 @@ class TicketService:
     def __init__(self, session: AsyncSession):
         self.session = session
 
-    async def create_ticket(self, data: TicketCreate) -> tuple[Ticket, AIClassificationResult]:
+    async def create_ticket(
+        self,
+        data: TicketCreate,
+        *,
+        resolved_by_ai: bool = False,
+    ) -> tuple[Ticket, AIClassificationResult]:
         """
         Создает новый тикет с автоматической AI-классификацией.
         
+        Тикет и сообщения сохраняются одним коммитом.
+        
+        Args:
+            data: Данные тикета
+            resolved_by_ai: Сразу пометить тикет как решённый AI (чат уже ответил клиенту)
+        
         Returns:
             Tuple of (Ticket, AIClassificationResult)
         """
@@ -72,6 +83,8 @@ class TicketService:
         
         # Создаем тикет
         ticket = Ticket(
+            # id задаём сразу, чтобы привязать сообщения без промежуточного flush
+            id=uuid.uuid4(),
             ticket_number=generate_ticket_number(),
             client_name=data.client_name,
             client_email=data.client_email,
@@ -91,15 +104,13 @@ class TicketService:
         )
         
         # Если можно автоматически решить
-        if classification.can_auto_resolve and classification.suggested_response:
+        if resolved_by_ai or (classification.can_auto_resolve and classification.suggested_response):
             ticket.ai_auto_resolved = True
             ticket.status = TicketStatus.RESOLVED
             ticket.resolved_at = datetime.utcnow()
             ticket.first_response_at = datetime.utcnow()
         
         self.session.add(ticket)
-        await self.session.commit()
-        await self.session.refresh(ticket)
         
         # Создаем первое сообщение (описание от клиента)
         initial_message = Message(
@@ -457,13 +468,11 @@ class DepartmentService:
 
     async def create_department(self, data: DepartmentCreate) -> Department:
         """Создает новый департамент."""
-        import json
-        
         department = Department(
             name=data.name,
             name_kz=data.name_kz,
             description=data.description,
-            keywords=json.dumps(data.keywords) if data.keywords else None,
+            keywords=data.keywords or None,
         )
         self.session.add(department)
         await self.session.commit()
@@ -524,15 +533,13 @@ class KnowledgeBaseService:
 
     async def create_entry(self, data: KnowledgeBaseCreate) -> KnowledgeBase:
         """Создает новую запись в базе знаний."""
-        import json
-        
         entry = KnowledgeBase(
             question=data.question,
             question_kz=data.question_kz,
             answer=data.answer,
             answer_kz=data.answer_kz,
             category_id=data.category_id,
-            keywords=json.dumps(data.keywords) if data.keywords else None,
+            keywords=data.keywords or None,
         )
         self.session.add(entry)
         await self.session.commit()
@@ -540,15 +547,47 @@ class KnowledgeBaseService:
         return entry
 
     async def search(self, query: str, limit: int = 5) -> Sequence[KnowledgeBase]:
-        """Ищет релевантные записи в базе знаний."""
+        """
+        Ищет релевантные записи в базе знаний (полнотекстовый поиск).
+        
+        Если FTS ничего не нашёл (опечатка, часть слова), выполняется прежний
+        поиск подстроки в вопросе через ILIKE.
+        """
+        ts_query = func.plainto_tsquery("russian", query)
+        ts_query_kz = func.plainto_tsquery("simple", query)
+        rank = func.greatest(
+            func.ts_rank_cd(KnowledgeBase.search_vector, ts_query),
+            func.ts_rank_cd(KnowledgeBase.search_vector_kz, ts_query_kz),
+        )
+        result = await self.session.execute(
+            select(KnowledgeBase)
+            .where(
+                and_(
+                    KnowledgeBase.is_active == True,
+                    or_(
+                        KnowledgeBase.search_vector.op("@@")(ts_query),
+                        KnowledgeBase.search_vector_kz.op("@@")(ts_query_kz),
+                        # JSONB @> — попадает в GIN-индекс ix_knowledge_base_keywords_gin
+                        KnowledgeBase.keywords.contains([query.strip().lower()]),
+                    )
+                )
+            )
+            .order_by(rank.desc(), KnowledgeBase.usage_count.desc())
+            .limit(limit)
+        )
+        entries = result.scalars().all()
+        if entries:
+            return entries
+        
+        pattern = f"%{query.strip()}%"
         result = await self.session.execute(
             select(KnowledgeBase)
             .where(
                 and_(
                     KnowledgeBase.is_active == True,
                     or_(
-                        KnowledgeBase.question.ilike(f"%{query}%"),
-                        KnowledgeBase.keywords.ilike(f"%{query}%"),
+                        KnowledgeBase.question.ilike(pattern),
+                        KnowledgeBase.question_kz.ilike(pattern),
                     )
                 )
             )
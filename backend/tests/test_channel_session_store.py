@@ -0,0 +1,85 @@
+import pytest
+
+from backend.app.api.routes.integrations import whatsapp
+from backend.app.services import channel_session_store
+from backend.app.services.channel_session_store import ChannelSessionStore, append_session_message
+
+
+class _Clock:
+    def __init__(self) -> None:
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch: pytest.MonkeyPatch) -> _Clock:
+    clock = _Clock()
+    monkeypatch.setattr(channel_session_store.time, "monotonic", clock)
+    return clock
+
+
+@pytest.mark.asyncio
+async def test_session_expires_after_ttl(clock: _Clock) -> None:
+    store = ChannelSessionStore("test:session:", ttl=60)
+    await store.set("+77001234567", ["hello"])
+
+    clock.now += 59
+    assert await store.get("+77001234567") == ["hello"]
+
+    clock.now += 1
+    assert await store.get("+77001234567") is None
+    assert await store.count() == 0
+
+
+@pytest.mark.asyncio
+async def test_set_restarts_ttl(clock: _Clock) -> None:
+    store = ChannelSessionStore("test:session:", ttl=60)
+    await store.set("a", 1)
+
+    clock.now += 50
+    await store.set("a", 2)
+    clock.now += 50
+
+    assert await store.get("a") == 2
+
+
+@pytest.mark.asyncio
+async def test_oldest_sessions_are_evicted_over_the_cap(clock: _Clock) -> None:
+    store = ChannelSessionStore("test:session:", ttl=60)
+    store.MEMORY_MAX_SESSIONS = 2
+    await store.set("a", 1)
+    await store.set("b", 2)
+    # Повторная запись делает сессию самой свежей
+    await store.set("a", 3)
+    await store.set("c", 4)
+
+    assert await store.get_all() == {"a": 3, "c": 4}
+
+
+
+def test_append_session_message_keeps_last_messages() -> None:
+    history: list[dict] = []
+    for number in range(5):
+        append_session_message(history, f"message {number}", is_user=number % 2 == 0, limit=3)
+
+    assert [message["content"] for message in history] == ["message 2", "message 3", "message 4"]
+    assert history[-1]["is_user"] is True
+    assert history[-1]["timestamp"]
+
+
+@pytest.mark.asyncio
+async def test_meta_whatsapp_history_is_capped_and_expires(clock: _Clock) -> None:
+    store = channel_session_store.meta_whatsapp_session_store
+    history: list[dict] = []
+    for number in range(whatsapp.SESSION_HISTORY_LIMIT + 5):
+        append_session_message(history, f"message {number}", is_user=True, limit=whatsapp.SESSION_HISTORY_LIMIT)
+    await store.set("+77000000002", history)
+
+    saved = await store.get("+77000000002")
+    assert len(saved) == whatsapp.SESSION_HISTORY_LIMIT
+    assert saved[0]["content"] == "message 5"
+
+    clock.now += 24 * 3600
+    assert await store.get("+77000000002") is None
@@ -0,0 +1,22 @@
+from backend.app.api.routes.chat import _etag_matches
+
+
+def test_etag_matches_exact_and_list() -> None:
+    assert _etag_matches('"v1"', '"v1"')
+    assert _etag_matches('"v0", "v1"', '"v1"')
+    assert not _etag_matches('"v0"', '"v1"')
+
+
+def test_etag_matches_wildcard() -> None:
+    assert _etag_matches("*", '"v1"')
+
+
+def test_etag_matches_missing_header() -> None:
+    assert not _etag_matches(None, '"v1"')
+    assert not _etag_matches("", '"v1"')
+
+
+def test_etag_matches_uses_weak_comparison() -> None:
+    assert _etag_matches('W/"v1"', '"v1"')
+    assert _etag_matches('"v1"', 'W/"v1"')
+    assert _etag_matches('"v0", W/"v1"', 'W/"v1"')
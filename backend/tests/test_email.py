@@ -0,0 +1,152 @@
+import asyncio
+
+import pytest
+
+from backend.app.api.routes.integrations import email
+
+
+@pytest.fixture(autouse=True)
+def memory_dedup(monkeypatch: pytest.MonkeyPatch) -> dict[str, None]:
+    # Redis не подключён — _claim_email работает на in-memory fallback
+    processed: dict[str, None] = {}
+    monkeypatch.setattr(email, "processed_emails", processed)
+    monkeypatch.setattr(email, "MEMORY_MAX_PROCESSED_EMAILS", 3)
+    return processed
+
+
+@pytest.mark.asyncio
+async def test_claim_email_only_once() -> None:
+    assert await email._claim_email("<msg-1@example.com>")
+    assert not await email._claim_email("<msg-1@example.com>")
+    assert await email._claim_email("<msg-2@example.com>")
+
+
+@pytest.mark.asyncio
+async def test_released_email_can_be_claimed_again() -> None:
+    assert await email._claim_email("<msg-1@example.com>")
+
+    await email._release_email("<msg-1@example.com>")
+
+    assert await email._claim_email("<msg-1@example.com>")
+
+
+@pytest.mark.asyncio
+async def test_memory_fallback_is_capped(memory_dedup: dict[str, None]) -> None:
+    for number in range(5):
+        assert await email._claim_email(f"<msg-{number}@example.com>")
+
+    assert list(memory_dedup) == ["<msg-2@example.com>", "<msg-3@example.com>", "<msg-4@example.com>"]
+    # Вытесненное письмо снова считается новым
+    assert await email._claim_email("<msg-0@example.com>")
+
+
+class _Ticket:
+    ticket_number = "TKT-1"
+
+
+class _TicketService:
+    created = 0
+
+    def __init__(self, session) -> None:
+        pass
+
+    async def create_ticket(self, data):
+        _TicketService.created += 1
+        return _Ticket(), None
+
+
+async def _ai_reply(**kwargs) -> dict:
+    return {"response": "Ответ", "can_auto_resolve": False}
+
+
+def _payload() -> email.EmailWebhookPayload:
+    return email.EmailWebhookPayload(
+        from_email="client@example.com",
+        subject="Не работает VPN",
+        body="Не подключается VPN",
+        message_id="<msg-1@example.com>",
+    )
+
+
+@pytest.mark.asyncio
+async def test_failed_confirmation_after_ticket_keeps_the_claim(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def failing_send(**kwargs) -> None:
+        raise RuntimeError("SMTP недоступен")
+
+    _TicketService.created = 0
+    monkeypatch.setattr(email.rag_service, "chat", _ai_reply)
+    monkeypatch.setattr(email, "TicketService", _TicketService)
+    monkeypatch.setattr(email.email_service, "send_ticket_confirmation", failing_send)
+
+    result = await email.receive_email_webhook(_payload(), session=None)
+
+    assert result["status"] == "error"
+    assert _TicketService.created == 1
+    # Повтор от провайдера не должен создать второй тикет
+    assert not await email._claim_email("<msg-1@example.com>")
+    assert (await email.receive_email_webhook(_payload(), session=None))["status"] == "duplicate"
+    assert _TicketService.created == 1
+
+
+@pytest.mark.asyncio
+async def test_failure_before_ticket_releases_the_claim(monkeypatch: pytest.MonkeyPatch) -> None:
+    async def failing_ai(**kwargs) -> dict:
+        raise RuntimeError("OpenAI недоступен")
+
+    monkeypatch.setattr(email.rag_service, "chat", failing_ai)
+
+    result = await email.receive_email_webhook(_payload(), session=None)
+
+    assert result["status"] == "error"
+    assert await email._claim_email("<msg-1@example.com>")
+
+
+@pytest.mark.asyncio
+async def test_webhook_detects_kazakh_body(monkeypatch: pytest.MonkeyPatch) -> None:
+    languages: list[str] = []
+
+    async def ai_reply(**kwargs) -> dict:
+        languages.append(kwargs["language"])
+        return {"response": "Жауап", "can_auto_resolve": False}
+
+    async def send(**kwargs) -> None:
+        pass
+
+    monkeypatch.setattr(email.rag_service, "chat", ai_reply)
+    monkeypatch.setattr(email, "TicketService", _TicketService)
+    monkeypatch.setattr(email.email_service, "send_ticket_confirmation", send)
+
+    for message_id, body in [("<kz@example.com>", "Сәлеметсіз бе, VPN қосылмайды"), ("<en@example.com>", "VPN is down")]:
+        payload = email.EmailWebhookPayload(
+            from_email="client@example.com",
+            subject="VPN",
+            body=body,
+            message_id=message_id,
+        )
+        assert (await email.receive_email_webhook(payload, session=None))["status"] == "ok"
+
+    assert languages == ["kz", "ru"]
+
+
+@pytest.mark.asyncio
+async def test_polling_creates_tickets_for_fetched_emails(monkeypatch: pytest.MonkeyPatch) -> None:
+    ingested: list[str] = []
+    done = asyncio.Event()
+
+    async def fetch(limit: int) -> list[dict]:
+        return [{"message_id": "<poll-1@example.com>"}, {"message_id": "<poll-2@example.com>"}]
+
+    async def ingest(email_data: dict, semaphore: asyncio.Semaphore) -> str:
+        ingested.append(email_data["message_id"])
+        done.set()
+        return "TKT-1"
+
+    monkeypatch.setattr(email.email_service, "fetch_new_emails", fetch)
+    monkeypatch.setattr(email, "_ingest_fetched_email", ingest)
+
+    task = asyncio.create_task(email._poll_emails(interval_seconds=3600))
+    await asyncio.wait_for(done.wait(), timeout=1)
+    await asyncio.sleep(0)
+    task.cancel()
+
+    assert sorted(ingested) == ["<poll-1@example.com>", "<poll-2@example.com>"]
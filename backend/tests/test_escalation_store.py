@@ -0,0 +1,127 @@
+import pytest
+
+from backend.app.services.escalation_store import EscalationStore
+
+
+def _escalation(number: int, **fields) -> dict:
+    escalation = {
+        "id": f"uuid-{number}",
+        "escalation_id": f"ESC-{number}",
+        "status": "pending",
+        "department": "it_support",
+        "priority": "medium",
+        "created_at": f"2025-01-01T00:00:{number:02d}",
+    }
+    escalation.update(fields)
+    return escalation
+
+
+@pytest.mark.asyncio
+async def test_lookup_by_escalation_id_alias_and_ticket() -> None:
+    store = EscalationStore()
+    await store.add(_escalation(1, ticket_id="ticket-1"))
+
+    assert (await store.get_by_id("ESC-1"))["id"] == "uuid-1"
+    assert (await store.get_by_id("uuid-1"))["escalation_id"] == "ESC-1"
+    assert (await store.get_by_ticket_id("ticket-1"))["escalation_id"] == "ESC-1"
+    assert await store.get_by_id("missing") is None
+
+
+@pytest.mark.asyncio
+async def test_status_buckets_and_counters_follow_updates() -> None:
+    store = EscalationStore()
+    await store.add(_escalation(1))
+    await store.add(_escalation(2, department="hr", priority="high"))
+
+    await store.set_status("uuid-1", "resolved")
+
+    assert [e["escalation_id"] for e in await store.get_all("pending")] == ["ESC-2"]
+    assert [e["escalation_id"] for e in await store.get_all("resolved")] == ["ESC-1"]
+    stats = await store.get_stats()
+    assert stats["total"] == 2
+    assert stats["pending"] == 1
+    assert stats["resolved"] == 1
+    assert stats["by_department"] == {"it_support": 1, "hr": 1}
+    assert stats["by_priority"] == {"medium": 1, "high": 1}
+
+
+@pytest.mark.asyncio
+async def test_delete_removes_indexes_and_counters() -> None:
+    store = EscalationStore()
+    await store.add(_escalation(1, ticket_id="ticket-1", csat_rating=5))
+
+    assert await store.delete("uuid-1")
+    assert not await store.delete("uuid-1")
+
+    assert await store.get_by_id("ESC-1") is None
+    assert await store.get_by_ticket_id("ticket-1") is None
+    assert await store.get_all("pending") == []
+    assert (await store.get_stats())["total"] == 0
+    assert await store.get_csat_distribution() == {}
+
+
+@pytest.mark.asyncio
+async def test_re_adding_same_escalation_does_not_double_count() -> None:
+    store = EscalationStore()
+    await store.add(_escalation(1))
+    await store.add(_escalation(1, status="in_progress"))
+
+    stats = await store.get_stats()
+    assert stats["total"] == 1
+    assert stats["pending"] == 0
+    assert stats["in_progress"] == 1
+
+
+@pytest.mark.asyncio
+async def test_oldest_escalations_are_evicted_over_the_limit() -> None:
+    store = EscalationStore()
+    store.MEMORY_MAX_ESCALATIONS = 3
+    for number in range(1, 6):
+        await store.add(_escalation(number, ticket_id=f"ticket-{number}"))
+
+    assert await store.get_by_id("ESC-1") is None
+    assert await store.get_by_id("uuid-2") is None
+    assert await store.get_by_ticket_id("ticket-1") is None
+    assert [e["escalation_id"] for e in await store.get_all()] == ["ESC-3", "ESC-4", "ESC-5"]
+    assert (await store.get_stats())["pending"] == 3
+
+
+@pytest.mark.asyncio
+async def test_version_changes_on_every_write() -> None:
+    store = EscalationStore()
+    versions = [await store.get_version()]
+
+    await store.add(_escalation(1))
+    versions.append(await store.get_version())
+    await store.add_client_message("ESC-1", "Здравствуйте")
+    versions.append(await store.get_version())
+    await store.set_status("ESC-1", "in_progress")
+    versions.append(await store.get_version())
+    await store.delete("ESC-1")
+    versions.append(await store.get_version())
+
+    assert len(set(versions)) == len(versions)
+
+
+@pytest.mark.asyncio
+async def test_page_is_newest_first_with_total() -> None:
+    store = EscalationStore()
+    for number in range(1, 5):
+        await store.add(_escalation(number))
+
+    page, total = await store.get_page(limit=2, offset=1)
+
+    assert total == 4
+    assert [e["escalation_id"] for e in page] == ["ESC-3", "ESC-2"]
+
+
+@pytest.mark.asyncio
+async def test_page_without_limit_returns_the_rest_of_the_list() -> None:
+    store = EscalationStore()
+    for number in range(1, 5):
+        await store.add(_escalation(number))
+
+    page, total = await store.get_page(limit=None, offset=1)
+
+    assert total == 4
+    assert [e["escalation_id"] for e in page] == ["ESC-3", "ESC-2", "ESC-1"]
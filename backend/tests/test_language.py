@@ -0,0 +1,22 @@
+from backend.app.core.language import LANGUAGE_SAMPLE_CHARS, detect_language
+
+
+def test_kazakh_letters_detect_kz() -> None:
+    assert detect_language("Сәлеметсіз бе, құпия сөзді ұмытып қалдым") == "kz"
+
+
+def test_russian_and_latin_text_detect_ru() -> None:
+    assert detect_language("Не работает принтер на третьем этаже") == "ru"
+    assert detect_language("VPN connection failed") == "ru"
+
+
+def test_text_without_letters_uses_fallback() -> None:
+    assert detect_language("+7 700 123 45 67", fallback="kz") == "kz"
+    assert detect_language("123") == "ru"
+    assert detect_language("") == "ru"
+
+
+def test_only_the_beginning_of_the_text_is_sampled() -> None:
+    text = "а" * LANGUAGE_SAMPLE_CHARS + " сәлем"
+
+    assert detect_language(text) == "ru"
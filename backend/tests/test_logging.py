@@ -0,0 +1,31 @@
+import logging
+
+from backend.app.core import logging as app_logging
+
+
+def _queue_handlers() -> list[logging.Handler]:
+    return [
+        handler
+        for handler in logging.getLogger().handlers
+        if isinstance(handler, app_logging._DeferredQueueHandler)
+    ]
+
+
+def test_shutdown_detaches_the_queue_handler() -> None:
+    app_logging.setup_logging()
+    assert len(_queue_handlers()) == 1
+
+    app_logging.shutdown_logging()
+
+    assert _queue_handlers() == []
+
+
+def test_second_setup_does_not_duplicate_handlers() -> None:
+    app_logging.setup_logging()
+    app_logging.shutdown_logging()
+    app_logging.setup_logging()
+
+    try:
+        assert len(_queue_handlers()) == 1
+    finally:
+        app_logging.shutdown_logging()
@@ -0,0 +1,210 @@
+import asyncio
+
+import fakeredis
+import pytest
+
+from backend.app.core.redis import RedisService
+
+
+@pytest.fixture
+def service() -> RedisService:
+    # Отдельный FakeServer на тест — данные не пересекаются
+    service = RedisService()
+    service._client = fakeredis.FakeAsyncRedis(server=fakeredis.FakeServer(), decode_responses=True)
+    service._connected = True
+    return service
+
+
+def _escalation(number: int, **fields) -> dict:
+    escalation = {
+        "id": f"uuid-{number}",
+        "escalation_id": f"ESC-{number}",
+        "status": "pending",
+        "department": "it_support",
+        "priority": "medium",
+        "created_at": f"2025-01-01T00:00:{number:02d}",
+    }
+    escalation.update(fields)
+    return escalation
+
+
+def test_normalize_query_ignores_case_punctuation_and_spacing() -> None:
+    variants = [
+        "Как сбросить пароль?",
+        "как  сбросить пароль",
+        "Как сбросить пароль!!",
+        "  КАК СБРОСИТЬ ПАРОЛЬ... ",
+    ]
+
+    assert {RedisService._normalize_query(query) for query in variants} == {"как сбросить пароль"}
+
+
+def test_normalize_query_folds_yo_and_drops_emoji() -> None:
+    assert RedisService._normalize_query("Ещё вопрос 🙂") == "еще вопрос"
+
+
+def test_normalize_query_keeps_distinct_words() -> None:
+    assert RedisService._normalize_query("VPN не работает") != RedisService._normalize_query("VPN работает")
+
+
+@pytest.mark.asyncio
+async def test_stats_counters_follow_save_update_and_delete(service: RedisService) -> None:
+    await service.save_escalation(_escalation(1))
+    await service.save_escalation(_escalation(2, department="hr", priority="high"))
+    await service.update_escalation("ESC-1", {"status": "resolved"})
+
+    stats = await service.get_escalation_stats()
+    assert stats["total"] == 2
+    assert stats["status"] == {"pending": 1, "resolved": 1}
+    assert stats["department"] == {"it_support": 1, "hr": 1}
+    assert stats["priority"] == {"medium": 1, "high": 1}
+
+    assert await service.delete_escalation("ESC-2")
+    # Повторное удаление не уменьшает счётчики второй раз
+    assert await service.delete_escalation("ESC-2")
+
+    stats = await service.get_escalation_stats()
+    assert stats["total"] == 1
+    assert stats["status"] == {"pending": 0, "resolved": 1}
+    assert stats["department"] == {"it_support": 1, "hr": 0}
+
+
+@pytest.mark.asyncio
+async def test_concurrent_saves_count_the_escalation_once(service: RedisService) -> None:
+    await asyncio.gather(
+        service.save_escalation(_escalation(1)),
+        service.save_escalation(_escalation(1, status="in_progress")),
+        service.save_escalation(_escalation(1, status="resolved")),
+    )
+
+    stats = await service.get_escalation_stats()
+    assert stats["total"] == 1
+    assert sum(stats["status"].values()) == 1
+    assert stats["status"][(await service.get_escalation("ESC-1"))["status"]] == 1
+
+
+@pytest.mark.asyncio
+async def test_stats_backfill_counts_existing_escalations_once(service: RedisService) -> None:
+    await service.save_escalation(_escalation(1))
+    await service.save_escalation(_escalation(2, status="resolved"))
+    # Данные, сохранённые до появления счётчиков
+    await service.client.delete("escalations:stats:status", "escalations:stats:department", "escalations:stats:priority")
+
+    await service._backfill_escalation_stats()
+    await service._backfill_escalation_stats()
+
+    stats = await service.get_escalation_stats()
+    assert stats["status"] == {"pending": 1, "resolved": 1}
+    assert stats["department"] == {"it_support": 2}
+    assert await service.client.exists(service.ESCALATION_STATS_BACKFILL_MARKER)
+
+
+@pytest.mark.asyncio
+async def test_status_index_moves_with_status_changes(service: RedisService) -> None:
+    await service.save_escalation(_escalation(1))
+    await service.save_escalation(_escalation(2))
+
+    await service.update_escalation("uuid-1", {"status": "in_progress"})
+
+    assert [e["escalation_id"] for e in await service.get_all_escalations("pending")] == ["ESC-2"]
+    assert [e["escalation_id"] for e in await service.get_all_escalations("in_progress")] == ["ESC-1"]
+    assert await service.client.zrange(service._status_key("pending"), 0, -1) == ["ESC-2"]
+
+    await service.delete_escalation("ESC-1")
+
+    assert await service.get_all_escalations("in_progress") == []
+
+
+@pytest.mark.asyncio
+async def test_escalations_page_is_newest_first(service: RedisService) -> None:
+    for number in range(1, 5):
+        await service.save_escalation(_escalation(number))
+    await service.update_escalation("ESC-4", {"status": "resolved"})
+
+    page, total = await service.get_escalations_page(limit=2, offset=1)
+    assert total == 4
+    assert [e["escalation_id"] for e in page] == ["ESC-3", "ESC-2"]
+
+    page, total = await service.get_escalations_page(limit=None, offset=1)
+    assert [e["escalation_id"] for e in page] == ["ESC-3", "ESC-2", "ESC-1"]
+
+    page, total = await service.get_escalations_page(status="pending", limit=None)
+    assert total == 3
+    assert [e["escalation_id"] for e in page] == ["ESC-3", "ESC-2", "ESC-1"]
+
+
+@pytest.mark.asyncio
+async def test_ticket_index_lookup_and_delete(service: RedisService) -> None:
+    await service.save_escalation(_escalation(1, ticket_id="ticket-1"))
+
+    assert (await service.get_escalation_by_ticket("ticket-1"))["escalation_id"] == "ESC-1"
+
+    await service.delete_escalation("uuid-1")
+
+    assert await service.get_escalation_by_ticket("ticket-1") is None
+    assert not await service.client.exists("escalation:ticket:ticket-1")
+
+
+@pytest.mark.asyncio
+async def test_ticket_backfill_indexes_old_escalations(service: RedisService) -> None:
+    await service.save_escalation(_escalation(1, ticket_id="ticket-1"))
+    await service.client.delete("escalation:ticket:ticket-1")
+
+    await service._backfill_escalation_tickets()
+
+    assert (await service.get_escalation_by_ticket("ticket-1"))["escalation_id"] == "ESC-1"
+    assert await service.client.exists(service.ESCALATION_TICKET_BACKFILL_MARKER)
+
+
+@pytest.mark.asyncio
+async def test_order_backfill_rebuilds_missing_indexes_only(
+    service: RedisService,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    await service.save_escalation(_escalation(1))
+    await service.save_escalation(_escalation(2, status=None))
+    await service.client.delete(service.ESCALATION_ORDER_KEY, service._status_key("pending"))
+
+    await service._backfill_escalation_order()
+
+    page, total = await service.get_escalations_page(limit=None)
+    assert total == 2
+    assert [e["escalation_id"] for e in page] == ["ESC-2", "ESC-1"]
+
+    rebuilds: list[str | None] = []
+
+    async def rebuild(status=None):
+        rebuilds.append(status)
+        return []
+
+    # Эскалация со status=None лежит в escalations:status:None и тоже считается проиндексированной
+    monkeypatch.setattr(service, "get_all_escalations", rebuild)
+    await service._backfill_escalation_order()
+
+    assert rebuilds == []
+
+
+@pytest.mark.asyncio
+async def test_csat_backfill_marker_is_set_only_after_rebuild(
+    service: RedisService,
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    await service.save_escalation(_escalation(1, csat_rating=5, csat_submitted_at="2025-01-02T00:00:00"))
+    await service.save_escalation(_escalation(2, csat_rating=3, csat_submitted_at="2025-01-03T00:00:00"))
+    get_all_escalations = service.get_all_escalations
+
+    async def failing_load(status=None):
+        raise ConnectionError("Redis недоступен")
+
+    monkeypatch.setattr(service, "get_all_escalations", failing_load)
+    await service._backfill_csat()
+
+    assert not await service.client.exists(service.CSAT_BACKFILL_MARKER)
+    assert await service.get_csat_distribution() == {}
+
+    monkeypatch.setattr(service, "get_all_escalations", get_all_escalations)
+    await service._backfill_csat()
+    await service._backfill_csat()
+
+    assert await service.get_csat_distribution() == {5: 1, 3: 1}
+    assert [e["escalation_id"] for e in await service.get_csat_reviewed_escalations()] == ["ESC-2", "ESC-1"]
@@ -0,0 +1,42 @@
+from backend.app.api.routes.integrations import twilio_voice
+
+
+def test_split_sentences_on_terminal_punctuation() -> None:
+    text = "Здравствуйте! Чем могу помочь? Опишите проблему… Спасибо."
+
+    assert twilio_voice._split_sentences(text) == [
+        "Здравствуйте!",
+        "Чем могу помочь?",
+        "Опишите проблему…",
+        "Спасибо.",
+    ]
+
+
+def test_split_sentences_keeps_numbered_items_together() -> None:
+    text = "Сделайте так: 1. Откройте настройки. 2. Нажмите сброс."
+
+    assert twilio_voice._split_sentences(text) == [
+        "Сделайте так: 1. Откройте настройки.",
+        "2. Нажмите сброс.",
+    ]
+
+
+def test_split_sentences_drops_empty_parts() -> None:
+    assert twilio_voice._split_sentences("   ") == []
+    assert twilio_voice._split_sentences("Один.   ") == ["Один."]
+
+
+def test_unwrap_markdown_keeps_inner_text() -> None:
+    def clean(text: str) -> str:
+        return twilio_voice._MARKDOWN_RE.sub(twilio_voice._unwrap_markdown, text)
+
+    assert clean("**Важно**: нажмите *Сброс*") == "Важно: нажмите Сброс"
+    assert clean("Команда `ipconfig`") == "Команда ipconfig"
+    assert clean("[портал](https://example.com)") == "портал"
+    assert clean("## Заголовок") == "Заголовок"
+    assert clean("**[ссылка](https://example.com)**") == "ссылка"
+
+
+def test_clean_for_speech_strips_emoji_and_markdown() -> None:
+    assert twilio_voice._clean_for_speech("✅ **Готово**,  пароль  сброшен") == "Готово, пароль сброшен"
+    assert twilio_voice._clean_for_speech("  обычный   текст ") == "обычный текст"
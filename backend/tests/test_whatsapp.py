@@ -0,0 +1,83 @@
+import pytest
+
+from backend.app.api.routes.integrations import whatsapp
+from backend.app.services.AI.ai_service import SUMMARY_UNAVAILABLE
+
+
+def _history(size: int) -> list[dict]:
+    return [
+        {"content": f"message {number}", "is_user": number % 2 == 0, "timestamp": "2025-01-01T00:00:00"}
+        for number in range(size)
+    ]
+
+
+@pytest.fixture
+def summarize(monkeypatch: pytest.MonkeyPatch) -> list[list[dict]]:
+    calls: list[list[dict]] = []
+
+    async def fake_summarize(messages: list[dict], language: str) -> str:
+        calls.append(messages)
+        return "клиент Айгерим, не работает VPN"
+
+    monkeypatch.setattr(whatsapp.ai_service, "use_openai", True)
+    monkeypatch.setattr(whatsapp.ai_service, "summarize_conversation", fake_summarize)
+    return calls
+
+
+@pytest.mark.asyncio
+async def test_short_history_is_not_condensed(summarize: list[list[dict]]) -> None:
+    history = _history(whatsapp.CONDENSE_AFTER_MESSAGES)
+
+    assert await whatsapp._condense_history(history, "ru") is history
+    assert summarize == []
+
+
+@pytest.mark.asyncio
+async def test_long_history_keeps_recent_messages_after_summary(summarize: list[list[dict]]) -> None:
+    history = _history(whatsapp.CONDENSE_AFTER_MESSAGES + 1)
+
+    condensed = await whatsapp._condense_history(history, "ru")
+
+    assert condensed[0]["is_summary"] is True
+    assert condensed[0]["content"].startswith(whatsapp.SUMMARY_PREFIX)
+    assert condensed[1:] == history[-whatsapp.AI_HISTORY_MESSAGES:]
+    assert len(summarize[0]) == len(history) - whatsapp.AI_HISTORY_MESSAGES
+
+
+@pytest.mark.asyncio
+async def test_unavailable_summary_keeps_history(
+    summarize: list[list[dict]],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    async def unavailable(messages: list[dict], language: str) -> str:
+        return SUMMARY_UNAVAILABLE
+
+    monkeypatch.setattr(whatsapp.ai_service, "summarize_conversation", unavailable)
+    history = _history(whatsapp.CONDENSE_AFTER_MESSAGES + 1)
+
+    assert await whatsapp._condense_history(history, "ru") is history
+
+
+@pytest.mark.asyncio
+async def test_ai_history_keeps_summary_first(summarize: list[list[dict]]) -> None:
+    condensed = await whatsapp._condense_history(_history(whatsapp.CONDENSE_AFTER_MESSAGES + 1), "ru")
+
+    ai_history = whatsapp._ai_history(condensed)
+
+    assert ai_history[0]["is_summary"] is True
+    assert ai_history[1:] == condensed[-whatsapp.AI_HISTORY_MESSAGES:-1]
+
+
+@pytest.mark.asyncio
+async def test_background_condensation_keeps_messages_sent_meanwhile(summarize: list[list[dict]]) -> None:
+    phone_number = "+77000000001"
+    snapshot = _history(whatsapp.CONDENSE_AFTER_MESSAGES + 1)
+    newer = {"content": "ещё вопрос", "is_user": True, "timestamp": "2025-01-01T00:01:00"}
+    await whatsapp.meta_whatsapp_session_store.set(phone_number, [*snapshot, newer])
+
+    await whatsapp._condense_in_background(phone_number, snapshot, "ru")
+
+    saved = await whatsapp.meta_whatsapp_session_store.get(phone_number)
+    assert saved[0]["is_summary"] is True
+    assert saved[1:] == [*snapshot[-whatsapp.AI_HISTORY_MESSAGES:], newer]
+    await whatsapp.meta_whatsapp_session_store.delete(phone_number)